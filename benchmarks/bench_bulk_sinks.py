@@ -0,0 +1,68 @@
+"""
+Compare creating virtual sinks one by one (create one, wait for its nodes, then the next one, like adding RouteWidgets one
+after the other) with creating them at once using VirtualSinkManager.create_virtual_sinks(), on a simulated graph in
+which the nodes of a loopback device appear LOOPBACK_DELAY seconds after it is created
+
+usage: python benchmarks/bench_bulk_sinks.py [number of sinks]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import pw_backend
+import pw_interface
+
+SINK_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+LOOPBACK_DELAY = 0.1
+
+
+def one_by_one(virtual_sink_manager: pw_interface.VirtualSinkManager, node_manager: pw_interface.NodeManager) -> None:
+    for _ in range(SINK_COUNT):
+        node_manager.wait_for_loopback(virtual_sink_manager.create_virtual_sink())
+
+
+def at_once(virtual_sink_manager: pw_interface.VirtualSinkManager, node_manager: pw_interface.NodeManager) -> None:
+    virtual_sink_manager.create_virtual_sinks(SINK_COUNT, node_manager)
+
+
+def measure(create_function) -> tuple[float, int]:
+    """
+    Create SINK_COUNT virtual sinks on a new simulated graph
+
+    :param create_function: the function creating the virtual sinks
+    :return: the (time it took in seconds, number of links of the loopback outputs left afterwards)
+    """
+    backend = pw_backend.SimulatedBackend(loopback_delay=LOOPBACK_DELAY)
+    backend.populate(100, linked=True)
+    pw_interface.set_backend(backend)
+    with contextlib.redirect_stdout(io.StringIO()):  # the messages of the NodeManager are not needed
+        node_manager = pw_interface.NodeManager()
+        virtual_sink_manager = pw_interface.VirtualSinkManager()
+        start = time.perf_counter()
+        create_function(virtual_sink_manager, node_manager)
+        elapsed = time.perf_counter() - start
+        time.sleep(0.05)  # let the removal of the output links arrive
+        node_manager.update()
+        output_link_count = sum(1 for link in node_manager.links.values() if
+                                node_manager.nodes[link.output_node_id].media_name.endswith(" output"))
+        virtual_sink_manager.terminate_all()
+        node_manager.close()
+    return elapsed, output_link_count
+
+
+def main() -> None:
+    print(f"{SINK_COUNT} virtual sinks, nodes appear {LOOPBACK_DELAY}s after creation")
+    for name, create_function in (("one by one", one_by_one), ("at once", at_once)):
+        elapsed, output_link_count = measure(create_function)
+        print(f"{name:>10}: {elapsed:.3f}s, {output_link_count} output links left")
+
+
+if __name__ == "__main__":
+    main()
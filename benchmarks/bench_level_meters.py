@@ -0,0 +1,83 @@
+"""
+Measure the CPU cost of the level meters, fed by synthetic PCM streams (pw_backend.SyntheticPcmStream) instead of the
+sound server, so it runs without one
+
+It runs METER_COUNT meters at once in real time for DURATION seconds, reading their levels at the refresh rate of the
+window, and prints the CPU time used as a share of one core, then the time the level computation alone takes per second
+of audio of one meter. The real time share includes copying the samples out of the synthetic streams, which stands in
+for reading the output of parec
+
+usage: python benchmarks/bench_level_meters.py [number of meters]
+"""
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import level_meter
+import pw_backend
+
+METER_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+DURATION = 5.0
+REFRESH_INTERVAL = 0.05  # the level_meter_interval_ms of the MainWindow
+
+
+def realtime() -> float:
+    """
+    Run the meters in real time
+
+    :return: the CPU time used, as a share of one core
+    """
+    meters = [level_meter.LevelMeter(pw_backend.SyntheticPcmStream(level_meter.CHANNELS, level_meter.SAMPLE_RATE))
+              for _ in range(METER_COUNT)]
+    start_time, start_cpu_time = time.perf_counter(), time.process_time()
+    next_refresh = start_time
+    while time.perf_counter() - start_time < DURATION:
+        next_refresh += REFRESH_INTERVAL
+        time.sleep(max(0.0, next_refresh - time.perf_counter()))
+        for meter in meters:
+            meter.get_levels()
+    cpu_share = (time.process_time() - start_cpu_time) / (time.perf_counter() - start_time)
+    for meter in meters:
+        meter.close()
+    return cpu_share
+
+
+def computation_only() -> float:
+    """
+    Time computing the levels of a ring buffer of blocks, as many blocks as arrive between two refreshes
+
+    :return: the seconds of computation per second of audio of one meter
+    """
+    # the meter is given an ended stream, so its reader thread stops right away, and its ring is filled here instead
+    ended_stream = pw_backend.SyntheticPcmStream(level_meter.CHANNELS, level_meter.SAMPLE_RATE)
+    ended_stream.close()
+    meter = level_meter.LevelMeter(ended_stream)
+    meter.reader_thread.join()
+    stream = pw_backend.SyntheticPcmStream(level_meter.CHANNELS, level_meter.SAMPLE_RATE, realtime=False)
+    blocks_per_refresh = max(1, round(REFRESH_INTERVAL * level_meter.SAMPLE_RATE / level_meter.BLOCK_FRAMES))
+    refreshes = 2000
+    elapsed = 0.0
+    for _ in range(refreshes):
+        for _ in range(blocks_per_refresh):
+            meter.ring.fill_next_block(stream)
+        start = time.perf_counter()
+        meter.get_levels()
+        elapsed += time.perf_counter() - start
+    audio_seconds = refreshes * blocks_per_refresh * level_meter.BLOCK_FRAMES / level_meter.SAMPLE_RATE
+    return elapsed / audio_seconds
+
+
+def main() -> None:
+    if not level_meter.is_available():
+        print("NumPy is not installed, the level meters cannot be used")
+        sys.exit(1)
+    print(f"{METER_COUNT} meters in real time, refreshed every {REFRESH_INTERVAL * 1000:.0f} ms: "
+          f"{realtime() * 100:.1f}% of one core")
+    print(f"level computation: {computation_only() * 1e6:.0f} us per second of audio of one meter")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measure the memory the NodeManager keeps for a graph, and how much it allocates while loading it, on a simulated graph
+with 10k ports
+
+usage: python benchmarks/bench_memory.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import pw_backend
+import pw_interface
+
+PORT_COUNT = 10_000
+REFRESHES = 5
+
+
+def main() -> None:
+    backend = pw_backend.SimulatedBackend()
+    backend.populate(PORT_COUNT // 2, linked=True)  # every app stream has 2 ports
+    pw_interface.set_backend(backend)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the timing messages of the NodeManager are not needed
+        tracemalloc.start()
+        before_load = tracemalloc.take_snapshot()
+        node_manager = pw_interface.NodeManager(monitor=False)
+        after_load = tracemalloc.take_snapshot()
+
+        tracemalloc.reset_peak()
+        refresh_start = time.perf_counter()
+        for _ in range(REFRESHES):
+            node_manager.full_update()
+        refresh_time = (time.perf_counter() - refresh_start) / REFRESHES
+        _, peak = tracemalloc.get_traced_memory()
+        retained = sum(stat.size_diff for stat in after_load.compare_to(before_load, "filename"))
+        tracemalloc.stop()
+
+    print(f"graph: {len(node_manager.nodes)} nodes, {len(node_manager.ports)} ports, {len(node_manager.links)} links")
+    print(f"retained by the NodeManager: {retained / 1024 / 1024:.2f} MiB")
+    print(f"peak memory while refreshing: {peak / 1024 / 1024:.2f} MiB")
+    print(f"average full refresh: {refresh_time:.4f}s")
+    port = next(iter(node_manager.ports.values()))
+    port_size = sys.getsizeof(port) + (sys.getsizeof(port.__dict__) if hasattr(port, "__dict__") else 0)
+    print(f"size of one Port: {port_size} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the single pass parser (_parse_all_data) with the per type parser (_get_all_data, _get_object_ids and
+_get_object_info) on simulated "pw-cli info all" dumps of 1k and 10k objects
+
+usage: python benchmarks/bench_parser.py
+"""
+import os
+import sys
+import time
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import pw_backend
+import pw_interface
+
+OBJECT_COUNTS = (1_000, 10_000)
+REPEATS = 3
+
+
+def build_dump(object_count: int) -> str:
+    """
+    Build a simulated graph with about the given number of objects, and print it like "pw-cli info all" does
+
+    :param object_count: the desired number of objects
+    :return: the printed graph
+    """
+    backend = pw_backend.SimulatedBackend()
+    # every linked app stream is 5 objects: a node, 2 ports, and 2 links
+    backend.populate(max(0, (object_count - len(backend.objects)) // 5), linked=True)
+    return backend.info_all()
+
+
+def parse_per_type(data: str) -> dict[str, dict[int, dict]]:
+    """
+    Parse the dump the way NodeManager.update() used to: split it, then find and parse each type separately
+
+    :param data: the output of "pw-cli info all"
+    :return: the parsed objects grouped by type
+    """
+    delim = "\tid: "
+    raw_object_data_rjson = dict(
+        [(int(item.split("\n")[0]), delim + item) for item in data.split(delim) if
+         item and not item.startswith("remote ")])
+    return {object_type: {object_id: pw_interface._get_object_info(object_id, raw_object_data_rjson) for object_id in
+                          pw_interface._get_object_ids(object_type, raw_object_data_rjson)}
+            for object_type in ("Node", "Port", "Link")}
+
+
+def parse_single_pass(data: str) -> dict[str, dict[int, dict]]:
+    """
+    Parse the dump using the single pass parser
+
+    :param data: the output of "pw-cli info all"
+    :return: the parsed objects grouped by type
+    """
+    return pw_interface._parse_all_data(data, ("Node", "Port", "Link"))
+
+
+def best_time(function, data: str) -> float:
+    """
+    Run the function a few times, and return the fastest run
+
+    :param function: the parser function
+    :param data: the argument of the parser
+    :return: the fastest run time in seconds
+    """
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    print(f"{'objects':>8} {'per type':>10} {'single pass':>12} {'speedup':>8}")
+    for object_count in OBJECT_COUNTS:
+        data = build_dump(object_count)
+        assert parse_per_type(data) == parse_single_pass(data), "the parsers do not agree"
+        per_type_time = best_time(parse_per_type, data)
+        single_pass_time = best_time(parse_single_pass, data)
+        print(f"{object_count:>8} {per_type_time:>9.4f}s {single_pass_time:>11.4f}s "
+              f"{per_type_time / single_pass_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Measure the multitrack recorder recording TRACK_COUNT synthetic streams (pw_backend.SyntheticPcmStream) in real time for
+DURATION seconds into a temporary directory, so it runs without a sound server
+
+It prints the CPU time used as a share of one core, the memory allocated by python after the first second and at the
+end (it should stay flat), the time the writes of single buffers took, and the high-water marks and dropped frames of
+the tracks
+
+usage: python benchmarks/bench_recorder.py [number of tracks] [seconds]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import metrics
+import pw_backend
+import recorder
+
+TRACK_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+
+def main() -> None:
+    directory = tempfile.mkdtemp()
+    tracemalloc.start()
+    try:
+        streams = [(f"track {number}", pw_backend.SyntheticPcmStream(recorder.CHANNELS, recorder.SAMPLE_RATE)) for
+                   number in range(TRACK_COUNT)]
+        start_time, start_cpu_time = time.perf_counter(), time.process_time()
+        multitrack_recorder = recorder.MultitrackRecorder(directory, streams)
+        time.sleep(1.0)
+        memory_after_first_second = tracemalloc.get_traced_memory()[0]
+        time.sleep(DURATION - 1.0)
+        memory_at_end = tracemalloc.get_traced_memory()[0]
+        stats = multitrack_recorder.stop()
+        cpu_share = (time.process_time() - start_cpu_time) / (time.perf_counter() - start_time)
+        recorded_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(directory)
+
+    write_times = metrics.REGISTRY.as_dict()["histograms"]["recorder_write_seconds"][0]
+    print(f"{TRACK_COUNT} tracks for {DURATION:.0f}s: {recorded_bytes / 1024 ** 2:.0f} MiB, "
+          f"{cpu_share * 100:.1f}% of one core")
+    print(f"memory allocated after 1s: {memory_after_first_second / 1024 ** 2:.1f} MiB, "
+          f"at the end: {memory_at_end / 1024 ** 2:.1f} MiB")
+    print(f"buffer writes: {write_times['count']}, {write_times['mean'] * 1000:.2f}ms on average, {write_times['max'] * 1000:.2f}ms at most")
+    print(f"high-water mark: {max(track['high_water_seconds'] for track in stats.values()):.2f}s of audio, "
+          f"dropped frames: {sum(track['dropped_frames'] for track in stats.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare the startup time and the memory usage (max RSS) of the headless mode and the GUI, on a simulated graph
+
+Every mode is started in a fresh python process. The headless mode imports the modules, loads the graph, and applies a
+route, the GUI builds the main window using the offscreen Qt platform (so it does not need a display), and runs the event
+loop until the window is painted (time to first paint) and the graph is loaded (time to interactive)
+
+usage: python benchmarks/bench_startup.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+
+REPEATS = 5
+
+COMMON_CODE = """
+import contextlib, io, json, resource, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+"""
+
+HEADLESS_CODE = COMMON_CODE + """
+    import headless, pw_backend, pw_interface
+    backend = pw_backend.SimulatedBackend()
+    backend.populate(100, linked=True)
+    pw_interface.set_backend(backend)
+    routes = [headless.Route({"inputs": [{"application.name": "Simulated App 0"}]}, 0)]
+    node_manager = pw_interface.NodeManager()
+    daemon = headless.RoutingDaemon(routes, pw_interface.VirtualSinkManager(), node_manager)
+    daemon.start()
+    daemon.sticky_router.apply_all()
+    ready = time.perf_counter()
+    first_paint = None
+    node_manager.close()
+"""
+
+GUI_CODE = COMMON_CODE + """
+    from PyQt6 import QtCore
+    from PyQt6.QtWidgets import QApplication
+    import pw_backend, pw_interface, widgets
+    backend = pw_backend.SimulatedBackend()
+    backend.populate(100, linked=True)
+    pw_interface.set_backend(backend)
+    app = QApplication(sys.argv)
+    node_manager = pw_interface.NodeManager(initial_update=False)
+    window = widgets.MainWindow(pw_interface.VirtualSinkManager(), node_manager, startup_start=start)
+    window.show()
+    while len(window.startup_times) < 2 and time.perf_counter() - start < 10:
+        app.processEvents(QtCore.QEventLoop.ProcessEventsFlag.AllEvents, 10)
+    ready = start + window.startup_times["interactive"]
+    first_paint = window.startup_times["first_paint"]
+    window.close()
+    node_manager.close()
+"""
+
+REPORT_CODE = """
+print(json.dumps({"seconds": ready - start, "first_paint": first_paint, "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "pyqt_imported": "PyQt6" in sys.modules}))
+"""
+
+
+def run_mode(code: str) -> dict | None:
+    """
+    Start a fresh python process running the startup code of a mode
+
+    :param code: the startup code of the mode
+    :return: the measured startup time and memory usage, or None if the process failed
+    """
+    process = subprocess.run([sys.executable, "-c", code + REPORT_CODE], capture_output=True, text=True,
+                             env={**os.environ, "QT_QPA_PLATFORM": "offscreen"})
+    if process.returncode != 0:
+        print(process.stderr.strip().splitlines()[-1], file=sys.stderr)
+        return None
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    print(f"{'mode':>9} {'startup':>9} {'1st paint':>10} {'max RSS':>10} {'PyQt6':>6}")
+    for mode, code in (("headless", HEADLESS_CODE), ("gui", GUI_CODE)):
+        results = [run_mode(code)]
+        if results[0] is None:
+            print(f"{mode:>9} could not be started")
+            continue
+        results.extend(run_mode(code) for _ in range(REPEATS - 1))
+        first_paint = "-" if results[0]["first_paint"] is None else \
+            f"{min(result['first_paint'] for result in results):.4f}s"
+        print(f"{mode:>9} {min(result['seconds'] for result in results):>8.4f}s {first_paint:>10} "
+              f"{min(result['max_rss_kib'] for result in results) / 1024:>7.1f}MiB "
+              f"{'yes' if results[0]['pyqt_imported'] else 'no':>6}")
+
+
+if __name__ == "__main__":
+    main()
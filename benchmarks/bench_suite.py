@@ -0,0 +1,167 @@
+"""
+Benchmark the graph loading and routing code on the checked-in "pw-cli info all" fixtures (see make_fixtures.py)
+
+The results are written as JSON, so they can be kept and compared between runs: with --compare, the run fails if any
+benchmark got slower than the baseline by more than --threshold times
+
+usage: python benchmarks/bench_suite.py [--output results.json] [--compare baseline.json] [--threshold 1.25]
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import pw_backend
+import pw_interface
+from make_fixtures import OBJECT_COUNTS, fixture_path
+
+
+class FixtureBackend(pw_backend.PipeWireBackend):
+    """
+    A backend that serves a recorded graph dump, and ignores every change
+    """
+
+    def __init__(self, dump: str):
+        """
+        :param dump: the recorded output of "pw-cli info all"
+        """
+        self.dump: str = dump
+
+    def info_all(self) -> str:
+        return self.dump
+
+    def apply_link_operations(self, operations: [pw_backend.LinkOperation]) -> None:
+        pass
+
+
+def measure(function, repeats: int) -> dict[str, float | int]:
+    """
+    Run a function several times, and collect its run times
+
+    :param function: the function to be measured, it is called without arguments
+    :param repeats: the number of runs
+    :return: the statistics of the run times, in seconds
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "max": max(times), "repeats": repeats}
+
+
+def pair_ports(node_manager: pw_interface.NodeManager) -> None:
+    """
+    Run the port pairing of connect_nodes for every source node to the default sink, without applying the links
+
+    :param node_manager: the NodeManager holding the graph
+    :return: None
+    """
+    sink_node = next(node for node in node_manager.get_nodes("Sink").values() if
+                     node.node_name == "alsa_output.pci-0000_00_1f.3.analog-stereo")
+    transaction = pw_interface.LinkTransaction(node_manager)
+    for source_node in node_manager.get_nodes("Source").values():
+        pw_interface.connect_nodes(source_node, sink_node, transaction=transaction)
+
+
+def run_fixture(object_count: int) -> [dict]:
+    """
+    Run every benchmark on one fixture
+
+    :param object_count: the object count of the fixture
+    :return: the list of results
+    """
+    with gzip.open(fixture_path(object_count), "rt", encoding="utf-8") as fixture_file:
+        dump = fixture_file.read()
+    pw_interface.set_backend(FixtureBackend(dump))
+    repeats = 3 if object_count >= 50_000 else 10
+
+    raw_object_data_rjson = pw_interface._get_all_data()
+    object_ids = {object_type: pw_interface._get_object_ids(object_type, raw_object_data_rjson) for object_type in
+                  ("Node", "Port", "Link")}
+    node_manager = pw_interface.NodeManager(monitor=False)
+
+    benchmarks = {
+        "_get_all_data": lambda: pw_interface._get_all_data(),
+        "_get_object_ids": lambda: [pw_interface._get_object_ids(object_type, raw_object_data_rjson) for object_type
+                                    in ("Node", "Port", "Link")],
+        "_get_object_info": lambda: [pw_interface._get_object_info(object_id, raw_object_data_rjson) for ids in
+                                     object_ids.values() for object_id in ids],
+        "_parse_all_data": lambda: pw_interface._parse_all_data(dump, ("Node", "Port", "Link")),
+        "NodeManager.full_update": node_manager.full_update,
+        "NodeManager.update (cached)": node_manager.update,
+        "get_nodes(Source)": lambda: node_manager.get_nodes("Source"),
+        "get_nodes(Sink)": lambda: node_manager.get_nodes("Sink"),
+        "connect_nodes pairing": lambda: pair_ports(node_manager),
+    }
+    return [{"fixture": os.path.basename(fixture_path(object_count)), "objects": len(raw_object_data_rjson),
+             "benchmark": name, "seconds": measure(function, repeats)} for name, function in benchmarks.items()]
+
+
+def compare(results: [dict], baseline_path: str, threshold: float) -> [str]:
+    """
+    Compare the results with a previous run
+
+    :param results: the results of this run
+    :param baseline_path: the JSON file written by a previous run
+    :param threshold: how many times slower a benchmark may get before it counts as a regression
+    :return: the descriptions of the regressions
+    """
+    with open(baseline_path, "r") as baseline_file:
+        baseline = {(result["fixture"], result["benchmark"]): result["seconds"]["min"] for result in
+                    json.load(baseline_file)["results"]}
+    regressions = []
+    for result in results:
+        baseline_time = baseline.get((result["fixture"], result["benchmark"]))
+        if baseline_time and result["seconds"]["min"] > baseline_time * threshold:
+            regressions.append(f"{result['fixture']} {result['benchmark']}: {baseline_time:.6f}s -> "
+                               f"{result['seconds']['min']:.6f}s")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the graph loading and routing code")
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    parser.add_argument("--compare", help="a JSON file of a previous run to compare the results with")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="how many times slower a benchmark may get before it counts as a regression")
+    args = parser.parse_args()
+
+    results = []
+    for object_count in OBJECT_COUNTS:
+        with contextlib.redirect_stdout(io.StringIO()):  # the timing messages of the NodeManager are not needed
+            fixture_results = run_fixture(object_count)
+        for result in fixture_results:
+            print(f"{result['fixture']:>22} {result['benchmark']:>27} {result['seconds']['min']:>10.6f}s",
+                  file=sys.stderr)
+        results.extend(fixture_results)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(), "created": time.time(),
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measure how long creating and removing virtual sinks takes with one pw-loopback process per sink ("process" mode),
+and with all sinks loaded as modules into one shared pw-cli session ("shared" mode)
+
+Creation is measured until the nodes of every sink are in the graph, removal until all of them are gone from it
+This needs a running pipewire server
+
+usage: python benchmarks/bench_virtual_sinks.py [number of sinks]
+"""
+import os
+import sys
+import time
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import pw_backend
+import pw_interface
+
+SINK_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+TIMEOUT = 10.0
+
+
+def wait_until_removed(node_manager: pw_interface.NodeManager, names: set[str]) -> None:
+    """
+    Wait until no node of the given virtual sinks is in the graph
+
+    :param node_manager: the NodeManager following the graph
+    :param names: the names of the removed virtual sinks
+    :return: None
+    """
+    media_names = names | {f"{name} output" for name in names}
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        seen_generation = node_manager.graph_monitor.generation
+        node_manager.update()
+        with node_manager.lock:
+            if not any(node.media_name in media_names for node in node_manager.nodes.values()):
+                return
+        node_manager.graph_monitor.wait_for_batches(seen_generation, deadline - time.monotonic())
+    raise RuntimeError("The virtual sinks were not removed in time")
+
+
+def measure(virtual_sink_mode: str) -> tuple[float, float]:
+    """
+    Create and remove SINK_COUNT virtual sinks
+
+    :param virtual_sink_mode: "process" or "shared"
+    :return: the (creation time, removal time) in seconds
+    """
+    pw_interface.set_backend(pw_backend.SubprocessBackend(virtual_sink_mode))
+    node_manager = pw_interface.NodeManager()
+    virtual_sink_manager = pw_interface.VirtualSinkManager()
+    try:
+        create_start = time.perf_counter()
+        virtual_sinks = [virtual_sink_manager.create_virtual_sink() for _ in range(SINK_COUNT)]
+        for virtual_sink in virtual_sinks:
+            node_manager.wait_for_loopback(virtual_sink, timeout=TIMEOUT, disconnect_output=False)
+        create_time = time.perf_counter() - create_start
+
+        remove_start = time.perf_counter()
+        virtual_sink_manager.terminate_all()
+        wait_until_removed(node_manager, {virtual_sink.name for virtual_sink in virtual_sinks})
+        remove_time = time.perf_counter() - remove_start
+    finally:
+        virtual_sink_manager.terminate_all()
+        node_manager.close()
+        pw_interface.BACKEND.close()
+    return create_time, remove_time
+
+
+def main() -> None:
+    results = {virtual_sink_mode: measure(virtual_sink_mode) for virtual_sink_mode in ("process", "shared")}
+    print(f"{SINK_COUNT} virtual sinks")
+    print(f"{'mode':>8} {'create':>9} {'remove':>9}")
+    for virtual_sink_mode, (create_time, remove_time) in results.items():
+        print(f"{virtual_sink_mode:>8} {create_time:>8.3f}s {remove_time:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
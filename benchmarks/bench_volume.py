@@ -0,0 +1,113 @@
+"""
+Compare sending every volume change of a dragged slider to the backend right away with sending them through the
+VolumeController, which coalesces them, on a simulated graph
+
+The slider is dragged for DURATION seconds, producing EVENT_RATE volume changes a second. For both ways it prints how
+long the slider waited for the changes (the GUI would be blocked meanwhile), how many batches reached the backend, and
+how many node changes the NodeManager received from the graph monitor
+
+usage: python benchmarks/bench_volume.py [volume changes a second]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import metrics
+import pw_backend
+import pw_interface
+
+EVENT_RATE = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+DURATION = 2.0
+
+
+class CountingBackend(pw_backend.SimulatedBackend):
+    """
+    A SimulatedBackend that counts the volume batches it receives, and takes as long as a write to pw-cli to apply them
+    """
+
+    # the time a batch takes to reach pw-cli and be applied
+    batch_latency: float = 0.0005
+
+    def __init__(self):
+        super().__init__()
+        self.volume_batches: int = 0
+
+    def set_loopback_volumes(self, volumes: dict[int, tuple[float, bool]]) -> None:
+        time.sleep(self.batch_latency)
+        self.volume_batches += 1
+        super().set_loopback_volumes(volumes)
+
+
+def drag_slider(set_volume) -> float:
+    """
+    Produce EVENT_RATE volume changes a second for DURATION seconds
+
+    :param set_volume: called with every new volume
+    :return: the seconds spent in set_volume
+    """
+    blocked = 0.0
+    start = time.perf_counter()
+    next_event = start
+    while (now := time.perf_counter()) - start < DURATION:
+        set_volume((now - start) / DURATION)
+        blocked += time.perf_counter() - now
+        next_event += 1 / EVENT_RATE
+        time.sleep(max(0.0, next_event - time.perf_counter()))
+    return blocked
+
+
+def run(coalesced: bool) -> tuple[float, int, int]:
+    """
+    Drag a slider of a virtual sink
+
+    :param coalesced: whether the changes go through the VolumeController, or straight to the backend
+    :return: the seconds the slider waited, the number of batches sent, the number of node changes received
+    """
+    backend = CountingBackend()
+    pw_interface.set_backend(backend)
+    node_manager = pw_interface.NodeManager()
+    virtual_sink_manager = pw_interface.VirtualSinkManager()
+    (_, (sink_node, _, _)), = virtual_sink_manager.create_virtual_sinks(1, node_manager)
+    node_manager.update()
+    received_before = metric_value("monitor_objects_total")
+    if coalesced:
+        blocked = drag_slider(lambda volume: virtual_sink_manager.volume_controller.set_volume(sink_node.id, volume))
+    else:
+        blocked = drag_slider(lambda volume: backend.set_loopback_volumes({sink_node.id: (volume ** 3, False)}))
+    virtual_sink_manager.terminate_all()
+    node_manager.update()
+    received = metric_value("monitor_objects_total") - received_before
+    node_manager.close()
+    return blocked, backend.volume_batches, received
+
+
+def metric_value(name: str) -> float:
+    """
+    Get the value of a counter of the metrics registry
+
+    :param name: the name of the counter
+    :return: its value, 0 if it was never increased
+    """
+    counters = metrics.REGISTRY.as_dict()["counters"].get(name, [])
+    return sum(counter["value"] for counter in counters)
+
+
+def main() -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        direct = run(coalesced=False)
+        coalesced = run(coalesced=True)
+    print(f"{EVENT_RATE * DURATION:.0f} volume changes in {DURATION:.0f}s")
+    for name, (blocked, batches, received) in (("sent one by one", direct), ("VolumeController", coalesced)):
+        print(f"{name}: slider blocked for {blocked:.3f}s, {batches} batches sent, {received:.0f} objects received "
+              f"from the graph monitor")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare the time until the first graph snapshot can be shown with a cold start (loading and parsing the whole graph)
+and with a warm start (loading the graph saved by the last run from the warm start file), and the time it takes to
+reconcile the warm started graph with the live one, on a simulated graph
+
+With a real sound server the cold start also waits for pw-cli or pw-dump to print the graph, which the simulated graph
+does not, so the difference is bigger there
+
+usage: python benchmarks/bench_warm_start.py [number of apps]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import graph_cache
+import pw_backend
+import pw_interface
+
+APP_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+REPEATS = 5
+
+
+def make_backend() -> pw_backend.SimulatedBackend:
+    """
+    Create the simulated graph, the same one every time, so the object ids match between the runs
+
+    :return: the backend of the simulated graph
+    """
+    backend = pw_backend.SimulatedBackend()
+    backend.populate(APP_COUNT, linked=True)
+    return backend
+
+
+def main() -> None:
+    cache_path = os.path.join(tempfile.mkdtemp(), "warm_start.bin")
+    cold_times, warm_times, reconcile_times = [], [], []
+    with contextlib.redirect_stdout(io.StringIO()):  # the messages of the NodeManager are not needed
+        pw_interface.set_backend(make_backend())
+        node_manager = pw_interface.NodeManager(monitor=False)
+        graph_cache.save(cache_path, node_manager, [])
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            node_manager = pw_interface.NodeManager(monitor=False)
+            cold_times.append(time.perf_counter() - start)
+
+            pw_interface.set_backend(make_backend())
+            node_manager = pw_interface.NodeManager(initial_update=False)
+            start = time.perf_counter()
+            node_manager.warm_start(graph_cache.load(cache_path)[0])
+            warm_times.append(time.perf_counter() - start)
+            node_manager.graph_monitor.initial_dump_received.wait()
+            start = time.perf_counter()
+            node_manager.update()
+            reconcile_times.append(time.perf_counter() - start)
+            node_manager.close()
+
+    print(f"{APP_COUNT} apps, {os.path.getsize(cache_path) / 1024:.0f} KiB warm start file")
+    print(f"cold start, first snapshot: {min(cold_times):.4f}s")
+    print(f"warm start, first snapshot: {min(warm_times):.4f}s")
+    print(f"reconciling with the live graph: {min(reconcile_times):.4f}s")
+
+
+if __name__ == "__main__":
+    main()
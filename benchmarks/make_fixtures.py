@@ -0,0 +1,84 @@
+"""
+Generate the "pw-cli info all" graph dump fixtures used by bench_suite.py
+
+The graphs are built with pw_backend.SimulatedBackend, with a mix of objects similar to a busy streaming machine: a
+client for every app, stereo, mono and 5.1 app streams linked to the default sink, hardware devices, and some
+blacklisted nodes. The same object count always produces the same dump
+
+usage: python benchmarks/make_fixtures.py
+"""
+import gzip
+import os
+import sys
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import pw_backend
+
+FIXTURES_DIR = os.path.join(ROOT_DIR, "benchmarks", "fixtures")
+OBJECT_COUNTS = (50, 500, 5_000, 50_000)
+
+SURROUND_CHANNELS = ("FL", "FR", "FC", "LFE", "RL", "RR")
+APP_NAMES = ("Firefox", "Chromium", "OBS", "Discord", "Tauon Music Box", "mpv", "Steam", "VirtualBoxVM")
+
+
+def fixture_path(object_count: int) -> str:
+    """
+    Get the path of a fixture file
+
+    :param object_count: the number of objects in the fixture
+    :return: the path of the gzip compressed dump
+    """
+    return os.path.join(FIXTURES_DIR, f"graph_{object_count}.txt.gz")
+
+
+def build_graph(object_count: int) -> pw_backend.SimulatedBackend:
+    """
+    Build a simulated graph with about the given number of objects
+
+    :param object_count: the desired number of objects
+    :return: the SimulatedBackend holding the graph
+    """
+    backend = pw_backend.SimulatedBackend()
+    sink_port_ids = backend.get_port_ids(backend.default_sink_node_id, "input")
+    backend.add_node({"node.name": "Midi-Bridge", "media.class": "Midi/Bridge"}, input_channels=("0",),
+                     output_channels=("0",), input_prefix="Midi Through:(playback_0)",
+                     output_prefix="Midi Through:(capture_0)")
+
+    app_index = 0
+    while len(backend.objects) < object_count:
+        if app_index % 25 == 24:  # hardware devices show up between the apps
+            backend.add_object("Device", {"props": {"device.name": f"alsa_card.usb-{app_index}",
+                                                    "media.class": "Audio/Device"}})
+            backend.add_node({"node.name": f"alsa_output.usb-{app_index}.analog-stereo", "media.class": "Audio/Sink",
+                              "node.description": f"USB Audio {app_index}"}, input_channels=("FL", "FR"),
+                             output_channels=("FL", "FR"), output_prefix="monitor")
+            app_index += 1
+            continue
+
+        app_name = "Plasma PA" if app_index % 40 == 39 else APP_NAMES[app_index % len(APP_NAMES)]
+        channels = ("MONO",) if app_index % 10 == 9 else SURROUND_CHANNELS if app_index % 15 == 14 else ("FL", "FR")
+        backend.add_object("Client", {"props": {"application.name": app_name,
+                                                "application.process.id": 1000 + app_index}})
+        node_id = backend.add_app_stream(app_name, f"{app_name} stream {app_index}", channels)
+        for source_port_id, sink_port_id in zip(backend.get_port_ids(node_id, "output"), sink_port_ids * 3):
+            backend.link_ports(source_port_id, sink_port_id)
+        app_index += 1
+    return backend
+
+
+def main() -> None:
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for object_count in OBJECT_COUNTS:
+        backend = build_graph(object_count)
+        # mtime=0 keeps the compressed file the same every time it is generated
+        with open(fixture_path(object_count), "wb") as fixture_file:
+            fixture_file.write(gzip.compress(backend.info_all().encode("utf-8"), mtime=0))
+        print(f"wrote {fixture_path(object_count)}: {len(backend.objects)} objects")
+
+
+if __name__ == "__main__":
+    main()
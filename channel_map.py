@@ -0,0 +1,94 @@
+"""
+Channel position aware pairing of the ports of two nodes
+
+The ports are paired by their channel positions ("audio.channel", for example FL, FR, FC, LFE, MONO), so nodes with
+different channel layouts can be connected too: a mono source is sent to both front channels of a stereo sink, and the
+channels a sink does not have are mixed into the closest ones it has (5.1 or 7.1 to stereo for example), pipewire adds
+up everything linked into the same input port
+
+Planning only depends on the channel layouts of the two nodes, so the plans are cached, and connecting the same kinds of
+nodes again does not plan anything
+"""
+import functools
+
+# the channel a single port node is treated as, whatever its channel position is
+MONO = "MONO"
+
+# the channel positions that are recognised at the end of port names, like playback_FL, if pipewire does not tell them
+KNOWN_CHANNELS: frozenset[str] = frozenset((MONO, "FL", "FR", "FC", "LFE", "SL", "SR", "FLC", "FRC", "RC", "RL", "RR",
+                                            "TC", "TFL", "TFC", "TFR", "TRL", "TRC", "TRR"))
+
+# the channel positions tried in order, for the channels the sink does not have, every entry is a group of channels, the
+# first group the sink has all channels of is used, the audio of the channel is sent to all channels of the group
+DOWNMIX_TARGETS: dict[str, tuple[tuple[str, ...], ...]] = {
+    MONO: (("FL", "FR"), ("FC",)),
+    "FC": (("FL", "FR"), (MONO,)),
+    "LFE": (("FL", "FR"), ("FC",), (MONO,)),
+    "FLC": (("FL",), ("FC",), (MONO,)),
+    "FRC": (("FR",), ("FC",), (MONO,)),
+    "SL": (("RL",), ("FL",), (MONO,)),
+    "SR": (("RR",), ("FR",), (MONO,)),
+    "RL": (("SL",), ("FL",), (MONO,)),
+    "RR": (("SR",), ("FR",), (MONO,)),
+    "RC": (("RL", "RR"), ("SL", "SR"), ("FL", "FR"), (MONO,)),
+    "FL": (("FC",), (MONO,)),
+    "FR": (("FC",), (MONO,)),
+}
+
+
+def get_layout_channel(channel: str | None, single_port: bool) -> str | None:
+    """
+    Get the channel a port is planned as
+
+    :param channel: the channel position of the port, None if it is not known
+    :param single_port: whether the node has only this one port on this side
+    :return: MONO for single ports, otherwise the channel position
+    """
+    return MONO if single_port else channel
+
+
+@functools.lru_cache(maxsize=256)
+def plan_pairs(source_layout: tuple[str | None, ...], sink_layout: tuple[str | None, ...],
+               source_names: tuple[str, ...] = (), sink_names: tuple[str, ...] = ()) -> tuple[tuple[int, int], ...]:
+    """
+    Plan which output port of a source node is linked to which input port of a sink node
+
+    Every source channel is linked to the sink port of the same channel, the channels the sink does not have are
+    linked to the DOWNMIX_TARGETS, and a mono source is linked to the front channels. If the channel positions of the
+    ports are not known, and the number of ports match, the ports are paired in the order of their reversed names,
+    so _FL - _FL and _FR - _FR pairs remain together
+
+    :param source_layout: the channels of the output ports of the source node, in the order of its ports
+    :param sink_layout: the channels of the input ports of the sink node, in the order of its ports
+    :param source_names: the names of the output ports, only used if their channels are not known
+    :param sink_names: the names of the input ports, only used if their channels are not known
+    :return: the (source port index, sink port index) pairs to be linked, empty if the nodes cannot be paired
+    """
+    if None in source_layout or None in sink_layout:
+        if len(source_layout) != len(sink_layout) or not source_layout:
+            return ()
+        return tuple(zip(sorted(range(len(source_layout)), key=lambda index: source_names[index][::-1]),
+                         sorted(range(len(sink_layout)), key=lambda index: sink_names[index][::-1])))
+
+    sink_indexes: dict[str, int] = {}
+    for sink_index, channel in enumerate(sink_layout):
+        sink_indexes.setdefault(channel, sink_index)
+
+    pairs: [tuple[int, int]] = []
+    for source_index, channel in enumerate(source_layout):
+        if channel in sink_indexes:
+            pairs.append((source_index, sink_indexes[channel]))
+            continue
+        for target_channels in DOWNMIX_TARGETS.get(channel, ()):
+            if all(target_channel in sink_indexes for target_channel in target_channels):
+                pairs.extend((source_index, sink_indexes[target_channel]) for target_channel in target_channels)
+                break
+        else:
+            if len(sink_layout) == 1:  # a mono sink gets every channel
+                pairs.append((source_index, 0))
+            elif channel == MONO:  # a mono source is sent to every channel of a sink without front channels
+                pairs.extend((source_index, sink_index) for sink_index in range(len(sink_layout)))
+
+    if not pairs and len(source_layout) == len(sink_layout):  # the layouts have nothing in common, like AUX0..AUXn
+        return tuple(zip(range(len(source_layout)), range(len(sink_layout))))
+    return tuple(pairs)
@@ -0,0 +1,145 @@
+"""
+Warm start cache: the last known graph and routing state, saved on exit and at intervals, so the next start can show
+them right away, before the live graph is loaded
+
+The file is a small header followed by the graph and routes as compact JSON. The header holds the length and the
+CRC-32 of the JSON, so a truncated or corrupted file is ignored, and every record is checked after parsing, so a file
+that does not hold what save() writes is ignored too, instead of failing the start
+
+The routes are stored in the same form as the entries of a headless routing file (see headless.py):
+    {"name": ..., "inputs": [{"application.name": ..., "node.name": ...}, ...], "output": {"node.name": ...} or None}
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import pw_interface
+
+MAGIC: bytes = b"SAARWARM"
+# increased every time the stored data changes its form, files of other versions are ignored
+FORMAT_VERSION: int = 2
+# the magic bytes, the format version, the length of the JSON data, and its CRC-32
+HEADER: struct.Struct = struct.Struct("<8sIQI")
+# the values a name stored in a record can have, see pw_interface._intern()
+NAME_TYPES: tuple[type, ...] = (str, int, float, bool, type(None))
+# the types of the fields of the records of each object type, in the order save() stores them
+RECORD_FIELD_TYPES: dict[str, tuple[tuple[type, ...], ...]] = {
+    "nodes": ((int,), NAME_TYPES, NAME_TYPES, NAME_TYPES),
+    "ports": ((int,), NAME_TYPES, NAME_TYPES, (int,), (str,), (str, type(None))),
+    "links": ((int,), (int,), (int,), (int,), (int,)),
+}
+
+
+def save(path: str, node_manager: pw_interface.NodeManager, routes: [dict]) -> None:
+    """
+    Save the graph of a NodeManager, and the routes, the file is replaced atomically, so a crash while saving leaves
+    the previous version in place
+
+    :param path: the path of the cache file
+    :param node_manager: the NodeManager storing the graph
+    :param routes: the active routes
+    :return: None
+    """
+    with node_manager.lock:
+        data = {
+            "nodes": [(node.id, node.node_name, node.app_name, node.media_name) for node in
+                      node_manager.nodes.values()],
+            "ports": [(port.id, port.name, port.alias, port.parent_node_id, port.direction, port.channel) for port in
+                      node_manager.ports.values()],
+            "links": [(link.id, link.output_node_id, link.output_port_id, link.input_node_id, link.input_port_id) for
+                      link in node_manager.links.values()],
+            "routes": routes,
+        }
+    payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as cache_file:
+        cache_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(payload), zlib.crc32(payload)))
+        cache_file.write(payload)
+    os.replace(temporary_path, path)
+
+
+def load(path: str) -> tuple[dict[str, dict[int, dict]], list[dict]] | None:
+    """
+    Load a cache file saved by save()
+
+    :param path: the path of the cache file
+    :return: the (objects by type, routes), where the objects are in the same form as _parse_all_data() returns them,
+    so they can be passed to NodeManager.warm_start(), or None if there is no usable cache file
+    """
+    try:
+        with open(path, "rb") as cache_file, mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, format_version, payload_length, checksum = HEADER.unpack_from(mapped)
+            if magic != MAGIC or format_version != FORMAT_VERSION or HEADER.size + payload_length != len(mapped):
+                return None
+            # slicing the map copies the data, so no view of the map is left when it is closed
+            payload = mapped[HEADER.size:]
+        if zlib.crc32(payload) != checksum:
+            return None
+        data = json.loads(payload)
+    # ValueError: also invalid JSON or UTF-8, RecursionError: JSON nested too deep
+    except (OSError, ValueError, BufferError, RecursionError, struct.error):
+        return None
+    if not _is_valid(data):
+        return None
+
+    objects_by_type = {
+        "Node": {node_id: {"id": node_id, "properties": {
+            "node.name": node_name, "application.name": app_name, "media.name": media_name}} for
+                 node_id, node_name, app_name, media_name in data["nodes"]},
+        "Port": {port_id: {"id": port_id, "direction": direction, "properties": {
+            "port.name": name, "port.alias": alias, "node.id": node_id, "audio.channel": channel}} for
+                 port_id, name, alias, node_id, direction, channel in data["ports"]},
+        "Link": {link_id: {"id": link_id, "output-node-id": output_node_id, "output-port-id": output_port_id,
+                           "input-node-id": input_node_id, "input-port-id": input_port_id} for
+                 link_id, output_node_id, output_port_id, input_node_id, input_port_id in data["links"]},
+    }
+    return objects_by_type, data["routes"]
+
+
+def _is_valid(data) -> bool:
+    """
+    Check that the data loaded from a cache file has the form save() stores: every record has the right number of
+    fields, of the right types, and the routes have the form RouteWidget.get_route_data() returns (the conditions of
+    their rules are checked when they are restored)
+
+    :param data: the parsed JSON data
+    :return: True if the data can be loaded
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("routes"), list) or not all(
+            _is_valid_route(route) for route in data["routes"]):
+        return False
+    for records_name, field_types in RECORD_FIELD_TYPES.items():
+        records = data.get(records_name)
+        if not isinstance(records, list):
+            return False
+        for record in records:
+            if not isinstance(record, list) or len(record) != len(field_types):
+                return False
+            for value, value_types in zip(record, field_types):
+                # bool is an int, but never an id
+                if not isinstance(value, value_types) or (value_types == (int,) and isinstance(value, bool)):
+                    return False
+    return True
+
+
+def _is_valid_route(route) -> bool:
+    """
+    Check that a route loaded from a cache file has the form RouteWidget.get_route_data() returns
+
+    :param route: the route
+    :return: True if the route can be restored
+    """
+    if not isinstance(route, dict):
+        return False
+    volume = route.get("volume", 1.0)
+    inputs = route.get("inputs", [])
+    return isinstance(route.get("name", ""), str) and isinstance(volume, (int, float)) and \
+        not isinstance(volume, bool) and volume >= 0 and isinstance(route.get("mute", False), bool) and \
+        isinstance(inputs, list) and all(isinstance(conditions, dict) for conditions in inputs) and \
+        isinstance(route.get("output"), (dict, type(None)))
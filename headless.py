@@ -0,0 +1,249 @@
+"""
+Headless mode: apply a routing file without the GUI, and keep it enforced while running
+
+This module does not import PyQt6, so it can be used on machines without a display
+
+usage: python main.py --headless routing.json [--record directory]
+
+The routing file is a json file with a list of virtual sinks, each with the nodes feeding it, and the node its output
+goes to (if no output is given, the output of the virtual sink is left connected to the default output). Nodes are
+matched by their "node.name", "application.name", and "media.name" properties, a node matches an entry if all of the
+given properties match, either an exact string, or a regex matching the whole value (see routing_rules.py):
+{
+    "virtual_sinks": [
+        {
+            "name": "Stream",
+            "inputs": [{"application.name": "Firefox"}, {"node.name": {"regex": "spotify|mpv"}}],
+            "output": {"node.name": "alsa_output.pci-0000_00_1f.3.analog-stereo"},
+            "volume": 0.8,
+            "mute": false
+        }
+    ]
+}
+
+The volume of a virtual sink is optional, 1.0 is 100%, on the same scale pavucontrol shows, and so is muting it
+
+With --record, every virtual sink is recorded into its own WAV file in the given directory while it runs (see
+recorder.py)
+"""
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+
+import pw_interface
+import recorder
+import routing_rules
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Route():
+    """
+    A virtual sink of the routing file: the nodes feeding it, and the node its output goes to
+    """
+
+    def __init__(self, route_data: dict, index: int):
+        """
+        Create a new route from its entry in the routing file
+
+        :param route_data: the entry of the virtual sink in the routing file
+        :param index: the place of the entry in the routing file, used in error messages
+        """
+        self.name: str = route_data.get("name", f"virtual sink {index}")
+        self.inputs: [dict[str, str]] = route_data.get("inputs", [])
+        self.output: dict[str, str] | None = route_data.get("output")
+        self.volume: float = route_data.get("volume", 1.0)
+        self.mute: bool = route_data.get("mute", False)
+        if isinstance(self.volume, bool) or not isinstance(self.volume, (int, float)) or self.volume < 0:
+            raise ValueError(f"{self.name}: the volume must be a number, at least 0")
+        if not isinstance(self.mute, bool):
+            raise ValueError(f"{self.name}: mute must be true or false")
+        try:
+            for match in self.inputs:
+                routing_rules.parse_conditions(match)
+            if self.output is not None:
+                routing_rules.parse_conditions(self.output)
+        except ValueError as error:
+            raise ValueError(f"{self.name}: {error}")
+
+        # the virtual sink, and its loopback nodes, set by RoutingDaemon.start()
+        self.virtual_sink: pw_interface.VirtualSink | None = None
+        self.sink_node: pw_interface.Node | None = None
+        self.output_node: pw_interface.Node | None = None
+
+
+def load_routing(path: str) -> [Route]:
+    """
+    Load the routes from a routing file
+
+    :param path: the path of the routing file
+    :return: the list of routes in the file
+    """
+    with open(path, "r") as routing_file:
+        routing_data = json.load(routing_file)
+    return [Route(route_data, index) for index, route_data in enumerate(routing_data.get("virtual_sinks", []))]
+
+
+class RoutingDaemon():
+    """
+    Creates the virtual sinks of the routes, and keeps the nodes connected the way the routes describe it
+    """
+
+    # the longest time between two checks of all routes (which recreates the removed links), in seconds
+    check_interval: float = 1.0
+    # how often the metrics are written to the files set in the config, in seconds
+    metrics_interval: float = 10.0
+
+    def __init__(self, routes: [Route], virtual_sink_manager: pw_interface.VirtualSinkManager,
+                 node_manager: pw_interface.NodeManager):
+        """
+        Create a new RoutingDaemon
+
+        :param routes: the routes to be enforced
+        :param virtual_sink_manager: the VirtualSinkManager creating the virtual sinks
+        :param node_manager: the NodeManager storing the graph
+        """
+        self.routes: [Route] = routes
+        self.virtual_sink_manager: pw_interface.VirtualSinkManager = virtual_sink_manager
+        self.node_manager: pw_interface.NodeManager = node_manager
+        self.stop_event: threading.Event = threading.Event()
+        # connects the nodes matching the routes as soon as they appear
+        self.sticky_router: routing_rules.StickyRouter = routing_rules.StickyRouter(node_manager)
+
+    def start(self) -> None:
+        """
+        Create the virtual sinks of all routes at once, wait for their nodes, then add the rules of the routes
+
+        :return: None
+        """
+        virtual_sinks = self.virtual_sink_manager.create_virtual_sinks(len(self.routes), self.node_manager,
+                                                                       disconnect_output=False)
+        for route, (virtual_sink, (sink_node, _, output_node)) in zip(self.routes, virtual_sinks):
+            route.virtual_sink, route.sink_node, route.output_node = virtual_sink, sink_node, output_node
+            LOGGER.info(f"{route.name}: {route.virtual_sink.name}")
+            # the virtual sinks are never inputs of an other route, so the routes cannot feed into each other
+            self.sticky_router.add_ignored_nodes((route.sink_node.id, route.output_node.id))
+        # the outputs are only disconnected from the default output if the routes send them somewhere else
+        self.node_manager.disconnect_all_links_from_ports(
+            [port_id for route in self.routes if route.output is not None for port_id in route.output_node.output_ports])
+        for route in self.routes:
+            for match in route.inputs:
+                self.sticky_router.add_rule(routing_rules.RoutingRule(match, sink_node_id=route.sink_node.id))
+            if route.output is not None:
+                self.sticky_router.add_rule(routing_rules.RoutingRule(route.output,
+                                                                      source_node_id=route.output_node.id))
+            if route.volume != 1.0 or route.mute:
+                self.set_volume(route.name, route.volume, route.mute)
+
+    def run(self) -> None:
+        """
+        Keep enforcing the routes until stop() is called
+        The nodes that appear are connected by the StickyRouter during update(), the whole graph is checked again
+        every check_interval, to recreate the links that were removed, and the metrics are written every
+        metrics_interval
+
+        :return: None
+        """
+        last_check = 0.0
+        last_metrics_write = time.monotonic()
+        while not self.stop_event.is_set():
+            graph_monitor = self.node_manager.graph_monitor
+            seen_generation = graph_monitor.generation if graph_monitor is not None else 0
+            self.node_manager.update()
+            if time.monotonic() - last_check >= self.check_interval:
+                self.sticky_router.apply_all()
+                last_check = time.monotonic()
+            if time.monotonic() - last_metrics_write >= self.metrics_interval:
+                pw_interface.write_metrics()
+                last_metrics_write = time.monotonic()
+            if graph_monitor is not None and graph_monitor.is_running():
+                graph_monitor.wait_for_batches(seen_generation, self.check_interval)
+            else:
+                self.stop_event.wait(self.check_interval)
+
+    def stop(self) -> None:
+        """
+        Make run() return
+
+        :return: None
+        """
+        self.stop_event.set()
+
+    def set_volume(self, route_name: str, volume: float | None = None, mute: bool | None = None) -> None:
+        """
+        Set the volume and / or the mute state of the virtual sink of a route, returns right away, the changes are sent
+        by the VirtualSinkManager's VolumeController, which only sends the latest value at a limited rate, so this can
+        be called as often as needed
+
+        :param route_name: the name of the route
+        :param volume: the new volume, 1.0 is 100%, None to keep the current one
+        :param mute: the new mute state, None to keep the current one
+        :return: None
+        """
+        for route in self.routes:
+            if route.name == route_name:
+                self.virtual_sink_manager.volume_controller.set_volume(route.sink_node.id, volume, mute)
+                return
+        raise ValueError(f"there is no route named {route_name}")
+
+    def start_recording(self, directory: str) -> recorder.MultitrackRecorder:
+        """
+        Start recording every virtual sink into its own file, named after its route
+
+        :param directory: the directory the files are written to
+        :return: the started MultitrackRecorder
+        """
+        return recorder.MultitrackRecorder(directory, [
+            (route.name, route.virtual_sink.capture(recorder.CHANNELS, recorder.SAMPLE_RATE)) for route in
+            self.routes])
+
+
+def main(args: [str]) -> int:
+    """
+    Run the headless mode
+
+    :param args: the command line arguments after --headless
+    :return: the exit code
+    """
+    if len(args) not in (1, 3) or (len(args) == 3 and args[1] != "--record"):
+        print("usage: python main.py --headless routing.json [--record directory]")
+        return 1
+    record_directory = args[2] if len(args) == 3 else None
+
+    try:
+        routes = load_routing(args[0])
+    except (OSError, ValueError) as error:
+        LOGGER.error(f"Cannot load the routing file {args[0]}: {error}")
+        return 1
+
+    if not pw_interface.check_sound_server():
+        LOGGER.error("The sound server is not PipeWire, exiting...")
+        return 2
+
+    virtual_sink_manager = pw_interface.VirtualSinkManager()
+    node_manager = pw_interface.NodeManager()
+    daemon = RoutingDaemon(routes, virtual_sink_manager, node_manager)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+    multitrack_recorder = None
+    try:
+        daemon.start()
+        if record_directory is not None:
+            multitrack_recorder = daemon.start_recording(record_directory)
+        daemon.run()
+    finally:
+        if multitrack_recorder is not None:
+            multitrack_recorder.stop()
+        daemon.sticky_router.close()
+        virtual_sink_manager.terminate_all()
+        node_manager.close()
+        pw_interface.BACKEND.close()
+        pw_interface.write_metrics()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
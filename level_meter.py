@@ -0,0 +1,200 @@
+"""
+Peak and RMS level meters of the virtual sinks
+
+The audio going into a virtual sink is captured as raw float32 samples (see pw_backend.PcmStream) by a background
+thread, which only copies it into a preallocated ring buffer of fixed size blocks. The levels are computed when they are
+asked for, at the refresh rate of the meters, over all the blocks that arrived since the last time, with a few
+vectorized NumPy operations (a strided reduction per channel), so the cost per sample stays tiny however many meters
+are running
+
+NumPy is optional: without it is_available() returns False, and no meters are shown
+"""
+import math
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:  # the level meters are optional
+    numpy = None
+
+import metrics
+import pw_backend
+
+CHANNELS: int = len(pw_backend.LOOPBACK_CHANNELS)
+SAMPLE_RATE: int = pw_backend.CAPTURE_SAMPLE_RATE
+# the number of frames the captured audio is split into, about 43 ms at 48 kHz, about as long as a refresh of the
+# meters, so the reader thread wakes up about as often as the meters are redrawn
+BLOCK_FRAMES: int = 2048
+# the number of blocks the ring buffer holds, the levels have to be read at least this often: about 340 ms at 48 kHz
+RING_BLOCKS: int = 8
+# the level shown for silence, in dBFS, quieter levels are shown as this
+SILENCE_DB: float = -60.0
+
+
+def is_available() -> bool:
+    """
+    Determine if level meters can be used
+
+    :return: True if NumPy is installed
+    """
+    return numpy is not None
+
+
+def to_db(level: float) -> float:
+    """
+    Convert a sample level to dBFS
+
+    :param level: the level, 1.0 is full scale
+    :return: the level in dBFS, at least SILENCE_DB
+    """
+    return max(SILENCE_DB, 20 * math.log10(level)) if level > 0 else SILENCE_DB
+
+
+class RingBuffer():
+    """
+    A preallocated ring of fixed size blocks of interleaved float32 samples, filled by a single writer thread and read
+    by a single reader thread without locking: the reader never reads the block the writer may be filling
+    """
+
+    def __init__(self, block_count: int = RING_BLOCKS, block_frames: int = BLOCK_FRAMES, channels: int = CHANNELS):
+        """
+        Allocate a new ring buffer
+
+        :param block_count: the number of blocks in the ring
+        :param block_frames: the number of frames in a block
+        :param channels: the number of channels of a frame
+        """
+        self.blocks: "numpy.ndarray" = numpy.zeros((block_count, block_frames, channels), dtype=numpy.float32)
+        # the byte views of the blocks, the samples are read straight into them
+        self.block_views: [memoryview] = [memoryview(block).cast("B") for block in self.blocks]
+        self.blocks_written: int = 0  # the number of blocks filled since the start, only changed by the writer
+
+    def fill_next_block(self, stream: pw_backend.PcmStream) -> bool:
+        """
+        Read the next block from a stream, overwriting the oldest block
+
+        :param stream: the stream the samples are read from
+        :return: False if the stream ended before the block was filled
+        """
+        block_view = self.block_views[self.blocks_written % len(self.blocks)]
+        filled = 0
+        while filled < len(block_view):
+            read = stream.readinto(block_view[filled:])
+            if not read:
+                return False
+            filled += read
+        self.blocks_written += 1
+        return True
+
+    def get_blocks_since(self, block_number: int) -> tuple[["numpy.ndarray"], int, int]:
+        """
+        Get the blocks filled since a given block
+
+        :param block_number: the number of blocks written the last time the blocks were read
+        :return: the (blocks as at most two contiguous arrays of blocks, the number of blocks written now, the number of
+        blocks that were overwritten before they could be read)
+        """
+        blocks_written = self.blocks_written
+        # the oldest block may be being overwritten already, it is never read
+        first_block = max(block_number, blocks_written - len(self.blocks) + 1)
+        if first_block >= blocks_written:
+            return [], blocks_written, 0
+        start, end = first_block % len(self.blocks), blocks_written % len(self.blocks)
+        if start < end:
+            segments = [self.blocks[start:end]]
+        else:  # the blocks wrap around the end of the ring
+            segments = [segment for segment in (self.blocks[start:], self.blocks[:end]) if len(segment)]
+        return segments, blocks_written, first_block - block_number
+
+
+class LevelMeter():
+    """
+    Measures the peak and RMS levels of every channel of a PcmStream
+    """
+
+    # how long the last levels are shown when no new audio arrived, parec writes the audio in bursts, so some
+    # refreshes get nothing, in seconds
+    hold_time: float = 0.25
+
+    def __init__(self, stream: pw_backend.PcmStream, channels: int = CHANNELS, ring_blocks: int = RING_BLOCKS,
+                 block_frames: int = BLOCK_FRAMES):
+        """
+        Start reading the stream in a background thread
+
+        :param stream: the stream of interleaved float32 samples, it is closed by close()
+        :param channels: the number of channels of the stream
+        :param ring_blocks: the number of blocks in the ring buffer
+        :param block_frames: the number of frames in a block
+        """
+        self.stream: pw_backend.PcmStream = stream
+        self.channels: int = channels
+        self.ring: RingBuffer = RingBuffer(ring_blocks, block_frames, channels)
+        # the absolute values of the samples are computed into this, so computing the levels allocates nothing large
+        self.scratch: "numpy.ndarray" = numpy.empty(self.ring.blocks.size, dtype=numpy.float32)
+        self.blocks_read: int = 0
+        self.levels: [tuple[float, float]] = [(SILENCE_DB, SILENCE_DB)] * channels
+        self.levels_time: float = 0.0  # the time.monotonic() the levels were last computed at
+        self.reader_thread: threading.Thread = threading.Thread(target=self._read_stream, daemon=True)
+        self.reader_thread.start()
+
+    def _read_stream(self) -> None:
+        """
+        Copy the stream into the ring buffer until it ends, runs in the reader thread
+
+        :return: None
+        """
+        while self.ring.fill_next_block(self.stream):
+            pass
+
+    def is_running(self) -> bool:
+        """
+        Determine if the stream is still being read
+
+        :return: True if the stream has not ended yet
+        """
+        return self.reader_thread.is_alive()
+
+    def get_levels(self) -> [tuple[float, float]]:
+        """
+        Get the levels of the audio that arrived since the last call
+
+        :return: the (peak, RMS) levels in dBFS of every channel, if nothing arrived, the last levels for hold_time
+        seconds, then SILENCE_DB
+        """
+        segments, self.blocks_read, dropped_blocks = self.ring.get_blocks_since(self.blocks_read)
+        if dropped_blocks:
+            metrics.REGISTRY.counter("level_meter_dropped_blocks_total",
+                                     "Captured blocks overwritten before the meters read them").inc(dropped_blocks)
+        now = time.monotonic()
+        if not segments:
+            if now - self.levels_time > self.hold_time:
+                self.levels = [(SILENCE_DB, SILENCE_DB)] * self.channels
+            return self.levels
+
+        peaks = [0.0] * self.channels
+        square_sums = [0.0] * self.channels
+        sample_count = 0
+        for segment in segments:
+            # the segments are contiguous, the samples of a channel are every channels-th sample of them
+            samples = segment.reshape(-1)
+            absolute_samples = numpy.abs(samples, out=self.scratch[:samples.size])
+            for channel in range(self.channels):
+                channel_samples = samples[channel::self.channels]
+                peaks[channel] = max(peaks[channel], float(absolute_samples[channel::self.channels].max()))
+                square_sums[channel] += float(numpy.dot(channel_samples, channel_samples))
+            sample_count += samples.size
+        frame_count = sample_count // self.channels
+        self.levels = [(to_db(peak), to_db(math.sqrt(square_sum / frame_count))) for peak, square_sum in
+                       zip(peaks, square_sums)]
+        self.levels_time = now
+        return self.levels
+
+    def close(self) -> None:
+        """
+        Stop reading, and close the stream
+
+        :return: None
+        """
+        self.stream.close()
+        self.reader_thread.join()
@@ -1,4 +1,13 @@
 import sys
+import time
+
+STARTUP_START = time.perf_counter()  # the startup times of the window are measured from here
+
+# the headless mode only applies a routing file, it is started before PyQt6 is imported, so it does not need it at all
+if len(sys.argv) > 1 and sys.argv[1] == "--headless":
+    import headless
+
+    sys.exit(headless.main(sys.argv[2:]))
 
 try:
     from PyQt6 import uic, QtCore
@@ -10,24 +19,26 @@ except ImportError or ModuleNotFoundError as ie:
     print("Please install PyQT6 using your system's package manager.")
     exit(1)
 
+import concurrent.futures
+import logging
+
+import graph_cache
 import pw_interface
 import widgets
 
-APP = QApplication(sys.argv)  # the main app instance
-APP.setWindowIcon(QIcon("media/icon_round_96dpi.png"))
+LOGGER = logging.getLogger(__name__)
 
-# Show error popup if not running on pipewire
-if not pw_interface.check_sound_server():
-    mess = widgets.NoPipeWireWarningDialog()
+# the sound server check ("pactl info") runs in the background while the window is built
+STARTUP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+SOUND_SERVER_CHECK = STARTUP_EXECUTOR.submit(pw_interface.check_sound_server)
 
-    mess.show()
-    mess.exec()
-    exit(2)
+APP = QApplication(sys.argv)  # the main app instance
+APP.setWindowIcon(QIcon("media/icon_round_96dpi.png"))
 
 AVAILABLE_THEMES = QStyleFactory.keys()  # get a list of available themes
-print(f"Available themes: {AVAILABLE_THEMES}")
+LOGGER.debug(f"Available themes: {AVAILABLE_THEMES}")
 APP.setStyle(AVAILABLE_THEMES[0])  # pick the first available theme
-print(f"Current theme: {APP.style().objectName()}")
+LOGGER.debug(f"Current theme: {APP.style().objectName()}")
 # set the main background to be transparent (my default theme uses transparent window backgrounds,
 # without this it would be opaque)
 APP.setStyleSheet("background-color: rgba(0, 0, 0, 0)")
@@ -36,13 +47,35 @@ APP.setStyleSheet("background-color: rgba(0, 0, 0, 0)")
 VSM = pw_interface.VirtualSinkManager()
 
 # the NodeManager manages the nodes, ports and links in the pipewire graph
-NM = pw_interface.NodeManager()
+# the graph is loaded by the MainWindow's GraphRefresher in the background, so the window can be shown right away
+NM = pw_interface.NodeManager(initial_update=False)
+
+# the graph and the routes saved by the last run are shown right away, the routes are recreated when the live graph is
+# loaded, which is then reconciled with the saved graph
+WARM_START = graph_cache.load(pw_interface.WARM_START_FILE) if pw_interface.WARM_START_FILE else None
+if WARM_START is not None:
+    NM.warm_start(WARM_START[0])
 
 try:
-    window = widgets.MainWindow(VSM, NM)
+    window = widgets.MainWindow(VSM, NM, startup_start=STARTUP_START,
+                                saved_routes=WARM_START[1] if WARM_START is not None else None,
+                                warm_start_file=pw_interface.WARM_START_FILE)
     window.show()
 
+    # Show error popup if not running on pipewire
+    if not SOUND_SERVER_CHECK.result():
+        window.close()
+        mess = widgets.NoPipeWireWarningDialog()
+
+        mess.show()
+        mess.exec()
+        exit(2)
+    STARTUP_EXECUTOR.shutdown()
+
     APP.exec()
 finally:
     # Terminate all crated virtual sinks on app exit
     VSM.terminate_all()
+    NM.close()
+    pw_interface.write_metrics()
+    pw_interface.BACKEND.close()
@@ -0,0 +1,342 @@
+"""
+Performance metrics and logging
+
+The metrics registry collects latency histograms and counters of the expensive operations: loading and parsing the
+graph, applying the changes of the graph monitor, link operations, and waiting for the nodes of the virtual sinks.
+They can be exported as JSON, or in the Prometheus text format (for example for the textfile collector of the node
+exporter), see pw_interface.write_metrics()
+
+The messages of the other modules are logged using the logging module, to stdout, the LOG_LEVEL in config.json decides
+which of them are shown, see configure_logging()
+"""
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# the upper bounds of the histogram buckets, in seconds, from sub millisecond parsing to multi second waits
+DEFAULT_BUCKETS: tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                                      10.0)
+
+
+class Counter():
+    """
+    A value that only goes up, for example the number of link operations
+    """
+
+    def __init__(self, name: str, labels: dict[str, str]):
+        """
+        Create a new counter, starting from zero
+
+        :param name: the name of the metric
+        :param labels: the labels of this counter, for example {"action": "connect"}
+        """
+        self.name: str = name
+        self.labels: dict[str, str] = labels
+        self.value: float = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        """
+        Increase the counter
+
+        :param amount: how much to increase it by
+        :return: None
+        """
+        with self.lock:
+            self.value += amount
+
+    def as_dict(self) -> dict:
+        """
+        Get the counter as a dict, for the JSON export
+
+        :return: the labels and the value of the counter
+        """
+        return {"labels": self.labels, "value": self.value}
+
+
+class Histogram():
+    """
+    The distribution of a measured value, usually the time an operation took, in seconds
+    """
+
+    def __init__(self, name: str, labels: dict[str, str], buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Create a new, empty histogram
+
+        :param name: the name of the metric
+        :param labels: the labels of this histogram, for example {"phase": "parse"}
+        :param buckets: the upper bounds of the buckets, in increasing order
+        """
+        self.name: str = name
+        self.labels: dict[str, str] = labels
+        self.buckets: tuple[float, ...] = buckets
+        self.bucket_counts: [int] = [0] * len(buckets)  # the number of values in every bucket, not cumulative
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.min: float | None = None
+        self.max: float | None = None
+        self.lock: threading.Lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Add a measured value
+
+        :param value: the measured value
+        :return: None
+        """
+        with self.lock:
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    self.bucket_counts[index] += 1
+                    break
+            self.count += 1
+            self.sum += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def get_cumulative_counts(self) -> [tuple[float, int]]:
+        """
+        Get the number of values less than or equal to each bucket's upper bound, like Prometheus expects them
+
+        :return: a list of (upper bound, count) pairs, the last one is (inf, the number of all values)
+        """
+        cumulative_counts = []
+        total = 0
+        with self.lock:
+            for upper_bound, bucket_count in zip(self.buckets, self.bucket_counts):
+                total += bucket_count
+                cumulative_counts.append((upper_bound, total))
+            cumulative_counts.append((float("inf"), self.count))
+        return cumulative_counts
+
+    def as_dict(self) -> dict:
+        """
+        Get the histogram as a dict, for the JSON export
+
+        :return: the labels, the count, sum, min, max, mean, and the buckets of the histogram
+        """
+        with self.lock:
+            return {"labels": self.labels, "count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                    "mean": self.sum / self.count if self.count else None,
+                    "buckets": {str(upper_bound): bucket_count for upper_bound, bucket_count in
+                                zip(self.buckets, self.bucket_counts)}}
+
+
+class MetricsRegistry():
+    """
+    Stores every counter and histogram by their name and labels, the same name and labels always give the same metric
+    """
+
+    def __init__(self):
+        """
+        Create a new, empty registry
+        """
+        self.counters: dict[tuple[str, tuple[tuple[str, str], ...]], Counter] = {}
+        self.histograms: dict[tuple[str, tuple[tuple[str, str], ...]], Histogram] = {}
+        self.descriptions: dict[str, str] = {}  # the help text of every metric name
+        self.lock: threading.Lock = threading.Lock()
+
+    def counter(self, name: str, description: str = "", **labels: str) -> Counter:
+        """
+        Get a counter, it is created the first time it is requested
+
+        :param name: the name of the metric
+        :param description: what the metric counts, shown in the Prometheus export
+        :param labels: the labels of the counter
+        :return: the counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.counters:
+                self.counters[key] = Counter(name, labels)
+                self.descriptions.setdefault(name, description)
+            return self.counters[key]
+
+    def histogram(self, name: str, description: str = "", **labels: str) -> Histogram:
+        """
+        Get a histogram, it is created the first time it is requested
+
+        :param name: the name of the metric
+        :param description: what the metric measures, shown in the Prometheus export
+        :param labels: the labels of the histogram
+        :return: the histogram
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(name, labels)
+                self.descriptions.setdefault(name, description)
+            return self.histograms[key]
+
+    @contextlib.contextmanager
+    def time(self, name: str, description: str = "", **labels: str):
+        """
+        Measure how long the code in a with block takes, and add it to a histogram, also if the block raises an error
+            with REGISTRY.time("graph_parse_seconds", phase="parse"):
+                ...
+
+        :param name: the name of the histogram
+        :param description: what the histogram measures
+        :param labels: the labels of the histogram
+        """
+        histogram = self.histogram(name, description, **labels)
+        start = time.perf_counter()
+        try:
+            yield histogram
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    def reset(self) -> None:
+        """
+        Remove all metrics
+
+        :return: None
+        """
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.descriptions = {}
+
+    def as_dict(self) -> dict[str, dict[str, list[dict]]]:
+        """
+        Get all metrics as a dict, for the JSON export
+
+        :return: {"counters": {name: [counter, ...]}, "histograms": {name: [histogram, ...]}}
+        """
+        with self.lock:
+            counters = list(self.counters.values())
+            histograms = list(self.histograms.values())
+        metrics_dict: dict[str, dict[str, list[dict]]] = {"counters": {}, "histograms": {}}
+        for counter in counters:
+            metrics_dict["counters"].setdefault(counter.name, []).append(counter.as_dict())
+        for histogram in histograms:
+            metrics_dict["histograms"].setdefault(histogram.name, []).append(histogram.as_dict())
+        return metrics_dict
+
+    def to_json(self) -> str:
+        """
+        Export all metrics as JSON
+
+        :return: the JSON string
+        """
+        return json.dumps(self.as_dict(), indent=4)
+
+    def to_prometheus(self) -> str:
+        """
+        Export all metrics in the Prometheus text format
+
+        :return: the metrics, one sample per line
+        """
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+            descriptions = dict(self.descriptions)
+        lines: [str] = []
+        described_names: set[str] = set()
+
+        def describe(name: str, metric_type: str) -> None:
+            if name not in described_names:
+                described_names.add(name)
+                if descriptions.get(name):
+                    lines.append(f"# HELP {name} {descriptions[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, _), counter in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{_format_labels(counter.labels)} {counter.value}")
+        for (name, _), histogram in histograms:
+            describe(name, "histogram")
+            for upper_bound, cumulative_count in histogram.get_cumulative_counts():
+                le = "+Inf" if upper_bound == float("inf") else repr(upper_bound)
+                lines.append(f"{name}_bucket{_format_labels({**histogram.labels, 'le': le})} {cumulative_count}")
+            lines.append(f"{name}_sum{_format_labels(histogram.labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(histogram.labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str) -> None:
+        """
+        Write all metrics to a JSON file
+
+        :param path: the path of the file
+        :return: None
+        """
+        _write_atomically(path, self.to_json())
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Write all metrics to a file in the Prometheus text format
+
+        :param path: the path of the file, the textfile collector of the node exporter reads the files ending in .prom
+        :return: None
+        """
+        _write_atomically(path, self.to_prometheus())
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """
+    Format the labels of a sample in the Prometheus text format
+
+    :param labels: the labels
+    :return: for example: {action="connect"}, or an empty string if there are no labels
+    """
+    if not labels:
+        return ""
+    formatted_labels = []
+    for key, value in sorted(labels.items()):
+        escaped_value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        formatted_labels.append(f"{key}=\"{escaped_value}\"")
+    return "{" + ",".join(formatted_labels) + "}"
+
+
+def _write_atomically(path: str, content: str) -> None:
+    """
+    Write a file through a temporary file, so its readers never see a half written file
+
+    :param path: the path of the file
+    :param content: the content of the file
+    :return: None
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as metrics_file:
+        metrics_file.write(content)
+    os.replace(temporary_path, path)
+
+
+# the registry all modules record their metrics into
+REGISTRY: MetricsRegistry = MetricsRegistry()
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    A logging handler writing to the current sys.stdout, so the messages can be redirected like print()-s
+    """
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value) -> None:
+        pass
+
+
+def configure_logging(level: str = "INFO") -> None:
+    """
+    Print the log messages of the given level and above to stdout, without any decoration, like print() does
+
+    :param level: the name of the lowest level shown: "DEBUG", "INFO", "WARNING", or "ERROR"
+    :return: None
+    """
+    level = level.upper()
+    if level not in ("DEBUG", "INFO", "WARNING", "ERROR"):
+        raise ValueError(f"Invalid log level: {level}. Must be one of: {('DEBUG', 'INFO', 'WARNING', 'ERROR')}")
+    root_logger = logging.getLogger()
+    if not any(isinstance(handler, _StdoutHandler) for handler in root_logger.handlers):
+        handler = _StdoutHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root_logger.addHandler(handler)
+    root_logger.setLevel(level)
@@ -0,0 +1,1307 @@
+import array
+import collections
+import itertools
+import json
+import logging
+import math
+import queue
+import re
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+
+import metrics
+
+# the channel positions of the loopback devices created by the backends
+LOOPBACK_CHANNELS: tuple[str, ...] = ("FL", "FR")
+# the virtual sinks are named "{LOOPBACK_NAME_PREFIX}-{INSTANCE_TOKEN}-{number}" (see new_loopback_name()), this is
+# both the node.name and the media.name of their sink node, the node.name of their output node is "{name}.output", and
+# its media.name is "{name} output"
+LOOPBACK_NAME_PREFIX: str = "simple-app-audio-router-sink"
+# generated at every start, so the names of the virtual sinks never match the virtual sinks of an other running instance
+# of the app, or the ones an earlier run left behind when it crashed
+INSTANCE_TOKEN: str = uuid.uuid4().hex[:8]
+# the sample rate the loopback devices are captured at, the rate pipewire runs at by default, so it needs no resampling
+CAPTURE_SAMPLE_RATE: int = 48000
+# the application.name of the streams capturing the loopback devices for the level meters and the recorder, they are
+# never routed
+CAPTURE_APP_NAME: str = "simple-app-audio-router-capture"
+# the command sent to the pw-cli control session after every batch, with a number appended, see ControlSession
+SYNC_MARKER_PREFIX: str = "sync-marker-"
+
+LOGGER = logging.getLogger(__name__)
+
+# the numbers of the virtual sinks, shared by all backends, so the names stay unique even when the backend is replaced
+_loopback_numbers = itertools.count(1)
+
+
+def new_loopback_name(taken_names: set[str] | frozenset[str] = frozenset()) -> str:
+    """
+    Get a name for a new loopback device, that no other loopback device of this app had, and no node has
+
+    :param taken_names: the node.names of the nodes in the graph, the names of which either node of the new loopback
+    device would be the same are skipped
+    :return: the name
+    """
+    while True:
+        name = f"{LOOPBACK_NAME_PREFIX}-{INSTANCE_TOKEN}-{next(_loopback_numbers)}"
+        if name not in taken_names and f"{name}.output" not in taken_names:
+            return name
+        LOGGER.warning(f"There already is a node named {name}, skipping the name")
+
+
+class LoopbackHandle():
+    """
+    A loopback device created by a backend
+    """
+
+    def __init__(self, name: str):
+        """
+        Create a new loopback handle
+
+        :param name: the name of the loopback device, it is the node.name of its sink node, and part of the node.name of
+        its output node, see LOOPBACK_NAME_PREFIX
+        """
+        self.name: str = name
+
+
+class LinkOperation():
+    """
+    A single connect, disconnect, or link removal, to be applied as part of a batch
+    """
+
+    def __init__(self, action: str, source_node_id: int | None = None, source_port_id: int | None = None,
+                 sink_node_id: int | None = None, sink_port_id: int | None = None, link_id: int | None = None):
+        """
+        Create a new link operation
+
+        :param action: "connect" or "disconnect" two ports, or "remove" a link
+        :param source_node_id: the node of the source port
+        :param source_port_id: a port on the output side of a node
+        :param sink_node_id: the node of the sink port
+        :param sink_port_id: a port on the input side of a node
+        :param link_id: the id of the link to be removed
+        """
+        allowed_actions = ("connect", "disconnect", "remove")
+        if action not in allowed_actions:
+            raise ValueError(f"Invalid link operation: {action}. Must be one of: {allowed_actions}")
+        self.action: str = action
+        self.source_node_id: int | None = source_node_id
+        self.source_port_id: int | None = source_port_id
+        self.sink_node_id: int | None = sink_node_id
+        self.sink_port_id: int | None = sink_port_id
+        self.link_id: int | None = link_id
+
+    def __repr__(self):
+        if self.action == "remove":
+            return f"LinkOperation(remove {self.link_id})"
+        return f"LinkOperation({self.action} {self.source_port_id} -> {self.sink_port_id})"
+
+
+class MonitorStream():
+    """
+    A stream of graph change batches, in the same form as the output of "pw-dump --monitor"
+    The first batch contains every object in the graph, every batch after that only the added, changed, and removed
+    objects (removed objects have their "info" set to None)
+    """
+
+    def __iter__(self):
+        """
+        Iterate over the batches as they arrive, the iteration ends when the stream is closed
+
+        :return: an iterator of lists of pw-dump objects
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Stop the stream
+
+        :return: None
+        """
+        raise NotImplementedError
+
+
+class PcmStream():
+    """
+    A stream of raw interleaved float32 samples, captured from the sound server
+    """
+
+    def readinto(self, buffer: memoryview) -> int:
+        """
+        Read samples into a buffer, blocking until there are some
+
+        :param buffer: the writable byte buffer the samples are read into
+        :return: the number of bytes read, 0 if the stream ended
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Stop the stream, a readinto() waiting for samples returns 0
+
+        :return: None
+        """
+        raise NotImplementedError
+
+
+class ParecStream(PcmStream):
+    """
+    A PcmStream read from the output of parec, recording the monitor of a loopback device's sink
+    """
+
+    def __init__(self, loopback: LoopbackHandle, channels: int, sample_rate: int, latency_ms: int = 50):
+        """
+        Start recording the monitor of a loopback device
+
+        :param loopback: the loopback device
+        :param channels: the number of channels to record
+        :param sample_rate: the sample rate to record at
+        :param latency_ms: how much audio parec collects before writing it out, larger values wake up less often
+        """
+        self.process: subprocess.Popen = subprocess.Popen([
+            "/usr/bin/parec", f"--device={loopback.name}.monitor", "--raw", "--format=float32le",
+            f"--channels={channels}", f"--rate={sample_rate}", f"--latency-msec={latency_ms}",
+            f"--client-name={CAPTURE_APP_NAME}", f"--property=application.name={CAPTURE_APP_NAME}",
+            f"--stream-name={loopback.name} capture"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def readinto(self, buffer: memoryview) -> int:
+        return self.process.stdout.readinto(buffer)
+
+    def close(self) -> None:
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class SyntheticPcmStream(PcmStream):
+    """
+    A PcmStream playing a generated test signal: a sine wave whose loudness changes over time, different on every
+    channel, so level meters can be tested and benchmarked without a sound server
+    """
+
+    def __init__(self, channels: int, sample_rate: int, realtime: bool = True):
+        """
+        Create a new synthetic stream
+
+        :param channels: the number of channels
+        :param sample_rate: the sample rate of the signal
+        :param realtime: whether the samples are given out at the pace a sound server would record them, if False,
+        they are given out as fast as they are read
+        """
+        self.sample_rate: int = sample_rate
+        self.frame_size: int = channels * 4
+        self.realtime: bool = realtime
+        # one second of the signal, played in a loop
+        self.signal: memoryview = memoryview(array.array("f", (
+            math.sin(2 * math.pi * 440 * frame / sample_rate) * 0.5 * (1 + math.sin(2 * math.pi * frame / sample_rate))
+            / (channel + 1) for frame in range(sample_rate) for channel in range(channels))).tobytes())
+        self.position: int = 0
+        self.frames_read: int = 0
+        self.start_time: float | None = None  # the time of the first read, the signal starts then
+        self.closed: threading.Event = threading.Event()
+
+    def readinto(self, buffer: memoryview) -> int:
+        if self.closed.is_set():
+            return 0
+        byte_count = len(buffer) - len(buffer) % self.frame_size
+        if self.realtime:  # wait until the sound server would have recorded these samples
+            if self.start_time is None:
+                self.start_time = time.monotonic()
+            ready_time = self.start_time + (self.frames_read + byte_count // self.frame_size) / self.sample_rate
+            if self.closed.wait(max(0.0, ready_time - time.monotonic())):
+                return 0
+        written = 0
+        while written < byte_count:
+            chunk = min(byte_count - written, len(self.signal) - self.position)
+            buffer[written:written + chunk] = self.signal[self.position:self.position + chunk]
+            self.position = (self.position + chunk) % len(self.signal)
+            written += chunk
+        self.frames_read += byte_count // self.frame_size
+        return byte_count
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+class SharedCapture():
+    """
+    A capture of a loopback device shared by several readers, for example the level meter and the recorder of a
+    virtual sink: the source stream is read once on a background thread, and every reader gets a copy of the samples
+    through its own SharedCaptureStream, so the loopback device is only captured by a single parec process
+    The source stream is opened for the first reader, and closed when the last one is closed
+    """
+
+    # how far a reader can fall behind before its oldest samples are dropped, in seconds, so a reader that stopped
+    # reading never holds up the others
+    max_buffered_seconds: float = 2.0
+    # the most bytes read from the source stream at once
+    read_size: int = 16384
+
+    def __init__(self, open_source, channels: int, sample_rate: int):
+        """
+        Create a new shared capture, the source stream is only opened by the first open()
+
+        :param open_source: the function opening the source PcmStream, called without arguments
+        :param channels: the number of channels of the source stream
+        :param sample_rate: the sample rate of the source stream
+        """
+        self.open_source = open_source
+        self.frame_size: int = channels * 4
+        self.max_buffered_bytes: int = int(self.max_buffered_seconds * sample_rate) * self.frame_size
+        self.lock: threading.Lock = threading.Lock()
+        self.readers: [SharedCaptureStream] = []
+        self.source: PcmStream | None = None
+        self.source_thread: threading.Thread | None = None
+
+    def open(self) -> "SharedCaptureStream":
+        """
+        Add a new reader, it gets the samples captured from now on
+
+        :return: the PcmStream of the new reader, it has to be closed when no longer needed
+        """
+        with self.lock:
+            reader = SharedCaptureStream(self)
+            self.readers.append(reader)
+            if self.source is None:
+                self.source = self.open_source()
+                self.source_thread = threading.Thread(target=self._read_source, args=(self.source,), daemon=True)
+                self.source_thread.start()
+            return reader
+
+    def _read_source(self, source: PcmStream) -> None:
+        """
+        Hand the samples of the source stream out to every reader until it ends, runs in the source thread
+        Only whole frames are handed out, so dropping the samples of a reader that fell behind never splits a frame
+
+        :param source: the source stream
+        :return: None
+        """
+        buffer = memoryview(bytearray(self.read_size))
+        pending = 0  # the bytes at the start of the buffer, which are not yet handed out
+        while read := source.readinto(buffer[pending:]):
+            pending += read
+            complete = pending - pending % self.frame_size
+            if not complete:
+                continue
+            chunk = bytes(buffer[:complete])
+            with self.lock:
+                readers = list(self.readers)
+            for reader in readers:
+                reader._put(chunk)
+            buffer[:pending - complete] = buffer[complete:pending]
+            pending -= complete
+
+        with self.lock:
+            if self.source is not source:  # the last reader closed it
+                return
+            # the source ended on its own, for example parec was stopped, the next reader opens a new one
+            ended_readers, self.readers = self.readers, []
+            self.source = None
+        for reader in ended_readers:
+            reader._end()
+
+    def _remove(self, reader: "SharedCaptureStream") -> None:
+        """
+        Remove a closed reader, and close the source stream if it was the last one
+
+        :param reader: the closed reader
+        :return: None
+        """
+        with self.lock:
+            if reader not in self.readers:
+                return
+            self.readers.remove(reader)
+            if self.readers:
+                return
+            source, self.source = self.source, None
+            source_thread, self.source_thread = self.source_thread, None
+        source.close()
+        source_thread.join()
+
+
+class SharedCaptureStream(PcmStream):
+    """
+    The PcmStream of one reader of a SharedCapture
+    """
+
+    def __init__(self, shared_capture: SharedCapture):
+        """
+        Create a new reader, it is added to the SharedCapture by SharedCapture.open()
+
+        :param shared_capture: the SharedCapture the samples come from
+        """
+        self.shared_capture: SharedCapture = shared_capture
+        self.chunks: collections.deque[bytes] = collections.deque()
+        self.offset: int = 0  # the bytes of the first chunk that were already read
+        self.buffered_bytes: int = 0  # the bytes of the chunks that were not read yet
+        self.ended: bool = False
+        self.condition: threading.Condition = threading.Condition()
+
+    def _put(self, chunk: bytes) -> None:
+        """
+        Add the samples handed out by the SharedCapture, dropping the oldest ones if this reader fell too far behind
+
+        :param chunk: whole frames of samples
+        :return: None
+        """
+        with self.condition:
+            if self.ended:
+                return
+            self.chunks.append(chunk)
+            self.buffered_bytes += len(chunk)
+            dropped_bytes = 0
+            # a partly read chunk is kept, so the reader does not lose the rest of a frame it started reading
+            drop_index = 1 if self.offset else 0
+            while self.buffered_bytes > self.shared_capture.max_buffered_bytes and len(self.chunks) > drop_index + 1:
+                dropped_chunk = self.chunks[drop_index]
+                del self.chunks[drop_index]
+                self.buffered_bytes -= len(dropped_chunk)
+                dropped_bytes += len(dropped_chunk)
+            self.condition.notify()
+        if dropped_bytes:
+            metrics.REGISTRY.counter("capture_dropped_frames_total",
+                                     "Captured frames dropped as a reader of a shared capture fell behind").inc(
+                dropped_bytes // self.shared_capture.frame_size)
+
+    def _end(self) -> None:
+        """
+        Mark the stream ended, as the source stream ended, the samples already handed out can still be read
+
+        :return: None
+        """
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+
+    def readinto(self, buffer: memoryview) -> int:
+        with self.condition:
+            self.condition.wait_for(lambda: self.chunks or self.ended)
+            written = 0
+            while self.chunks and written < len(buffer):
+                chunk = self.chunks[0]
+                count = min(len(buffer) - written, len(chunk) - self.offset)
+                buffer[written:written + count] = chunk[self.offset:self.offset + count]
+                written += count
+                self.offset += count
+                if self.offset == len(chunk):
+                    self.chunks.popleft()
+                    self.offset = 0
+            self.buffered_bytes -= written
+            return written
+
+    def close(self) -> None:
+        with self.condition:
+            self.ended = True
+            self.chunks.clear()
+            self.buffered_bytes = 0
+            self.condition.notify_all()
+        self.shared_capture._remove(self)
+
+
+class PipeWireBackend():
+    """
+    The interface through which pw_interface talks to the sound server
+    """
+
+    def get_server_name(self) -> str:
+        """
+        Get the name of the running sound server, as shown by "pactl info"
+
+        :return: the server name, for example: "PulseAudio (on PipeWire 0.3.65)"
+        """
+        raise NotImplementedError
+
+    def info_all(self) -> str:
+        """
+        Get the information about every object in the graph
+
+        :return: the same text "pw-cli info all" prints
+        """
+        raise NotImplementedError
+
+    def link_ports(self, source_port_id: int, sink_port_id: int) -> None:
+        """
+        Create a link between two ports
+
+        :param source_port_id: a port on the output side of a node
+        :param sink_port_id: a port on the input side of a node
+        :return: None
+        """
+        raise NotImplementedError
+
+    def unlink_ports(self, source_port_id: int, sink_port_id: int) -> None:
+        """
+        Remove the link between two ports
+
+        :param source_port_id: a port on the output side of a node
+        :param sink_port_id: a port on the input side of a node
+        :return: None
+        """
+        raise NotImplementedError
+
+    def remove_link(self, link_id: int) -> None:
+        """
+        Remove a link
+
+        :param link_id: the id of the link
+        :return: None
+        """
+        raise NotImplementedError
+
+    def apply_link_operations(self, operations: [LinkOperation]) -> None:
+        """
+        Apply a batch of link operations, in order
+        By default they are applied one by one, backends that can send them all at once override this
+
+        :param operations: the operations to be applied
+        :return: None
+        """
+        for operation in operations:
+            if operation.action == "connect":
+                self.link_ports(operation.source_port_id, operation.sink_port_id)
+            elif operation.action == "disconnect":
+                self.unlink_ports(operation.source_port_id, operation.sink_port_id)
+            else:
+                self.remove_link(operation.link_id)
+
+    def create_loopback(self, name: str) -> LoopbackHandle:
+        """
+        Create a stereo loopback device, its input side is a virtual sink, its output side is a stream
+
+        :param name: the name of the loopback device, from new_loopback_name()
+        :return: the handle of the new loopback device
+        """
+        raise NotImplementedError
+
+    def remove_loopback(self, loopback: LoopbackHandle) -> None:
+        """
+        Remove a loopback device created by create_loopback()
+
+        :param loopback: the handle of the loopback device
+        :return: None
+        """
+        raise NotImplementedError
+
+    def set_loopback_volumes(self, volumes: dict[int, tuple[float, bool]]) -> None:
+        """
+        Set the volumes and the mute states of the sink nodes of loopback devices, all of them in one batch
+
+        :param volumes: the (channel volume, muted) of the nodes by their ids, the channel volume is the linear factor
+        the samples of every channel are multiplied by
+        :return: None
+        """
+        raise NotImplementedError
+
+    def monitor(self) -> MonitorStream:
+        """
+        Start following the changes of the graph
+
+        :return: a new MonitorStream
+        """
+        raise NotImplementedError
+
+    def capture_loopback(self, loopback: LoopbackHandle, channels: int, sample_rate: int) -> PcmStream:
+        """
+        Start capturing the audio going into a loopback device, for the level meters
+        The capturing stream's nodes have the application.name CAPTURE_APP_NAME
+
+        :param loopback: the handle of the loopback device
+        :param channels: the number of channels to capture
+        :param sample_rate: the sample rate to capture at
+        :return: a new PcmStream
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Release everything the backend keeps running in the background
+
+        :return: None
+        """
+        pass
+
+
+class LoopbackProcess(LoopbackHandle):
+    """
+    A loopback device that lives in its own pw-loopback process
+    """
+
+    def __init__(self, name: str, process: subprocess.Popen):
+        """
+        Create a new handle for a running pw-loopback process
+
+        :param name: the name of the loopback device
+        :param process: the pw-loopback process
+        """
+        super().__init__(name)
+        self.process: subprocess.Popen = process
+
+
+class LoopbackModule(LoopbackHandle):
+    """
+    A loopback device that is a module loaded into the shared pw-cli control session
+    """
+
+    def __init__(self, name: str, module_var: int, control_session: "ControlSession"):
+        """
+        Create a new handle for a loaded loopback module
+
+        :param name: the name of the loopback device
+        :param module_var: the number pw-cli refers to the module by
+        :param control_session: the ControlSession the module was loaded into
+        """
+        super().__init__(name)
+        self.module_var: int = module_var
+        self.control_session: ControlSession = control_session
+
+
+class PwDumpMonitorStream(MonitorStream):
+    """
+    A MonitorStream that reads the output of a "pw-dump --monitor" process
+    """
+
+    def __init__(self):
+        """
+        Start the pw-dump process
+        """
+        self.process = subprocess.Popen(shlex.split("/usr/bin/pw-dump --monitor"), stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True)
+
+    def __iter__(self):
+        """
+        Read the output of pw-dump line by line, and yield every complete batch
+
+        pw-dump prints each batch as a JSON array, which always closes with a "]" on a line of its own, so the batch
+        can be parsed once that line is read, without re-scanning the data that was read before it
+
+        :return: an iterator of lists of pw-dump objects
+        """
+        batch_lines: [str] = []
+        for line in self.process.stdout:
+            batch_lines.append(line)
+            if line.rstrip() == "]":  # the end of the current batch
+                try:
+                    yield json.loads("".join(batch_lines))
+                except json.JSONDecodeError as jde:
+                    LOGGER.warning(f"Could not parse pw-dump output, skipping batch: {jde}")
+                batch_lines = []
+
+    def close(self) -> None:
+        """
+        Stop the pw-dump process, which also ends the iteration
+
+        :return: None
+        """
+        self.process.terminate()
+
+
+class ControlSession():
+    """
+    A long running interactive pw-cli process, that commands can be sent to without starting a new process for each one
+
+    Every batch of commands is put between two sync markers, commands pw-cli does not know, so it answers them with an
+    error containing the marker: once the answer to the second one arrives, every command of the batch was parsed, and
+    the output printed between the two answers is the reply to the batch
+    Parsed is not applied: pw-cli only sends the requests of commands like create-link and destroy to the server, which
+    applies them, and reports their errors, later. send() can wait until the changes show up in the objects pw-cli
+    knows, and the errors printed meanwhile are the errors of the batch
+    """
+
+    # the command the session is started with
+    command: [str] = ["/usr/bin/pw-cli"]
+    # how long send() waits between two listings of the objects, while waiting for a batch to be applied, in seconds
+    confirm_interval: float = 0.01
+
+    def __init__(self):
+        """
+        Start the pw-cli process, and the thread that reads its output, so the process never blocks on a full pipe
+        """
+        self.lock = threading.Lock()
+        self.loaded_module_vars: queue.Queue[int] = queue.Queue()  # the responses to load-module commands
+        self.sync_counter = itertools.count(1)
+        self.replies: queue.Queue[tuple[int, list[str]]] = queue.Queue()  # the (sync marker, reply) of every batch
+        self.reply_lines: [str] = []  # the lines printed since the last sync marker, only used by the output thread
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, text=True)
+        self.output_thread = threading.Thread(target=self._read_output, name="pw-cli-session", daemon=True)
+        self.output_thread.start()
+
+    def _read_output(self) -> None:
+        """
+        Read the output of pw-cli, the responses to load-module commands are collected, the lines printed before a
+        sync marker are handed over as the reply to the batch, and the lines about errors are printed
+
+        :return: None
+        """
+        for line in self.process.stdout:
+            # for example: Error: "Command \"sync-marker-3\" does not exist. Type 'help' for usage."
+            sync_match = re.search(rf"{SYNC_MARKER_PREFIX}(\d+)", line)
+            if sync_match:
+                self.replies.put((int(sync_match.group(1)), self.reply_lines))
+                self.reply_lines = []
+                continue
+            self.reply_lines.append(line.rstrip())
+            # for example: 3 = @module:87
+            #              ^var        ^global id
+            module_match = re.search(r"(\d+) = @module:\d+", line)
+            if module_match:
+                self.loaded_module_vars.put(int(module_match.group(1)))
+            elif "error" in line.lower():
+                LOGGER.warning(f"pw-cli: {line.rstrip()}")
+
+    def is_running(self) -> bool:
+        """
+        Determine if the pw-cli process is still running
+
+        :return: True if the process is running, False otherwise
+        """
+        return self.process.poll() is None
+
+    def send(self, commands: [str], timeout: float = 5.0, confirm_command: str | None = None,
+             is_applied=None) -> None:
+        """
+        Send a batch of commands to pw-cli in a single write, and wait until pw-cli parsed all of them, or, with a
+        confirm_command, until the server applied them: confirm_command is sent until is_applied() finds the changes of
+        the batch in its output, and the errors printed until then (even after the sync marker of the batch) are the
+        errors of this batch
+
+        :param commands: the pw-cli commands, for example: "destroy 42"
+        :param timeout: the maximum time to wait for the commands to be parsed, or applied, in seconds
+        :param confirm_command: the command listing the objects the batch changes, for example: "list-objects Link"
+        :param is_applied: the function called with the lines printed by confirm_command, returning True once they show
+        the changes of the batch
+        :return: None
+        :raise RuntimeError: if pw-cli printed an error while applying the commands, or they were not applied in time
+        """
+        with self.lock:
+            deadline = time.monotonic() + timeout
+            reply = self._query(commands, deadline)[1]
+            while confirm_command is not None and not _get_error_lines(reply):
+                late_lines, listed_lines = self._query([confirm_command], deadline)
+                # printed after the sync marker of the batch, for example the error of a link the server rejected
+                reply += late_lines + [line for line in listed_lines if _is_error_line(line)]
+                if is_applied(listed_lines):
+                    break
+                if time.monotonic() + self.confirm_interval >= deadline:
+                    raise RuntimeError(f"the server did not apply {len(commands)} commands in {timeout}s")
+                time.sleep(self.confirm_interval)
+        errors = _get_error_lines(reply)
+        if errors:
+            raise RuntimeError(f"pw-cli failed to apply {len(commands)} commands: {'; '.join(errors)}")
+
+    def query(self, commands: [str], timeout: float = 5.0) -> [str]:
+        """
+        Send a batch of commands to pw-cli in a single write, and collect what it prints in response
+
+        :param commands: the pw-cli commands, for example: "list-objects Link"
+        :param timeout: the maximum time to wait for pw-cli to process the commands, in seconds
+        :return: the lines printed by pw-cli while processing the commands
+        """
+        with self.lock:
+            return self._query(commands, time.monotonic() + timeout)[1]
+
+    def _query(self, commands: [str], deadline: float) -> tuple[list[str], list[str]]:
+        """
+        Send a batch of commands between two sync markers, and wait for the answer to the second one, the caller has to
+        hold self.lock
+
+        :param commands: the pw-cli commands
+        :param deadline: the time.monotonic() until which the answer is waited for
+        :return: the lines printed before the batch (the late output of the commands sent earlier, their errors were
+        already logged by the output thread), and the lines printed while processing the batch
+        """
+        late_lines = []
+        while not self.replies.empty():  # the replies of earlier batches that timed out
+            late_lines += self.replies.get_nowait()[1]
+        start_marker, sync_marker = next(self.sync_counter), next(self.sync_counter)
+        self._write([f"{SYNC_MARKER_PREFIX}{start_marker}", *commands, f"{SYNC_MARKER_PREFIX}{sync_marker}"])
+        while True:
+            try:
+                replied_marker, lines = self.replies.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise RuntimeError(f"pw-cli did not process {len(commands)} commands in time")
+            if replied_marker == sync_marker:
+                return late_lines, lines
+            late_lines += lines
+
+    def _write(self, commands: [str]) -> None:
+        """
+        Write commands to pw-cli, the caller has to hold self.lock
+
+        :param commands: the pw-cli commands
+        :return: None
+        """
+        self.process.stdin.write("".join(f"{command}\n" for command in commands))
+        self.process.stdin.flush()
+
+    def load_module(self, module_name: str, arguments: str, timeout: float = 5.0) -> int:
+        """
+        Load a module into the pw-cli process, it stays loaded until it is unloaded, or pw-cli exits
+
+        :param module_name: the name of the module, for example: "libpipewire-module-loopback"
+        :param arguments: the arguments of the module
+        :param timeout: the maximum time to wait for pw-cli to load the module, in seconds
+        :return: the number pw-cli refers to the module by
+        """
+        with self.lock:  # no other command may be sent until the response arrives
+            self._write([f"load-module {module_name} {arguments}"])
+            try:
+                return self.loaded_module_vars.get(timeout=timeout)
+            except queue.Empty:
+                raise RuntimeError(f"pw-cli did not load {module_name} in {timeout}s")
+
+    def unload_module(self, module_var: int) -> None:
+        """
+        Unload a module loaded by load_module()
+
+        :param module_var: the number pw-cli refers to the module by
+        :return: None
+        """
+        with self.lock:  # not waited for, the virtual sinks are also unloaded while the app exits
+            self._write([f"unload-module {module_var}"])
+
+    def close(self) -> None:
+        """
+        Stop the pw-cli process
+
+        :return: None
+        """
+        with self.lock:
+            self.process.stdin.close()
+        self.process.terminate()
+
+
+def _is_error_line(line: str) -> bool:
+    """
+    Determine if a line printed by pw-cli reports an error, the lines listing objects are indented, so a property
+    containing "error" is not taken for one
+
+    :param line: the line, without its line break
+    :return: True if the line reports an error
+    """
+    return not line.startswith("\t") and "error" in line.lower()
+
+
+def _get_error_lines(lines: [str]) -> [str]:
+    """
+    Find the lines reporting errors in the output of pw-cli
+
+    :param lines: the lines printed by pw-cli
+    :return: the lines reporting errors
+    """
+    return [line for line in lines if _is_error_line(line)]
+
+
+def _parse_link_list(lines: [str]) -> dict[tuple[int, int], int]:
+    """
+    Find the links in the output of the "list-objects Link" pw-cli command
+
+    :param lines: the lines printed by pw-cli, for example:
+        id 85, type PipeWire:Interface:Link/3
+                link.output.port = "57"
+                link.input.port = "80"
+    :return: the ids of the links by their (output port id, input port id)
+    """
+    link_ids_by_port_pair: dict[tuple[int, int], int] = {}
+    link_id = output_port_id = input_port_id = None
+    for line in lines:
+        if object_match := re.search(r"id (\d+), type PipeWire:Interface:(\w+)", line):
+            link_id = int(object_match.group(1)) if object_match.group(2) == "Link" else None
+            output_port_id = input_port_id = None
+        elif link_id is not None and (port_match := re.search(r'link\.(output|input)\.port = "(\d+)"', line)):
+            if port_match.group(1) == "output":
+                output_port_id = int(port_match.group(2))
+            else:
+                input_port_id = int(port_match.group(2))
+            if output_port_id is not None and input_port_id is not None:
+                link_ids_by_port_pair[(output_port_id, input_port_id)] = link_id
+    return link_ids_by_port_pair
+
+
+class SubprocessBackend(PipeWireBackend):
+    """
+    The backend that talks to the running sound server using the pipewire and pulseaudio command line tools
+    """
+
+    def __init__(self, virtual_sink_mode: str = "process"):
+        """
+        Create a new SubprocessBackend, the control session is only started when it is first needed
+
+        :param virtual_sink_mode: "process" to run every loopback device in its own pw-loopback process, or "shared" to
+        load all of them as modules into the single pw-cli control session
+        """
+        allowed_modes = ("process", "shared")
+        if virtual_sink_mode not in allowed_modes:
+            raise ValueError(f"Invalid virtual sink mode: {virtual_sink_mode}. Must be one of: {allowed_modes}")
+        self.virtual_sink_mode: str = virtual_sink_mode
+        self.control_session: ControlSession | None = None
+        # get_control_session() is called from several threads, only one of them may start a new session
+        self.control_session_lock: threading.Lock = threading.Lock()
+
+    def get_control_session(self) -> ControlSession:
+        """
+        Get the running control session, starting a new one if there is none, or the previous one stopped
+
+        :return: the running ControlSession
+        """
+        with self.control_session_lock:
+            if self.control_session is None or not self.control_session.is_running():
+                self.control_session = ControlSession()
+            return self.control_session
+
+    def get_server_name(self) -> str:
+        pactl_info: str = subprocess.check_output(shlex.split("/usr/bin/pactl info")).decode("utf-8")
+        for line in pactl_info.split("\n"):
+            if line.startswith("Server Name: "):
+                return ':'.join(line.split(':')[1:]).strip()
+        return ""
+
+    def info_all(self) -> str:
+        while True:
+            try:
+                return subprocess.check_output(shlex.split(f"/usr/bin/pw-cli info all")).decode("utf-8")
+            except subprocess.CalledProcessError as cpe:
+                LOGGER.warning(f"An Error occurred while fetching the data {cpe.returncode}")
+                metrics.REGISTRY.counter("graph_dump_retries_total",
+                                         "Failed pw-cli info all calls that were retried").inc()
+                time.sleep(0.02)
+
+    def link_ports(self, source_port_id: int, sink_port_id: int) -> None:
+        subprocess.run(shlex.split(f"/usr/bin/pw-link {source_port_id} {sink_port_id}"))
+
+    def unlink_ports(self, source_port_id: int, sink_port_id: int) -> None:
+        subprocess.run(shlex.split(f"/usr/bin/pw-link --disconnect {source_port_id} {sink_port_id}"))
+
+    def remove_link(self, link_id: int) -> None:
+        subprocess.run(shlex.split(f"/usr/bin/pw-link --disconnect {link_id}"))
+
+    def apply_link_operations(self, operations: [LinkOperation]) -> None:
+        """
+        Send the whole batch of link operations to the control session in one write, and wait until the server applied
+        it: until the created links are listed by the control session, and the removed ones are not
+        Disconnecting ports needs the id of their link, for operations without one it is looked up in the graph known
+        by the control session
+
+        :param operations: the operations to be applied
+        :return: None
+        """
+        control_session = self.get_control_session()
+        link_ids_by_port_pair: dict[tuple[int, int], int] | None = None
+        commands = []
+        created_port_pairs: set[tuple[int, int]] = set()
+        removed_link_ids: set[int] = set()
+        for operation in operations:
+            if operation.action == "connect":
+                # the links have to outlive the pw-cli client that created them, like the links pw-link creates do
+                commands.append(f"create-link {operation.source_node_id} {operation.source_port_id} "
+                                f"{operation.sink_node_id} {operation.sink_port_id} {{ object.linger = true }}")
+                created_port_pairs.add((operation.source_port_id, operation.sink_port_id))
+                continue
+            if operation.action == "remove":
+                link_id = operation.link_id
+            else:
+                if link_ids_by_port_pair is None:  # a single lookup for the whole batch
+                    link_ids_by_port_pair = _parse_link_list(control_session.query(["list-objects Link"]))
+                link_id = link_ids_by_port_pair.get((operation.source_port_id, operation.sink_port_id))
+                if link_id is None:  # the ports are not linked, there is nothing to disconnect
+                    continue
+            commands.append(f"destroy {link_id}")
+            removed_link_ids.add(link_id)
+
+        def is_applied(lines: [str]) -> bool:
+            listed_link_ids = _parse_link_list(lines)
+            return created_port_pairs <= listed_link_ids.keys() and not removed_link_ids & set(
+                listed_link_ids.values())
+
+        if commands:
+            control_session.send(commands, confirm_command="list-objects Link", is_applied=is_applied)
+
+    def create_loopback(self, name: str) -> LoopbackProcess | LoopbackModule:
+        channels = " ".join(LOOPBACK_CHANNELS)
+        # the monitor of the sink follows its volume, so what is recorded from it (by OBS for example) is changed too
+        capture_props = f"media.class=Audio/Sink node.name={name} media.name={name} node.description={name} " \
+                        f"monitor.channel-volumes=true"
+        playback_props = f'node.name={name}.output media.name="{name} output"'
+        if self.virtual_sink_mode == "shared":
+            control_session = self.get_control_session()
+            return LoopbackModule(name, control_session.load_module(
+                "libpipewire-module-loopback",
+                f"{{ audio.position = [ {channels} ] capture.props = {{ {capture_props} }} "
+                f"playback.props = {{ {playback_props} }} }}"), control_session)
+
+        return LoopbackProcess(name, subprocess.Popen([  # creates new virtual sink as a subprocess
+            "/usr/bin/pw-loopback", "-m", f"[ {channels} ]", f"--capture-props={capture_props}",
+            f"--playback-props={playback_props}"]))
+
+    def remove_loopback(self, loopback: LoopbackProcess | LoopbackModule) -> None:
+        if isinstance(loopback, LoopbackModule):
+            if loopback.control_session.is_running():  # the modules are gone with the session that loaded them
+                loopback.control_session.unload_module(loopback.module_var)
+        else:
+            loopback.process.terminate()
+
+    def set_loopback_volumes(self, volumes: dict[int, tuple[float, bool]]) -> None:
+        """
+        Send the new volumes to the control session in one write, as Props parameters of the nodes
+
+        :param volumes: the (channel volume, muted) of the nodes by their ids
+        :return: None
+        """
+        self.get_control_session().send([
+            f"set-param {node_id} Props {{ mute: {str(muted).lower()} "
+            f"channelVolumes: [ {' '.join([f'{volume:.6f}'] * len(LOOPBACK_CHANNELS))} ] }}" for
+            node_id, (volume, muted) in volumes.items()])
+
+    def monitor(self) -> PwDumpMonitorStream:
+        return PwDumpMonitorStream()
+
+    def capture_loopback(self, loopback: LoopbackHandle, channels: int, sample_rate: int) -> ParecStream:
+        return ParecStream(loopback, channels, sample_rate)
+
+    def close(self) -> None:
+        if self.control_session is not None:
+            self.control_session.close()
+            self.control_session = None
+
+
+class SimulatedMonitorStream(MonitorStream):
+    """
+    A MonitorStream fed by a SimulatedBackend
+    """
+
+    def __init__(self, initial_batch: list[dict]):
+        """
+        Create a new stream, that starts with the whole graph
+
+        :param initial_batch: every object in the simulated graph
+        """
+        self.batches: queue.Queue[list[dict] | None] = queue.Queue()
+        self.batches.put(initial_batch)
+
+    def __iter__(self):
+        while (batch := self.batches.get()) is not None:
+            yield batch
+
+    def close(self) -> None:
+        self.batches.put(None)
+
+
+class SimulatedBackend(PipeWireBackend):
+    """
+    A pure python stand-in for a pipewire graph, for profiling and load testing without a running sound server
+
+    It assigns ids the same way pipewire does, creates the nodes and ports of loopback devices, links and unlinks ports,
+    prints the graph in the same form as "pw-cli info all", and sends the changes to every open MonitorStream like
+    "pw-dump --monitor" does
+    """
+
+    def __init__(self, server_name: str = "PulseAudio (on PipeWire 0.3.65)", loopback_delay: float = 0.0):
+        """
+        Create a new simulated graph, containing a core, a client, a few modules and factories, a hardware sink and a
+        hardware source
+
+        :param server_name: the name returned by get_server_name()
+        :param loopback_delay: how many seconds it takes for the nodes of a new loopback device to appear in the graph
+        """
+        self.server_name: str = server_name
+        self.loopback_delay: float = loopback_delay
+
+        self.objects: dict[int, dict] = {}  # every object in the graph, in the same form pw-dump prints them
+        # indexes, so the graph can be built and changed quickly even when it is very large
+        self.port_ids_by_node: dict[int, list[int]] = {}
+        self.link_ids_by_port: dict[int, set[int]] = {}
+        self.link_ids_by_port_pair: dict[tuple[int, int], int] = {}
+        self.id_counter = itertools.count()
+        self.lock = threading.RLock()
+        self.monitor_streams: [SimulatedMonitorStream] = []
+
+        self.add_object("Core", {"cookie": 1234, "user-name": "user", "host-name": "simulated", "version": "0.3.65",
+                                 "name": "pipewire-0", "props": {"core.name": "pipewire-0"}})
+        self.add_object("Client", {"props": {"application.name": "pipewire"}})
+        for module_name in ("libpipewire-module-rt", "libpipewire-module-protocol-native",
+                            "libpipewire-module-client-node", "libpipewire-module-adapter"):
+            self.add_object("Module", {"name": module_name, "filename": f"/usr/lib/pipewire-0.3/{module_name}.so",
+                                       "args": None, "props": {"module.name": module_name}})
+        for factory_name in ("client-node", "adapter", "link-factory"):
+            self.add_object("Factory", {"name": factory_name, "props": {"factory.name": factory_name}})
+
+        self.default_sink_node_id: int = self.add_node(
+            {"node.name": "alsa_output.pci-0000_00_1f.3.analog-stereo", "media.class": "Audio/Sink",
+             "node.description": "Built-in Audio Analog Stereo"},
+            input_channels=("FL", "FR"), output_channels=("FL", "FR"), output_prefix="monitor")
+        self.add_node({"node.name": "alsa_input.pci-0000_00_1f.3.analog-stereo", "media.class": "Audio/Source",
+                       "node.description": "Built-in Audio Analog Stereo"}, output_channels=("FL", "FR"),
+                      output_prefix="capture")
+
+    def _emit(self, batch: list[dict]) -> None:
+        """
+        Send a batch of changes to every open monitor stream
+
+        :param batch: the changed objects
+        :return: None
+        """
+        for stream in self.monitor_streams:
+            stream.batches.put(batch)
+
+    def add_object(self, object_type: str, info: dict) -> int:
+        """
+        Add a new object to the graph
+
+        :param object_type: the type of the object, for example: "Node"
+        :param info: the info of the object, in the same form as pw-dump prints it
+        :return: the id of the new object
+        """
+        with self.lock:
+            object_id = next(self.id_counter)
+            self.objects[object_id] = {"id": object_id, "type": f"PipeWire:Interface:{object_type}",
+                                       "version": 3, "permissions": ["r", "w", "x", "m"],
+                                       "info": {**info, "props": {**info.get("props", {}), "object.id": object_id}}}
+            if object_type == "Port":
+                self.port_ids_by_node.setdefault(info["props"]["node.id"], []).append(object_id)
+            elif object_type == "Link":
+                self.link_ids_by_port.setdefault(info["output-port-id"], set()).add(object_id)
+                self.link_ids_by_port.setdefault(info["input-port-id"], set()).add(object_id)
+                self.link_ids_by_port_pair[(info["output-port-id"], info["input-port-id"])] = object_id
+            self._emit([self.objects[object_id]])
+            return object_id
+
+    def remove_object(self, object_id: int) -> None:
+        """
+        Remove an object from the graph, removing a node also removes its ports, removing a port also removes its links
+
+        :param object_id: the id of the object
+        :return: None
+        """
+        with self.lock:
+            pw_object = self.objects.get(object_id)
+            if pw_object is None:
+                return
+            info = pw_object["info"]
+            if pw_object["type"].endswith(":Node"):
+                for port_id in self.get_port_ids(object_id):
+                    self.remove_object(port_id)
+                self.port_ids_by_node.pop(object_id, None)
+            elif pw_object["type"].endswith(":Port"):
+                for link_id in list(self.link_ids_by_port.get(object_id, ())):
+                    self.remove_object(link_id)
+                self.link_ids_by_port.pop(object_id, None)
+                self.port_ids_by_node.get(info["props"]["node.id"], []).remove(object_id)
+            elif pw_object["type"].endswith(":Link"):
+                self.link_ids_by_port.get(info["output-port-id"], set()).discard(object_id)
+                self.link_ids_by_port.get(info["input-port-id"], set()).discard(object_id)
+                del self.link_ids_by_port_pair[(info["output-port-id"], info["input-port-id"])]
+            del self.objects[object_id]
+            self._emit([{"id": object_id, "info": None}])
+
+    def get_objects(self, object_type: str) -> dict[int, dict]:
+        """
+        Get every object of a certain type
+
+        :param object_type: the type of the objects, for example: "Node"
+        :return: a dict of object id - pw-dump object pairs
+        """
+        with self.lock:
+            return {object_id: pw_object for object_id, pw_object in self.objects.items() if
+                    pw_object["type"] == f"PipeWire:Interface:{object_type}"}
+
+    def get_port_ids(self, node_id: int, direction: str | None = None) -> [int]:
+        """
+        Get the ids of the ports of a node
+
+        :param node_id: the id of the node
+        :param direction: "input", "output", or None for both
+        :return: the port ids
+        """
+        with self.lock:
+            return [port_id for port_id in self.port_ids_by_node.get(node_id, ()) if
+                    direction in (None, self.objects[port_id]["info"]["direction"])]
+
+    def add_node(self, props: dict, input_channels: tuple[str, ...] = (), output_channels: tuple[str, ...] = (),
+                 input_prefix: str = "playback", output_prefix: str = "output") -> int:
+        """
+        Add a new node, and its ports, to the graph
+
+        :param props: the properties of the node
+        :param input_channels: the channel positions of the input ports, for example: ("FL", "FR")
+        :param output_channels: the channel positions of the output ports
+        :param input_prefix: the port names of the input ports are "{input_prefix}_{channel}"
+        :param output_prefix: the port names of the output ports are "{output_prefix}_{channel}"
+        :return: the id of the new node
+        """
+        with self.lock:
+            node_id = self.add_object("Node", {"max-input-ports": 65 if input_channels else 0,
+                                               "max-output-ports": 65 if output_channels else 0,
+                                               "n-input-ports": len(input_channels),
+                                               "n-output-ports": len(output_channels),
+                                               "state": "running", "error": None, "props": props})
+            alias_prefix = props.get("node.description", props.get("application.name", props.get("node.name")))
+            for direction, prefix, channels in (("input", input_prefix, input_channels),
+                                                ("output", output_prefix, output_channels)):
+                for port_index, channel in enumerate(channels):
+                    self.add_object("Port", {"direction": direction, "props": {
+                        "format.dsp": "32 bit float mono audio", "port.id": port_index,
+                        "port.name": f"{prefix}_{channel}", "port.direction": "in" if direction == "input" else "out",
+                        "port.alias": f"{alias_prefix}:{prefix}_{channel}", "node.id": node_id,
+                        "audio.channel": channel}})
+            return node_id
+
+    def add_app_stream(self, app_name: str, media_name: str = "AudioStream",
+                       channels: tuple[str, ...] = ("FL", "FR")) -> int:
+        """
+        Add the output stream node of an app playing audio
+
+        :param app_name: the application.name of the app
+        :param media_name: the media.name of the stream
+        :param channels: the channel positions of the stream
+        :return: the id of the new node
+        """
+        return self.add_node({"node.name": app_name, "application.name": app_name, "media.name": media_name,
+                              "media.class": "Stream/Output/Audio"}, output_channels=channels)
+
+    def populate(self, app_count: int, linked: bool = False) -> [int]:
+        """
+        Add many app streams at once, for load testing
+
+        :param app_count: the number of app streams
+        :param linked: whether to link every app stream to the default sink, like the session manager does
+        :return: the ids of the new nodes
+        """
+        node_ids = [self.add_app_stream(f"Simulated App {app_index}", f"Stream {app_index}") for app_index in
+                    range(app_count)]
+        if linked:
+            sink_port_ids = self.get_port_ids(self.default_sink_node_id, "input")
+            for node_id in node_ids:
+                for source_port_id, sink_port_id in zip(self.get_port_ids(node_id, "output"), sink_port_ids):
+                    self.link_ports(source_port_id, sink_port_id)
+        return node_ids
+
+    def get_server_name(self) -> str:
+        return self.server_name
+
+    def info_all(self) -> str:
+        with self.lock:
+            return "remote 0 is named 'pipewire-0'\n" + "".join(
+                _format_pw_cli_info(pw_object) for pw_object in self.objects.values())
+
+    def link_ports(self, source_port_id: int, sink_port_id: int) -> None:
+        with self.lock:
+            if (source_port_id, sink_port_id) in self.link_ids_by_port_pair:
+                return  # pipewire does not create the same link twice
+            source_node_id = self.objects[source_port_id]["info"]["props"]["node.id"]
+            sink_node_id = self.objects[sink_port_id]["info"]["props"]["node.id"]
+            self.add_object("Link", {"output-node-id": source_node_id, "output-port-id": source_port_id,
+                                     "input-node-id": sink_node_id, "input-port-id": sink_port_id,
+                                     "state": "active", "error": None,
+                                     "props": {"link.output.node": source_node_id, "link.output.port": source_port_id,
+                                               "link.input.node": sink_node_id, "link.input.port": sink_port_id}})
+
+    def unlink_ports(self, source_port_id: int, sink_port_id: int) -> None:
+        with self.lock:
+            if (source_port_id, sink_port_id) in self.link_ids_by_port_pair:
+                self.remove_object(self.link_ids_by_port_pair[(source_port_id, sink_port_id)])
+
+    def remove_link(self, link_id: int) -> None:
+        self.remove_object(link_id)
+
+    def create_loopback(self, name: str) -> LoopbackHandle:
+        loopback = LoopbackHandle(name)
+        loopback.node_ids = []
+        if self.loopback_delay > 0:  # pipewire creates the nodes of the loopback device asynchronously
+            threading.Timer(self.loopback_delay, self._add_loopback_nodes, (loopback,)).start()
+        else:
+            self._add_loopback_nodes(loopback)
+        return loopback
+
+    def _add_loopback_nodes(self, loopback: LoopbackHandle) -> None:
+        """
+        Add the nodes of a loopback device, and link its output to the default sink, like pw-loopback does
+
+        :param loopback: the handle of the loopback device
+        :return: None
+        """
+        with self.lock:
+            sink_node_id = self.add_node({"node.name": loopback.name, "media.class": "Audio/Sink",
+                                          "media.name": loopback.name, "node.description": loopback.name},
+                                         input_channels=LOOPBACK_CHANNELS, output_channels=LOOPBACK_CHANNELS,
+                                         output_prefix="monitor")
+            output_node_id = self.add_node({"node.name": f"{loopback.name}.output",
+                                            "media.class": "Stream/Output/Audio",
+                                            "media.name": f"{loopback.name} output"}, output_channels=LOOPBACK_CHANNELS)
+            loopback.node_ids = [sink_node_id, output_node_id]
+            for source_port_id, sink_port_id in zip(self.get_port_ids(output_node_id, "output"),
+                                                    self.get_port_ids(self.default_sink_node_id, "input")):
+                self.link_ports(source_port_id, sink_port_id)
+
+    def remove_loopback(self, loopback: LoopbackHandle) -> None:
+        for node_id in loopback.node_ids:
+            self.remove_object(node_id)
+
+    def set_loopback_volumes(self, volumes: dict[int, tuple[float, bool]]) -> None:
+        with self.lock:
+            changed_objects = []
+            for node_id, (volume, muted) in volumes.items():
+                if node_id in self.objects:
+                    self.objects[node_id]["info"].setdefault("params", {})["Props"] = [
+                        {"mute": muted, "channelVolumes": [volume] * len(LOOPBACK_CHANNELS)}]
+                    changed_objects.append(self.objects[node_id])
+            if changed_objects:
+                self._emit(changed_objects)
+
+    def monitor(self) -> SimulatedMonitorStream:
+        with self.lock:
+            stream = SimulatedMonitorStream(list(self.objects.values()))
+            self.monitor_streams.append(stream)
+            return stream
+
+    def capture_loopback(self, loopback: LoopbackHandle, channels: int, sample_rate: int) -> SyntheticPcmStream:
+        return SyntheticPcmStream(channels, sample_rate)
+
+
+def _format_pw_cli_value(value) -> str:
+    """
+    Format a top level attribute value the same way pw-cli does
+
+    :param value: the value of the attribute
+    :return: the formatted value
+    """
+    if value is None:
+        return "(null)"
+    if isinstance(value, str):
+        return f'"{value}"'
+    return str(value)
+
+
+def _format_pw_cli_info(pw_object: dict) -> str:
+    """
+    Format a pw-dump object the same way "pw-cli info" prints it
+
+    :param pw_object: an object in the same form as pw-dump prints them
+    :return: the text pw-cli would print about the object
+    """
+    object_type = pw_object["type"].split(":")[-1]
+    info = pw_object["info"]
+    lines = [f"\tid: {pw_object['id']}", "\tpermissions: rwxm", f"\ttype: {pw_object['type']}/{pw_object['version']}"]
+    if object_type == "Node":
+        lines.append(f"*\tinput ports: {info['n-input-ports']}/{info['max-input-ports']}")
+        lines.append(f"*\toutput ports: {info['n-output-ports']}/{info['max-output-ports']}")
+        lines.append(f"*\tstate: {_format_pw_cli_value(info['state'])}")
+    elif object_type == "Link":
+        for key in ("output-node-id", "output-port-id", "input-node-id", "input-port-id"):
+            lines.append(f"*\t{key}: {info[key]}")
+        lines.append(f"*\tstate: {_format_pw_cli_value(info['state'])}")
+        lines.extend(["*\tformat:", "*\t\tAudio:", "*\t\t\tformat: F32P", "*\t\t\trate: 48000",
+                      "*\t\t\tchannels: 1"])
+    else:
+        for key, value in info.items():
+            if key not in ("props", "params"):
+                lines.append(f"*\t{key}: {_format_pw_cli_value(value)}")
+    lines.append("*\tproperties:")
+    for key, value in info["props"].items():
+        lines.append(f'*\t\t{key} = "{value}"')
+    if object_type in ("Node", "Port"):
+        lines.extend(["*\tparams: (2)", "*\t\t  3 (Spa:Enum:ParamId:EnumFormat) r-",
+                      "*\t\t  4 (Spa:Enum:ParamId:Format) rw"])
+    return "\n".join(lines) + "\n"
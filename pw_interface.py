@@ -1,8 +1,18 @@
+import collections.abc
+import functools
 import json
+import logging
+import os
+import queue
 import re
-import shlex
-import subprocess
+import sys
+import threading
 import time
+import types
+
+import channel_map
+import metrics
+import pw_backend
 
 # load config from json config file
 with open("config.json", "r") as config_file:
@@ -10,6 +20,34 @@ with open("config.json", "r") as config_file:
 
 NODE_APP_NAME_BLACKLIST = CONFIG["NODE_APP_NAME_BLACKLIST"]
 NODE_NAME_BLACKLIST = CONFIG["NODE_NAME_BLACKLIST"]
+# the files the metrics are written to by write_metrics(), if set
+METRICS_JSON_FILE: str | None = CONFIG.get("METRICS_JSON_FILE")
+METRICS_PROMETHEUS_FILE: str | None = CONFIG.get("METRICS_PROMETHEUS_FILE")
+# the file the graph and the routes are saved to, so the next start can show them right away, see graph_cache.py
+WARM_START_FILE: str | None = os.path.expanduser(CONFIG["WARM_START_FILE"]) if CONFIG.get("WARM_START_FILE") else None
+# the directory the recordings of the window are saved in, every recording gets its own directory in it
+RECORDING_DIRECTORY: str = os.path.expanduser(CONFIG.get("RECORDING_DIRECTORY", "~/Music/simple-app-audio-router"))
+# whether the window shows the levels of the virtual sinks, see level_meter.py
+LEVEL_METERS: bool = CONFIG.get("LEVEL_METERS", True)
+
+metrics.configure_logging(CONFIG.get("LOG_LEVEL", "INFO"))
+LOGGER = logging.getLogger(__name__)
+
+# the backend through which all communication with the sound server happens
+BACKEND: pw_backend.PipeWireBackend = pw_backend.SubprocessBackend(CONFIG.get("VIRTUAL_SINK_MODE", "process"))
+
+
+def set_backend(backend: pw_backend.PipeWireBackend) -> None:
+    """
+    Replace the backend used to talk to the sound server, for example with a pw_backend.SimulatedBackend for testing
+    without a running sound server
+    It has to be called before any VirtualSinkManager or NodeManager instances are created
+
+    :param backend: the new backend
+    :return: None
+    """
+    global BACKEND
+    BACKEND = backend
 
 
 def check_sound_server() -> bool:
@@ -18,39 +56,171 @@ def check_sound_server() -> bool:
 
     :return: True if the detected sound server is pipewire, False otherwise
     """
-    pactl_info: str = subprocess.check_output(shlex.split("/usr/bin/pactl info")).decode("utf-8")
-    for line in pactl_info.split("\n"):
-        if line.startswith("Server Name: "):
-            if "PipeWire" in line:
-                print("Running on pipwwire")
-                return True
-            else:
-                print(f"Running on {':'.join(line.split(':')[1:])}")
-                return False
+    server_name: str = BACKEND.get_server_name()
+    if "PipeWire" in server_name:
+        LOGGER.info("Running on pipwwire")
+        return True
+    else:
+        LOGGER.info(f"Running on {server_name}")
+        return False
+
+
+def write_metrics() -> None:
+    """
+    Write the collected metrics to the METRICS_JSON_FILE and METRICS_PROMETHEUS_FILE set in the config, if any
+
+    :return: None
+    """
+    try:
+        if METRICS_JSON_FILE:
+            metrics.REGISTRY.write_json(METRICS_JSON_FILE)
+        if METRICS_PROMETHEUS_FILE:
+            metrics.REGISTRY.write_prometheus(METRICS_PROMETHEUS_FILE)
+    except OSError as ose:
+        LOGGER.error(f"Could not write the metrics: {ose}")
 
 
 class VirtualSink():
     """
-    A wrapper around a virtual sink subprocess
+    A wrapper around a virtual sink loopback device
     """
 
-    def __init__(self):
+    def __init__(self, name: str | None = None):
         """
-        Creates a new Virtual Sink using pw-loopback, and keeps it running in the background until it is no longer needed
+        Creates a new Virtual Sink using the backend, and keeps it running in the background until it is no longer needed
+
+        :param name: the name of the virtual sink, from pw_backend.new_loopback_name(), if None, a new one is made
         """
-        self.process = subprocess.Popen(shlex.split(  # creates new virtual sink as a subprocess
-            "/usr/bin/pw-loopback -m '[ FL FR]' --capture-props='media.class=Audio/Sink node.name=simple-app-audio-router-virtual-sink'"))
-        self.name = f"/usr/bin/pw-loopback-{self.process.pid}"  # the name is always "/usr/bin/pw-loopback-<PID>"
-        print(f"Created Virtual Sink: {self.name}")
+        if name is None:
+            name = pw_backend.new_loopback_name()
+        with metrics.REGISTRY.time("virtual_sink_create_seconds", "Time to start a loopback device"):
+            self.loopback: pw_backend.LoopbackHandle = BACKEND.create_loopback(name)
+        self.name = self.loopback.name
+        # the captures of the loopback device by their (channels, sample rate), shared by all readers of that format
+        self.captures: dict[tuple[int, int], pw_backend.SharedCapture] = {}
+        LOGGER.info(f"Created Virtual Sink: {self.name}")
 
     def _remove(self) -> None:
         """
-        Remove the Virtual sink by terminating the pw-loopback process
+        Remove the Virtual sink by removing its loopback device
+
+        :return: None
+        """
+        BACKEND.remove_loopback(self.loopback)
+        LOGGER.info(f"Removed Virtual Sink: {self.name}")
+
+    def capture(self, channels: int, sample_rate: int) -> pw_backend.PcmStream:
+        """
+        Start capturing the audio going into the Virtual Sink, for example for a level meter
+        The captures of the same format share a single stream of the backend, for example the level meter and the
+        recorder of a virtual sink are fed by the same parec process
+
+        :param channels: the number of channels to capture
+        :param sample_rate: the sample rate to capture at
+        :return: the PcmStream of the captured audio, it has to be closed when no longer needed
+        """
+        shared_capture = self.captures.setdefault((channels, sample_rate), pw_backend.SharedCapture(
+            functools.partial(BACKEND.capture_loopback, self.loopback, channels, sample_rate), channels, sample_rate))
+        return shared_capture.open()
+
+
+class VolumeController():
+    """
+    Sets the volumes and mute states of the sink nodes of virtual sinks, without ever making the caller wait
+
+    The requested values are only stored, a background thread sends them to the backend: the latest value of every
+    changed node, in one batch, at most max_rate times a second, so dragging a volume slider (hundreds of changes a
+    second) sends at most max_rate batches a second, over the backend's single control channel
+    """
+
+    # the most batches of volume changes sent a second
+    max_rate: float = 30.0
+
+    def __init__(self):
+        """
+        Create a new VolumeController, and start its sender thread
+        """
+        self.states: dict[int, tuple[float, bool]] = {}  # the (volume, muted) of every node that was set
+        self.pending_node_ids: set[int] = set()  # the nodes whose state was not sent yet
+        self.closed: bool = False
+        self.condition: threading.Condition = threading.Condition()
+        self.sender_thread: threading.Thread = threading.Thread(target=self._send_changes, name="volume-controller",
+                                                                daemon=True)
+        self.sender_thread.start()
+
+    def set_volume(self, node_id: int, volume: float | None = None, muted: bool | None = None) -> None:
+        """
+        Request a new volume and / or mute state for a node, returns right away
+
+        :param node_id: the id of the sink node of a virtual sink
+        :param volume: the new volume, 1.0 is 100%, on the same cubic scale pavucontrol and pactl use, None to keep
+        the current one
+        :param muted: the new mute state, None to keep the current one
+        :return: None
+        """
+        metrics.REGISTRY.counter("volume_changes_requested_total", "Requested volume and mute changes").inc()
+        with self.condition:
+            current_volume, current_muted = self.states.get(node_id, (1.0, False))
+            self.states[node_id] = (current_volume if volume is None else max(0.0, volume),
+                                    current_muted if muted is None else muted)
+            self.pending_node_ids.add(node_id)
+            self.condition.notify()
+
+    def get_volume(self, node_id: int) -> tuple[float, bool]:
+        """
+        Get the last requested volume and mute state of a node
+
+        :param node_id: the id of the node
+        :return: the (volume, muted) of the node, (1.0, False) if it was never set
+        """
+        with self.condition:
+            return self.states.get(node_id, (1.0, False))
+
+    def forget(self, node_id: int) -> None:
+        """
+        Forget a node, for example when its virtual sink is removed, its pending changes are not sent
+
+        :param node_id: the id of the node
+        :return: None
+        """
+        with self.condition:
+            self.states.pop(node_id, None)
+            self.pending_node_ids.discard(node_id)
+
+    def _send_changes(self) -> None:
+        """
+        Send the pending changes in batches until close() is called, runs in the sender thread
 
         :return: None
         """
-        self.process.terminate()
-        print(f"Removed Virtual Sink: {self.name}")
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending_node_ids or self.closed)
+                if not self.pending_node_ids:  # closed, and everything was sent
+                    return
+                # the cubic volume is converted to the linear factor the samples are multiplied by
+                volumes = {node_id: (self.states[node_id][0] ** 3, self.states[node_id][1]) for node_id in
+                           self.pending_node_ids}
+                self.pending_node_ids.clear()
+            batch_start = time.monotonic()
+            try:
+                BACKEND.set_loopback_volumes(volumes)
+            except (OSError, RuntimeError) as error:
+                LOGGER.error(f"Could not set the volume of the virtual sinks: {error}")
+            metrics.REGISTRY.counter("volume_batches_sent_total", "Batches of volume changes sent").inc()
+            if not self.closed:  # wait until the next batch may be sent, the changes meanwhile are collected
+                time.sleep(max(0.0, batch_start + 1 / self.max_rate - time.monotonic()))
+
+    def close(self) -> None:
+        """
+        Send the pending changes, and stop the sender thread
+
+        :return: None
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.sender_thread.join()
 
 
 class VirtualSinkManager():
@@ -64,17 +234,42 @@ class VirtualSinkManager():
         It starts with an empty list of Virtual Sinks
         """
         self.virtual_sink_processes: [VirtualSink] = []
+        # sets the volumes of the virtual sinks
+        self.volume_controller: VolumeController = VolumeController()
 
-    def create_virtual_sink(self) -> VirtualSink:
+    def create_virtual_sink(self, name: str | None = None) -> VirtualSink:
         """
         Crates a new Virtual sink, and adds it to the list of running processes
 
+        :param name: the name of the virtual sink, from pw_backend.new_loopback_name(), if None, a new one is made
         :return: the started VirtualSink instance
         """
-        vs = VirtualSink()
+        vs = VirtualSink(name)
         self.virtual_sink_processes.append(vs)
         return vs
 
+    def create_virtual_sinks(self, count: int, node_manager: "NodeManager", timeout: float = 5.0,
+                             disconnect_output: bool = True) -> [tuple[VirtualSink, tuple["Node", "Node", "Node"]]]:
+        """
+        Create several virtual sinks at once: all of them are started first, then their nodes are waited for together,
+        so creating many virtual sinks takes about as long as creating one
+
+        :param count: the number of virtual sinks to create
+        :param node_manager: the NodeManager in which the nodes of the virtual sinks are waited for
+        :param timeout: the maximum time to wait for all the nodes, in seconds
+        :param disconnect_output: whether to disconnect the outputs of the virtual sinks from the system output, all of
+        them are disconnected in one batch
+        :return: the list of (VirtualSink, (sink node, source node, output node)) for every new virtual sink
+        """
+        # the names of the nodes already in the graph are not used, so the nodes of the new virtual sinks are never
+        # mistaken for nodes that were there before
+        node_manager.update()
+        with node_manager.lock:
+            taken_names = {str(node.node_name) for node in node_manager.nodes.values()}
+        virtual_sinks = [self.create_virtual_sink(pw_backend.new_loopback_name(taken_names)) for _ in range(count)]
+        loopback_nodes = node_manager.wait_for_loopbacks(virtual_sinks, timeout, disconnect_output)
+        return list(zip(virtual_sinks, loopback_nodes))
+
     def remove(self, vs: VirtualSink) -> None:
         """
         Removes the VirtualSink instance by stopping its process, and removing it form the list of running processes
@@ -87,19 +282,42 @@ class VirtualSinkManager():
 
     def terminate_all(self) -> None:
         """
-        Termiante all running virtual sink processes
+        Termiante all running virtual sink processes, after sending the pending volume changes
 
         :return: None
         """
+        self.volume_controller.close()
         for proc in self.virtual_sink_processes:
             proc._remove()
         self.virtual_sink_processes = []
 
 
+def _intern(value: str | int | float | bool) -> str | int | float | bool:
+    """
+    Intern a property value if it is a string, so that the many objects sharing a value (port names, app names,
+    directions) also share a single string
+
+    :param value: the property value
+    :return: the interned string, or the value itself if it is not a string
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _slots_to_dict(o: object) -> dict:
+    """
+    Collect the attributes of an object that uses __slots__, used as the default of json.dumps()
+
+    :param o: the object to be converted
+    :return: the attributes of the object by name
+    """
+    return {name: getattr(o, name) for name in o.__slots__}
+
+
 class Port():
     """
     wrapper class around pipwwire's port object
     """
+    __slots__ = ("id", "name", "alias", "parent_node_id", "direction", "channel")
 
     def __init__(self, json_data: dict[str, str | int | dict[str, str | int]]):
         """
@@ -108,12 +326,21 @@ class Port():
         :param json_data: the information of the port object in json form parsed by _get_object_info()
         """
         self.id: int = json_data["id"]
-        self.name: str = json_data["properties"]["port.name"]
-        self.alias: str = json_data["properties"]["port.alias"]
+        self.name: str = _intern(json_data["properties"]["port.name"])
+        self.alias: str = _intern(json_data["properties"]["port.alias"])
         self.parent_node_id: int = json_data["properties"]["node.id"]
-        self.direction: str = json_data["direction"]
-
-        # self.json_data: dict[str, str | int | dict[str, str | int]] = json_data
+        self.direction: str = _intern(json_data["direction"])
+        # the channel position of the port, for example FL, if pipewire does not tell it, it is taken from the end of
+        # the port name or alias, for example playback_FL
+        channel = json_data["properties"].get("audio.channel")
+        if not isinstance(channel, str) or channel == "UNK":
+            channel = None
+            for port_name in (self.name, self.alias):
+                name_suffix = str(port_name).rsplit("_", 1)[-1]
+                if name_suffix in channel_map.KNOWN_CHANNELS:
+                    channel = name_suffix
+                    break
+        self.channel: str | None = _intern(channel)
 
     def toJSON(self) -> str:
         """
@@ -121,7 +348,7 @@ class Port():
 
         :return: the string of this object in json form
         """
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+        return json.dumps(self, default=_slots_to_dict, indent=4)
 
     def __str__(self) -> str:
         """
@@ -135,11 +362,43 @@ class Port():
         return str(self)
 
 
+def _get_node_names(properties: collections.abc.Mapping) -> tuple[str, str]:
+    """
+    Get the names identifying a node from its properties, the blacklists are matched against them
+    node.name preference order: node.name, "Unknown Node"
+    app.name preference order: application.name, application.id, "Unknown App"
+
+    :param properties: the properties of the node
+    :return: the (node name, app name) of the node
+    """
+    app_name = properties.get("application.name")
+    if app_name is None:
+        app_name = properties.get("application.id", "Unknown App")
+    return properties.get("node.name", "Unknown Node"), app_name
+
+
+def _is_blacklisted_node(node_name: str, app_name: str) -> bool:
+    """
+    Determine if a node is left out of the graph: some app and node names are blacklisted, as they are not useful to be
+    connected to an output port, and they just clog up the dropdown menu, and the streams capturing the virtual sinks
+    for the level meters and the recorder are never routed either
+
+    :param node_name: the node name of the node, see _get_node_names()
+    :param app_name: the app name of the node, see _get_node_names()
+    :return: True if the node and its ports are not stored
+    """
+    return app_name in NODE_APP_NAME_BLACKLIST or node_name in NODE_NAME_BLACKLIST or \
+        app_name == pw_backend.CAPTURE_APP_NAME
+
+
 class Node():
     """
 
     wrapper class around pipwwire's node object
+    Once a node is stored by a NodeManager it is never changed, when its ports change it is replaced by a copy, so the
+    nodes of a GraphSnapshot, and the nodes handed out to other threads stay the same
     """
+    __slots__ = ("id", "node_name", "app_name", "media_name", "input_ports", "output_ports")
 
     def __init__(self, json_data: dict[str, str | int | dict[str, str | int]]):
         """
@@ -150,23 +409,16 @@ class Node():
         self.id: int = json_data["id"]
 
         # not all nodes have the same properties, so app_name some have multiple options for a value
-        # node.name preference order: node.name, "Unknown Node"
-        # app.name preference order: application.name, application.id, "Unknown Node"
         # media.name preference order: media.name, "Unknown Media"
-        self.node_name: str = json_data["properties"]["node.name"] if "node.name" in json_data[
-            "properties"] else "Unknown Node"
-        self.app_name: str = json_data["properties"]["application.name"] if "application.name" in json_data[
-            "properties"] else json_data["properties"]["application.id"] if "application.id" in json_data[
-            "properties"] else "Unknown App"
-        self.media_name: str = json_data["properties"]["media.name"] if "media.name" in json_data[
-            "properties"] else "Unknown Media"
+        node_name, app_name = _get_node_names(json_data["properties"])
+        self.node_name: str = _intern(node_name)
+        self.app_name: str = _intern(app_name)
+        self.media_name: str = _intern(json_data["properties"].get("media.name", "Unknown Media"))
 
         # List of Port objects that are in this node
         self.input_ports: [Port] = {}
         self.output_ports: [Port] = {}
 
-        # self.json_data: dict[str, str | int | dict[str, str | int]] = json_data
-
     def _populate_ports(self, port: Port) -> None:
         """
         Populates the given port object into the correct (input / output) sides of this node
@@ -180,6 +432,19 @@ class Node():
             elif port.direction == "output":
                 self.output_ports[port.id] = port
 
+    def _copy(self) -> "Node":
+        """
+        Copy this node, with its own dicts of ports, so the ports of the copy can be changed
+
+        :return: the new Node object
+        """
+        node = Node.__new__(Node)
+        node.id, node.node_name, node.app_name, node.media_name = self.id, self.node_name, self.app_name, \
+            self.media_name
+        node.input_ports = dict(self.input_ports)
+        node.output_ports = dict(self.output_ports)
+        return node
+
     def contains_port(self, port_id: int) -> bool:
         """
         Determine if this node contains a port with certain id or not
@@ -187,7 +452,7 @@ class Node():
         :param port_id: the port id which is searched for
         :return: True if this node has any port if the port id given in the parameter
         """
-        return port_id in self.input_ports.keys() or port_id in self.output_ports.keys()
+        return port_id in self.input_ports or port_id in self.output_ports
 
     def is_source(self) -> bool:
         """
@@ -228,7 +493,7 @@ class Node():
 
         :return: the string of this object in json form
         """
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+        return json.dumps(self, default=_slots_to_dict, indent=4)
 
     def __str__(self) -> str:
         """
@@ -246,6 +511,7 @@ class Link():
     """
     wrapper class around pipwwire's link object
     """
+    __slots__ = ("id", "output_node_id", "output_port_id", "input_node_id", "input_port_id")
 
     def __init__(self, json_data: dict[str, str | int | dict[str, str | int]]):
         """
@@ -259,15 +525,13 @@ class Link():
         self.input_node_id = json_data["input-node-id"]
         self.input_port_id = json_data["input-port-id"]
 
-        # self.json_data = json_data
-
     def toJSON(self) -> str:
         """
         Convert all attributes to json form
 
         :return: the string of this object in json form
         """
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+        return json.dumps(self, default=_slots_to_dict, indent=4)
 
     def __str__(self) -> str:
         """
@@ -281,85 +545,683 @@ class Link():
         return str(self)
 
 
+GRAPH_DUMP_DESCRIPTION = "Time to get the whole graph from the sound server (pw-cli info all)"
+GRAPH_PARSE_DESCRIPTION = "Time spent on each phase of turning the graph into Node, Port and Link objects"
+# the types of the objects the NodeManager stores, the other objects (clients, modules, devices, factories, ...) are
+# dropped as soon as their type is read
+GRAPH_OBJECT_TYPES: tuple[str, ...] = ("Node", "Port", "Link")
+
+
 def _get_all_data() -> dict[int, str]:
     """
-    Gets the information of all pipewire objects using "pw-cli info all", and slices it up to be a list of strings,
+    Gets the information of all pipewire objects from the backend ("pw-cli info all"), and slices it up to be a list of strings,
     where each string contains the information of a single pipewire object
 
     :return: python dict containing int - string paris, where the int is the pipewire id or the object,
     and the string is the information about that object
     """
     delim = "\tid: "
-    while True:
-        try:
-            data = subprocess.check_output(shlex.split(f"/usr/bin/pw-cli info all"))
-            break
-        except subprocess.CalledProcessError as cpe:
-            print(f"An Error occurred while fetching the data {cpe.returncode}")
-            time.sleep(0.02)
-            continue
+    with metrics.REGISTRY.time("graph_dump_seconds", GRAPH_DUMP_DESCRIPTION):
+        data = BACKEND.info_all()
     raw_object_data_rjson = dict(
-        [(int(item.split("\n")[0]), delim + item) for item in data.decode("utf-8").split(delim) if
+        [(int(item.split("\n")[0]), delim + item) for item in data.split(delim) if
          item and not item.startswith("remote ")])
-    # print(raw_object_data_rjson)
     return raw_object_data_rjson
 
 
+def _is_unchanged(stored_object: Port | Node | Link | None, new_object: Port | Node | Link) -> bool:
+    """
+    Determine if a stored object is the same as a new version of it, the ports of the nodes are not compared, as they
+    are stored separately
+
+    :param stored_object: the stored object, or None if there is none with the same id
+    :param new_object: the new version of the object
+    :return: True if the stored object can be kept
+    """
+    return stored_object is not None and type(stored_object) is type(new_object) and all(
+        getattr(stored_object, name) == getattr(new_object, name) for name in new_object.__slots__ if
+        name not in ("input_ports", "output_ports"))
+
+
+class GraphMonitor():
+    """
+    Follows the monitor stream of the backend on a background thread, and collects the batches of added, changed and
+    removed objects, so the NodeManager can apply only the changes to its graph instead of rebuilding it
+    """
+
+    def __init__(self, backend: pw_backend.PipeWireBackend):
+        """
+        Start the monitor stream, and the thread that reads it
+        The first batch of the stream is the whole current graph, every batch after that only holds the changes
+
+        :param backend: the backend whose monitor stream is followed
+        """
+        self.batches: queue.Queue[list[dict]] = queue.Queue()  # the batches that are not yet applied to the graph
+        self.initial_dump_received: threading.Event = threading.Event()
+        self.batch_arrived: threading.Condition = threading.Condition()
+        # increased for every batch that arrives, so the NodeManager can tell if anything changed since its last update
+        self.generation: int = 0
+
+        self.monitor_stream: pw_backend.MonitorStream = backend.monitor()
+        self.reader_thread = threading.Thread(target=self._read_batches, name="graph-monitor", daemon=True)
+        self.reader_thread.start()
+        LOGGER.info("Started graph monitor")
+
+    def _read_batches(self) -> None:
+        """
+        Put every batch of the monitor stream into self.batches as it arrives
+
+        :return: None
+        """
+        for batch in self.monitor_stream:
+            # only the removals and the objects of the stored types are kept, the other objects change often (for
+            # example a client comes and goes with every pw-link call), but they are never read
+            batch = [pw_dump_object for pw_dump_object in batch if pw_dump_object.get("info") is None or
+                     pw_dump_object.get("type", "").rsplit(":", 1)[-1] in GRAPH_OBJECT_TYPES]
+            if batch or not self.initial_dump_received.is_set():  # the first batch is the whole graph, even if empty
+                with self.batch_arrived:
+                    self.batches.put(batch)
+                    self.generation += 1
+                    self.batch_arrived.notify_all()
+            self.initial_dump_received.set()
+        with self.batch_arrived:  # wake up the waiting threads, so they notice the stream ended
+            self.batch_arrived.notify_all()
+
+    def wait_for_batches(self, generation: int, timeout: float) -> bool:
+        """
+        Wait until a batch arrives after the given generation
+        The pending batches are not looked at, as an other thread (for example the one keeping the graph up to date
+        for the GUI) may take and apply them before the waiting thread wakes up: a newer generation means the graph
+        may have changed since the caller last checked it either way
+
+        :param generation: the generation seen before the graph was last checked, read before NodeManager.update()
+        :param timeout: the maximum time to wait, in seconds
+        :return: True if a newer batch arrived, False if the timeout was reached or the stream ended
+        """
+        with self.batch_arrived:
+            return self.batch_arrived.wait_for(lambda: self.generation > generation or not self.is_running(),
+                                               timeout) and self.generation > generation
+
+    def get_pending_batches(self) -> [list[dict]]:
+        """
+        Take all batches that arrived since the last call
+
+        :return: a list of batches, in the order they were printed by pw-dump
+        """
+        pending = []
+        while True:
+            try:
+                pending.append(self.batches.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def is_running(self) -> bool:
+        """
+        Determine if the monitor stream is still running
+
+        :return: True if the monitor stream is still being read, False otherwise
+        """
+        return self.reader_thread.is_alive()
+
+    def stop(self) -> None:
+        """
+        Close the monitor stream, which also ends the reader thread
+
+        :return: None
+        """
+        self.monitor_stream.close()
+        LOGGER.info("Stopped graph monitor")
+
+
+def _pw_dump_object_to_info(pw_dump_object: dict) -> dict[str, str | int | dict[str, str | int]]:
+    """
+    Convert an object printed by pw-dump to the same form as what _get_object_info() returns, so the Port, Node and Link
+    classes can be created from either of them
+
+    :param pw_dump_object: a single object from the JSON output of pw-dump
+    :return: a dict containing the objects' top level attributes and properties
+    """
+    info = pw_dump_object["info"]
+    object_info = {key: value for key, value in info.items() if key not in ("props", "params")}
+    object_info["id"] = pw_dump_object["id"]
+    object_info["properties"] = info.get("props", {})
+    return object_info
+
+
+class GraphSnapshot():
+    """
+    An immutable view of the nodes of the graph, as they were at one version of a NodeManager
+    It can be read from any thread, while the NodeManager keeps changing: the NodeManager never changes a stored Node,
+    it replaces the node with a changed copy instead, so the nodes of a snapshot are not shared with later versions
+    """
+
+    def __init__(self, version: int, nodes: dict[int, "Node"], from_cache: bool = False):
+        """
+        Create a new snapshot
+
+        :param version: the version of the NodeManager the snapshot was taken at
+        :param nodes: the nodes of the NodeManager
+        :param from_cache: whether the nodes are the ones saved by an earlier run, not yet checked against the live graph
+        """
+        self.version: int = version
+        self.from_cache: bool = from_cache
+        self.nodes: types.MappingProxyType[int, Node] = types.MappingProxyType(dict(nodes))
+        self.source_node_ids: frozenset[int] = frozenset(node_id for node_id, node in nodes.items() if node.is_source())
+        self.sink_node_ids: frozenset[int] = frozenset(node_id for node_id, node in nodes.items() if node.is_sink())
+
+    def get_nodes(self, direction: str = "All") -> dict[int, "Node"]:
+        """
+        Get nodes of a certain type: Sink, Source, or all of them, like NodeManager.get_nodes()
+
+        :param direction: the type of nodes to return: can be "Source", "Sink", "All"
+        :return: a dict containing int - node pairs or the desired type
+        """
+        direction = direction.capitalize()
+        if direction == "Source":
+            return {node_id: self.nodes[node_id] for node_id in self.source_node_ids}
+        elif direction == "Sink":
+            return {node_id: self.nodes[node_id] for node_id in self.sink_node_ids}
+        elif direction == "All":
+            return dict(self.nodes)
+        raise ValueError(f"Invalid node direction: {direction}. Must be one of: {('Source', 'Sink', 'All')}")
+
+
+class UpdateStats():
+    """
+    Counters of the NodeManager's updates: how many update() calls were served from the already loaded graph (hits),
+    how many had to refresh it (misses), and how much the refreshes cost
+    """
+
+    def __init__(self):
+        """
+        Create new counters, starting from zero
+        """
+        self.hits: int = 0
+        self.misses: int = 0
+        self.full_updates: int = 0  # the number of times the whole graph was loaded
+        self.applied_changes: int = 0  # the number of changed objects applied from the graph monitor
+        self.refresh_seconds: float = 0.0  # the total time spent refreshing the graph
+
+    def as_dict(self) -> dict[str, int | float]:
+        """
+        Get the counters as a dict
+
+        :return: the counters by name
+        """
+        return {"hits": self.hits, "misses": self.misses, "full_updates": self.full_updates,
+                "applied_changes": self.applied_changes, "refresh_seconds": self.refresh_seconds}
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses, {self.full_updates} full updates, " \
+               f"{self.applied_changes} applied changes, {round(self.refresh_seconds, 4)}s spent refreshing"
+
+
 class NodeManager():
     """
     Manages and stores the loaded pipewire objects: Nodes, Ports, and Links
+
+    The objects can be updated from a background thread, all changes are made while holding self.lock, and every
+    change increases self.version
+    Nothing waits for the sound server while holding self.lock: the listeners are called after it is released, and
+    the link changes are applied by self.link_worker
     """
 
-    def __init__(self):
+    # how long to wait for the first full graph from the graph monitor before falling back to "pw-cli info all"
+    initial_dump_timeout: float = 2.0
+    # without the graph monitor nothing tells when the graph changed, so the graph loaded by full_update() is reused by
+    # the update() calls made within this many seconds, which are usually part of the same user action
+    full_update_max_age: float = 0.05
+
+    def __init__(self, monitor: bool = True, initial_update: bool = True):
         """
         Create a new NodeManager instance: initialize the dicts in which the pipewire objects are stored
+
+        :param monitor: whether to keep the graph up to date using a GraphMonitor, if False (or the backend cannot
+        monitor the graph) every update() loads the whole graph again
+        :param initial_update: whether to load the graph right away, if False, the graph is empty (and latest_snapshot
+        is None) until the first update(), which can then be called from a background thread
         """
-        self.raw_object_data_rjson: dict[int, str] | None = None
         self.ports: dict[int, Port] = {}
         self.nodes: dict[int, Node] = {}
         self.links: dict[int, Link] = {}
 
-        self.update()
+        # the ids of the ports of every node, so a node can find its ports when it is added after them
+        self.node_port_ids: dict[int, set[int]] = {}
+        # the ids of the blacklisted nodes (see _is_blacklisted_node()), which are not stored, and neither are their ports
+        self.blacklisted_node_ids: set[int] = set()
+        # indexes of the links, kept up to date together with self.links, so finding what is connected to a port or a
+        # node does not need to go through every link
+        self.port_link_ids: dict[int, set[int]] = {}
+        self.node_input_link_ids: dict[int, set[int]] = {}
+        self.node_output_link_ids: dict[int, set[int]] = {}
+        self.port_pair_link_ids: dict[tuple[int, int], int] = {}
+
+        self.lock: threading.RLock = threading.RLock()
+        self.version: int = 0  # increased every time the stored objects change
+        self.applied_generation: int | None = None  # the generation of the graph monitor the stored objects are at
+        self.last_full_update: float | None = None  # the time.monotonic() of the last full_update()
+        self.update_stats: UpdateStats = UpdateStats()
+        self.latest_snapshot: GraphSnapshot | None = None
+        # the types of the objects loaded by warm_start() by their ids, until they are reconciled with the live graph
+        self.cached_object_types: dict[int, str] | None = None
+        # functions called with (node_manager, node ids) after every update that added nodes, or ports to them, they
+        # are not called with the graph loaded by warm_start(), only with the live graph it is reconciled with
+        self.listeners: [callable] = []
+        self.changed_node_ids: set[int] = set()  # the nodes added or changed since the listeners were last called
+        # applies the LinkTransactions submitted by the GUI thread and the listeners, see LinkTransaction.submit()
+        self.link_worker: LinkWorker = LinkWorker()
+
+        self.graph_monitor: GraphMonitor | None = None
+        if monitor:
+            try:
+                self.graph_monitor = GraphMonitor(BACKEND)
+            except OSError as ose:
+                LOGGER.warning(f"Could not start the graph monitor, falling back to full graph updates: {ose}")
+
+        if initial_update:
+            self.update()
+            self.snapshot()
 
     def update(self) -> None:
         """
-        load in the pipwwire objects from _get_all_date() into the dicts
+        Bring the stored pipewire objects up to date
+        If the graph monitor is running, only the changes since the last update are applied, and nothing is done if
+        no change arrived since then. Otherwise the whole graph is loaded again using full_update(), unless it was
+        loaded less than full_update_max_age seconds ago
 
         :return: None
         """
-        self.raw_object_data_rjson = _get_all_data()
+        if self.graph_monitor is None or not self.graph_monitor.is_running():
+            self._full_update_if_stale()
+            return
+
+        if not self.graph_monitor.initial_dump_received.wait(self.initial_dump_timeout):
+            LOGGER.warning("The graph monitor did not respond in time, loading the whole graph instead")
+            self._full_update_if_stale()
+            return
+
+        generation = self.graph_monitor.generation
+        if generation == self.applied_generation:
+            self.update_stats.hits += 1
+            return
+        self.update_stats.misses += 1
+
+        apply_start = time.time()
+        change_count = 0
+        batch_histogram = metrics.REGISTRY.histogram("monitor_batch_seconds",
+                                                     "Time to apply one batch of changes of the graph monitor")
+        with self.lock:
+            for batch in self.graph_monitor.get_pending_batches():
+                batch_start = time.perf_counter()
+                if self.cached_object_types is not None:  # the first batch is the whole live graph
+                    self._reconcile_cached_objects(batch)
+                else:
+                    self._apply_pw_dump_objects(batch)
+                batch_histogram.observe(time.perf_counter() - batch_start)
+                change_count += len(batch)
+            self.applied_generation = generation
+            if change_count:
+                self.version += 1
+            changed_node_ids = self._take_changed_node_ids()
+        self._notify_listeners(changed_node_ids)
+        apply_time = time.time() - apply_start
+        self.update_stats.applied_changes += change_count
+        self.update_stats.refresh_seconds += apply_time
+        metrics.REGISTRY.counter("monitor_objects_total", "Objects applied from the graph monitor").inc(change_count)
+        if change_count:
+            LOGGER.debug(f"applied {change_count} graph changes in: {round(apply_time, 4)}s")
+
+    def _full_update_if_stale(self) -> None:
+        """
+        Load the whole graph using full_update(), unless it was loaded less than full_update_max_age seconds ago
+
+        :return: None
+        """
+        if self.last_full_update is not None and time.monotonic() - self.last_full_update < self.full_update_max_age:
+            self.update_stats.hits += 1
+            return
+        self.update_stats.misses += 1
+        self.full_update()
+
+    def _apply_pw_dump_objects(self, pw_dump_objects: list[dict], skip_unchanged: bool = False) -> None:
+        """
+        Apply a batch of added, changed, or removed objects printed by pw-dump to the stored objects
+
+        :param pw_dump_objects: the list of objects in one batch of the pw-dump output
+        :param skip_unchanged: whether to keep the stored objects that are the same as the ones in the batch, instead of
+        replacing them (which would tell the listeners that they changed)
+        :return: None
+        """
+        for pw_dump_object in pw_dump_objects:
+            if pw_dump_object.get("info") is None:  # removed objects are printed with their info set to null
+                self._remove_object(pw_dump_object["id"])
+                continue
+
+            object_type = pw_dump_object.get("type", "").split(":")[-1]
+            if object_type == "Node":
+                # blacklisted nodes are rejected by their names, without building them
+                if _is_blacklisted_node(*_get_node_names(pw_dump_object["info"].get("props", {}))):
+                    self._blacklist_node(pw_dump_object["id"])
+                    continue
+                node = Node(_pw_dump_object_to_info(pw_dump_object))
+                # nodes are also printed again when only their state or their parameters (like their volume) changed,
+                # which are not stored, so those changes are always skipped
+                if not _is_unchanged(self.nodes.get(node.id), node):
+                    self._add_node(node)
+            elif object_type == "Port":
+                if pw_dump_object["info"].get("props", {}).get("node.id") in self.blacklisted_node_ids:
+                    continue  # the ports of blacklisted nodes are never built
+                port = Port(_pw_dump_object_to_info(pw_dump_object))
+                if not (skip_unchanged and _is_unchanged(self.ports.get(port.id), port)):
+                    self._add_port(port)
+            elif object_type == "Link":
+                link = Link(_pw_dump_object_to_info(pw_dump_object))
+                if not (skip_unchanged and _is_unchanged(self.links.get(link.id), link)):
+                    self._add_link(link)
+
+    def _reconcile_cached_objects(self, pw_dump_objects: list[dict]) -> None:
+        """
+        Bring the graph loaded by warm_start() up to date with the whole live graph, only applying the differences
+
+        :param pw_dump_objects: the first batch of the graph monitor, which contains every object of the live graph
+        :return: None
+        """
+        live_object_types = {pw_dump_object["id"]: pw_dump_object.get("type", "").split(":")[-1] for pw_dump_object
+                             in pw_dump_objects if pw_dump_object.get("info") is not None}
+        # pipewire reuses the ids of removed objects, so an id can belong to an object of an other type by now, for
+        # example the id of a cached node to a link, only the objects that are still there with the same type are kept
+        stale_object_ids = [object_id for object_id, object_type in self.cached_object_types.items() if
+                            live_object_types.get(object_id) != object_type]
+        for object_id in stale_object_ids:
+            self._remove_object(object_id)
+        self._apply_pw_dump_objects(pw_dump_objects, skip_unchanged=True)
+        # the listeners were not told about the cached nodes, so they get every node of the live graph once, like after
+        # a full_update()
+        self.changed_node_ids.update(self.nodes)
+        LOGGER.debug(f"reconciled the warm start graph with the live graph, {len(stale_object_ids)} objects were gone")
+        self.cached_object_types = None
+
+    def full_update(self) -> None:
+        """
+        load in all the pipwwire objects from the backend into the dicts
+
+        :return: None
+        """
+        # the graph is loaded and parsed before taking the lock, so other threads are not blocked while waiting for it
+        parse_start = time.time()
+        with metrics.REGISTRY.time("graph_dump_seconds", GRAPH_DUMP_DESCRIPTION):
+            data = BACKEND.info_all()
+        blacklisted_node_ids: set[int] = set()
+        with metrics.REGISTRY.time("graph_parse_seconds", GRAPH_PARSE_DESCRIPTION, phase="parse"):
+            objects_by_type = _parse_all_data(data, GRAPH_OBJECT_TYPES, blacklisted_node_ids)
+        parse_end = time.time()
+        LOGGER.debug(f"parsed {sum(len(objects) for objects in objects_by_type.values())} objects in: "
+                     f"{round(parse_end - parse_start, 4)}s")
+
+        with self.lock:
+            load_start = time.perf_counter()
+            self._load_objects(objects_by_type, blacklisted_node_ids)
+            self.cached_object_types = None  # the whole graph is replaced, nothing is left from the warm start
+            metrics.REGISTRY.histogram("graph_parse_seconds", GRAPH_PARSE_DESCRIPTION, phase="load").observe(
+                time.perf_counter() - load_start)
+            self.version += 1
+            changed_node_ids = self._take_changed_node_ids()
+        self._notify_listeners(changed_node_ids)
+        self.last_full_update = time.monotonic()
+        self.update_stats.full_updates += 1
+        self.update_stats.refresh_seconds += time.time() - parse_start
+        LOGGER.debug(f"loaded {len(self.nodes)} nodes, {len(self.ports)} ports, {len(self.links)} links in: "
+                     f"{round(time.time() - parse_end, 4)}s")
+
+    def _load_objects(self, objects_by_type: dict[str, dict[int, dict]],
+                      blacklisted_node_ids: set[int] | None = None) -> None:
+        """
+        Replace all stored objects, the caller has to hold self.lock
+
+        :param objects_by_type: the information of the objects by their type, as returned by _parse_all_data()
+        :param blacklisted_node_ids: the ids of the blacklisted nodes already left out by _parse_all_data()
+        :return: None
+        """
         self.ports = {}
         self.nodes = {}
         self.links = {}
+        self.node_port_ids = {}
+        self.port_link_ids = {}
+        self.node_input_link_ids = {}
+        self.node_output_link_ids = {}
+        self.port_pair_link_ids = {}
+        self.blacklisted_node_ids = set(blacklisted_node_ids or ())
+
+        # load the ports first, so every node gets all its ports when it is added, instead of being copied for each
+        for port_info in objects_by_type["Port"].values():
+            self._add_port(Port(port_info))
+        for node_info in objects_by_type["Node"].values():
+            self._add_node(Node(node_info))
+        for link_info in objects_by_type["Link"].values():
+            self._add_link(Link(link_info))
+
+    def warm_start(self, objects_by_type: dict[str, dict[int, dict]]) -> None:
+        """
+        Load a graph saved by an earlier run (see graph_cache.py), so it can be shown before the live graph arrives
+        When the first full graph arrives from the graph monitor, only its differences from the saved graph are
+        applied: the objects that are gone are removed, and the unchanged objects are kept as they are
+        Until then the graph is provisional (see is_provisional()): its ids may belong to other objects by now, so the
+        listeners are not called with it, and no links are made from it
 
-        # load the nodes
-        node_start = time.time()
-        for node_id in _get_object_ids("Node", self.raw_object_data_rjson):
-            node = Node(_get_object_info(node_id, self.raw_object_data_rjson))
-            # some app and node names are blacklisted, as they are not useful to be connected to an output port, and
-            # they just clog up the dropdown menu
-            if node.app_name not in NODE_APP_NAME_BLACKLIST and node.node_name not in NODE_NAME_BLACKLIST:
-                self.nodes[node_id] = node
-        node_end = time.time()
-        print(f"parsed {len(self.nodes)} nodes in: {round(node_end - node_start, 4)}s")
-
-        # load the ports
-        port_start = time.time()
-        for port_id in _get_object_ids("Port", self.raw_object_data_rjson):
-            self.ports[port_id] = Port(_get_object_info(port_id, self.raw_object_data_rjson))
-            try:
-                self.nodes[self.ports[port_id].parent_node_id]._populate_ports(self.ports[port_id])
-            except KeyError:
-                pass  # the ports of blacklisted nodes are not needed
-        port_end = time.time()
-        print(f"parsed {len(self.ports)} ports in: {round(port_end - port_start, 4)}s")
-
-        # load the links
-        links_start = time.time()
-        for link_id in _get_object_ids("Link", self.raw_object_data_rjson):
-            self.links[link_id] = Link(_get_object_info(link_id, self.raw_object_data_rjson))
-        links_end = time.time()
-        print(f"parsed {len(self.links)} links in: {round(links_end - links_start, 4)}s")
+        :param objects_by_type: the information of the saved objects by their type, as returned by graph_cache.load()
+        :return: None
+        """
+        with self.lock:
+            self._load_objects(objects_by_type)
+            self.cached_object_types = dict.fromkeys(self.nodes, "Node") | dict.fromkeys(self.ports, "Port") | \
+                dict.fromkeys(self.links, "Link")
+            self.version += 1
+            self.changed_node_ids = set()
+        self.snapshot()
+        LOGGER.debug(f"warm started with {len(self.nodes)} nodes, {len(self.ports)} ports, {len(self.links)} links")
+
+    def _add_node(self, node: Node) -> None:
+        """
+        Add a new node, or replace the stored one with the same id, keeping the ports it already had
+
+        :param node: the node to be added
+        :return: None
+        """
+        if _is_blacklisted_node(node.node_name, node.app_name):
+            self._blacklist_node(node.id)
+            return
+
+        self.blacklisted_node_ids.discard(node.id)
+        for port_id in self.node_port_ids.get(node.id, ()):
+            node._populate_ports(self.ports[port_id])
+        self.nodes[node.id] = node
+        self.changed_node_ids.add(node.id)
+
+    def _blacklist_node(self, node_id: int) -> None:
+        """
+        Remember a node as blacklisted, and remove it and the ports that arrived before it, if they are stored
+
+        :param node_id: the id of the blacklisted node
+        :return: None
+        """
+        self.nodes.pop(node_id, None)
+        self.blacklisted_node_ids.add(node_id)
+        for port_id in list(self.node_port_ids.get(node_id, ())):
+            self._remove_port(port_id)
+
+    def _add_port(self, port: Port) -> None:
+        """
+        Add a new port, or replace the stored one with the same id, and add it to its node
+
+        :param port: the port to be added
+        :return: None
+        """
+        if port.id in self.ports:
+            self._remove_port(port.id)
+        if port.parent_node_id in self.blacklisted_node_ids:
+            return  # the ports of blacklisted nodes are not needed
+        self.ports[port.id] = port
+        self.node_port_ids.setdefault(port.parent_node_id, set()).add(port.id)
+        node = self.nodes.get(port.parent_node_id)
+        if node is None:
+            return  # the node has not arrived yet, it gets its ports when it is added
+        node = node._copy()  # the stored node may be in a snapshot, so it is replaced instead of changed
+        node._populate_ports(port)
+        self.nodes[node.id] = node
+        self.changed_node_ids.add(node.id)
+
+    def _add_link(self, link: Link) -> None:
+        """
+        Add a new link, or replace the stored one with the same id
+
+        :param link: the link to be added
+        :return: None
+        """
+        if link.id in self.links:
+            self._remove_link(link.id)
+        self.links[link.id] = link
+        self.port_link_ids.setdefault(link.output_port_id, set()).add(link.id)
+        self.port_link_ids.setdefault(link.input_port_id, set()).add(link.id)
+        self.node_output_link_ids.setdefault(link.output_node_id, set()).add(link.id)
+        self.node_input_link_ids.setdefault(link.input_node_id, set()).add(link.id)
+        self.port_pair_link_ids[(link.output_port_id, link.input_port_id)] = link.id
+
+    def _remove_link(self, link_id: int) -> None:
+        """
+        Remove a link, and remove it from the link indexes
+
+        :param link_id: the id of the link to be removed
+        :return: None
+        """
+        link = self.links.pop(link_id)
+        for index, key in ((self.port_link_ids, link.output_port_id), (self.port_link_ids, link.input_port_id),
+                           (self.node_output_link_ids, link.output_node_id),
+                           (self.node_input_link_ids, link.input_node_id)):
+            link_ids = index.get(key)
+            if link_ids is not None:
+                link_ids.discard(link_id)
+                if not link_ids:
+                    del index[key]
+        if self.port_pair_link_ids.get((link.output_port_id, link.input_port_id)) == link_id:
+            del self.port_pair_link_ids[(link.output_port_id, link.input_port_id)]
+
+    def _remove_port(self, port_id: int) -> None:
+        """
+        Remove a port, and remove it from its node
+
+        :param port_id: the id of the port to be removed
+        :return: None
+        """
+        port = self.ports.pop(port_id)
+        sibling_port_ids = self.node_port_ids.get(port.parent_node_id, set())
+        sibling_port_ids.discard(port_id)
+        if not sibling_port_ids:
+            self.node_port_ids.pop(port.parent_node_id, None)
+        node = self.nodes.get(port.parent_node_id)
+        if node is not None and node.contains_port(port_id):
+            node = node._copy()  # the stored node may be in a snapshot, so it is replaced instead of changed
+            node.input_ports.pop(port_id, None)
+            node.output_ports.pop(port_id, None)
+            self.nodes[node.id] = node
+
+    def _remove_object(self, object_id: int) -> None:
+        """
+        Remove a node, port, or link with the given id, if it is stored
+
+        :param object_id: the id of the removed pipewire object
+        :return: None
+        """
+        if object_id in self.ports:
+            self._remove_port(object_id)
+        elif object_id in self.nodes:
+            del self.nodes[object_id]
+        elif object_id in self.links:
+            self._remove_link(object_id)
+        else:
+            self.blacklisted_node_ids.discard(object_id)
+
+    def add_listener(self, listener) -> None:
+        """
+        Add a function to be called after every update that added nodes, or added ports to them
+        The listener is called with (node_manager, node ids) on the thread doing the update, after self.lock was
+        released, so it has to take the lock to read the stored objects, and must not wait for the sound server while
+        holding it (see LinkTransaction.submit())
+
+        :param listener: the function to be called
+        :return: None
+        """
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        """
+        Remove a function added by add_listener()
+
+        :param listener: the function to be removed
+        :return: None
+        """
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def is_provisional(self) -> bool:
+        """
+        Check whether the stored graph is the one loaded by warm_start(), which is not yet reconciled with the live
+        graph, so the ids of its objects cannot be used to make links
+
+        :return: True if the graph is provisional
+        """
+        return self.cached_object_types is not None
+
+    def _take_changed_node_ids(self) -> [int]:
+        """
+        Get the stored nodes that were added or changed since the listeners were last called, and forget them, the
+        caller has to hold self.lock
+
+        :return: the ids of the nodes, to be passed to _notify_listeners() after releasing self.lock
+        """
+        changed_node_ids = [node_id for node_id in self.changed_node_ids if node_id in self.nodes]
+        self.changed_node_ids = set()
+        return changed_node_ids
+
+    def _notify_listeners(self, changed_node_ids: [int]) -> None:
+        """
+        Call the listeners with the nodes that were added or changed, without holding self.lock
+
+        :param changed_node_ids: the ids of the nodes, as returned by _take_changed_node_ids()
+        :return: None
+        """
+        if not changed_node_ids:
+            return
+        with metrics.REGISTRY.time("graph_listeners_seconds", "Time spent in the listeners of the graph changes"):
+            for listener in list(self.listeners):
+                try:
+                    listener(self, changed_node_ids)
+                except Exception as exception:  # a failing listener must not stop the graph from being updated
+                    LOGGER.error(f"Graph listener {listener} failed: {exception!r}")
+
+    def snapshot(self) -> GraphSnapshot:
+        """
+        Get a snapshot of the current version of the graph, a new one is only created if the graph changed since the
+        last one, which is also kept in self.latest_snapshot
+
+        :return: the GraphSnapshot of the current version
+        """
+        with self.lock:
+            if self.latest_snapshot is None or self.latest_snapshot.version != self.version:
+                self.latest_snapshot = GraphSnapshot(self.version, self.nodes, self.is_provisional())
+            return self.latest_snapshot
+
+    def close(self) -> None:
+        """
+        Stop the graph monitor, if it is running, and stop the link worker after it applied the submitted link changes
+
+        :return: None
+        """
+        LOGGER.info(f"graph updates: {self.update_stats}")
+        if self.graph_monitor is not None:
+            self.graph_monitor.stop()
+        self.link_worker.close()
 
     def get_nodes(self, direction: str = "All") -> dict[int, Node]:
         """
@@ -375,9 +1237,10 @@ class NodeManager():
             raise ValueError(f"Invalid node direction: {direction}. Must be one of: {acceptable_directions}")
 
         # get the correct (node_id, node) pairs into a dict
-        target_nodes = dict([(node_id, node) for node_id, node in self.nodes.items() if
-                             direction == "All" or (direction == "Source" and node.is_source()) or (
-                                     direction == "Sink" and node.is_sink())])
+        with self.lock:
+            target_nodes = dict([(node_id, node) for node_id, node in self.nodes.items() if
+                                 direction == "All" or (direction == "Source" and node.is_source()) or (
+                                         direction == "Sink" and node.is_sink())])
 
         return target_nodes
 
@@ -388,39 +1251,117 @@ class NodeManager():
         :param loopback_virtual_sink: A VirtualSink instance for getting the corresponding sink node
         :return: a Node object that corresponds to the VirtualSink given in the parameter
         """
-        allowed_types = ("Sink", "Source", "Monitor")
+        allowed_types = ("Sink", "Source")
         if node_type not in allowed_types:
             raise ValueError(f"Invalid argument: {node_type} Must be one of: {allowed_types}")
-        # retry until the node is found, because piprwire does not always refresh the data quickly enough between
-        # creating the loopback device and the calling of this function
-        result_node: Node | None = None
-        time_increment: float = 0.02
-        counter: int = 0
-        max_retries = 20
-
-        while not result_node and counter < max_retries:
-            print(f"Getting sink node for: {loopback_virtual_sink.name}")
-            counter += 1
-            time.sleep(time_increment * counter)  # wait for pipewire to refresh the data
-            self.update()  # request and load the data
-            for node in self.get_nodes(node_type).values():  # search for the correct Sink node
-                # print("loop ", loopback_virtual_sink.name, "node ", node.media_name)
-                if loopback_virtual_sink.name in node.media_name:
-                    result_node = node
-
-        if counter >= max_retries:
-            print(f"Could not find loopback {node_type} node")
-            raise RuntimeError(f"Could not find loopback {node_type} node")
-
-        print(f"Selected {result_node.get_readable_name()} in {counter} tries")
+
+        sink_node, source_node, output_node = self.wait_for_loopback(loopback_virtual_sink)
+        return sink_node if node_type == "Sink" else source_node
+
+    def wait_for_loopback(self, loopback_virtual_sink: VirtualSink, timeout: float = 5.0,
+                          disconnect_output: bool = True) -> tuple[Node, Node, Node]:
+        """
+        Wait until all nodes of a virtual sink's loopback device, and all their ports appear in the graph
+
+        :param loopback_virtual_sink: the VirtualSink instance whose nodes are waited for
+        :param timeout: the maximum time to wait, in seconds
+        :param disconnect_output: whether to disconnect the output of the loopback device from the system output
+        :return: the (sink node, source node, output node) of the loopback device
+        """
+        return self.wait_for_loopbacks([loopback_virtual_sink], timeout, disconnect_output)[0]
+
+    def wait_for_loopbacks(self, loopback_virtual_sinks: [VirtualSink], timeout: float = 5.0,
+                           disconnect_output: bool = True) -> [tuple[Node, Node, Node]]:
+        """
+        Wait until all nodes of several virtual sinks' loopback devices, and all their ports appear in the graph
+
+        pipewire creates the nodes of the loopback devices asynchronously, so they usually appear a little after the
+        VirtualSinks are created. With the graph monitor running this only applies the changes as they arrive, and
+        returns as soon as the nodes are there, without loading the whole graph
+
+        :param loopback_virtual_sinks: the VirtualSink instances whose nodes are waited for
+        :param timeout: the maximum time to wait for all of them, in seconds
+        :param disconnect_output: whether to disconnect the outputs of the loopback devices from the system output, all
+        of them are disconnected in one batch
+        :return: the (sink node, source node, output node) of every loopback device, in the order of the VirtualSinks
+        """
+        names = ", ".join(virtual_sink.name for virtual_sink in loopback_virtual_sinks)
+        LOGGER.debug(f"Waiting for the nodes of: {names}")
+        wait_start = time.time()
+        deadline = time.monotonic() + timeout
+        found_nodes: dict[int, tuple[Node, Node, Node]] = {}  # the nodes found so far, by the index of the VirtualSink
+        retries = metrics.REGISTRY.counter("loopback_wait_retries_total",
+                                           "Checks of the graph that did not find all nodes of the virtual sinks")
+        while True:
+            # the batches arriving from now on are waited for, even if an other thread applies them
+            seen_generation = self.graph_monitor.generation if self.graph_monitor is not None else 0
+            self.update()  # only applies the changes while the graph monitor is running
+            with self.lock:
+                for index, virtual_sink in enumerate(loopback_virtual_sinks):
+                    if index not in found_nodes:
+                        loopback_nodes = self._find_loopback_nodes(virtual_sink)
+                        if loopback_nodes is not None:
+                            found_nodes[index] = loopback_nodes
+            if len(found_nodes) == len(loopback_virtual_sinks):
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                missing_names = ", ".join(virtual_sink.name for index, virtual_sink in
+                                          enumerate(loopback_virtual_sinks) if index not in found_nodes)
+                LOGGER.error(f"Could not find the nodes of {missing_names}")
+                metrics.REGISTRY.counter("loopback_wait_timeouts_total",
+                                         "Waits for the nodes of virtual sinks that timed out").inc()
+                raise RuntimeError(f"Could not find the nodes of {missing_names}")
+            retries.inc()
+            if self.graph_monitor is not None and self.graph_monitor.is_running():
+                self.graph_monitor.wait_for_batches(seen_generation, remaining)
+            else:
+                time.sleep(min(0.02, remaining))  # without the graph monitor, the whole graph has to be reloaded
+
+        wait_time = time.time() - wait_start
+        metrics.REGISTRY.histogram("loopback_wait_seconds",
+                                   "Time until the nodes of new virtual sinks appear").observe(wait_time)
+        LOGGER.debug(f"Found the nodes of {names} in {round(wait_time, 4)}s")
 
         # by default the output of the virtual loopback device is connected to the system audio output, thus anything
         # connected to the input of the loopback device gets heard twice, in quick succession making it sound louder
         # due to the low latency, but this behaviour is not desired, so dircennecting the loopback device from
         # the system output:
-        self.disconnect_loopback_output(loopback_virtual_sink)
+        if disconnect_output:
+            self.disconnect_all_links_from_ports(
+                [port_id for loopback_nodes in found_nodes.values() for port_id in loopback_nodes[2].output_ports])
 
-        return result_node
+        return [found_nodes[index] for index in range(len(loopback_virtual_sinks))]
+
+    def _find_loopback_nodes(self, loopback_virtual_sink: VirtualSink) -> tuple[Node, Node, Node] | None:
+        """
+        Find the nodes of a virtual sink's loopback device, if all of them, and all of their ports are in the graph
+
+        :param loopback_virtual_sink: the VirtualSink instance whose nodes are searched for
+        :return: the (sink node, source node, output node) of the loopback device, or None if any of them is missing
+        """
+        channel_count = len(pw_backend.LOOPBACK_CHANNELS)
+        sink_node: Node | None = None
+        source_node: Node | None = None
+        output_node: Node | None = None
+        # the node.name of the sink node is the name of the virtual sink, and the node.name of the output node is
+        # "{name}.output", they are matched exactly, so "...-sink-1" does not find the nodes of "...-sink-10", and the
+        # name contains pw_backend.INSTANCE_TOKEN, so the nodes of other instances of the app are never found
+        loopback_node_names = (loopback_virtual_sink.name, f"{loopback_virtual_sink.name}.output")
+        for node in self.nodes.values():
+            if node.node_name not in loopback_node_names:
+                continue
+            if node.is_sink() and node.node_name == loopback_virtual_sink.name:
+                sink_node = node
+            if node.is_source():
+                source_node = node
+                if node.node_name == loopback_node_names[1]:
+                    output_node = node
+
+        if sink_node is None or output_node is None or len(sink_node.input_ports) < channel_count or len(
+                output_node.output_ports) < channel_count:
+            return None
+        return sink_node, source_node, output_node
 
     def disconnect_loopback_output(self, loopback_virtual_sink: VirtualSink) -> None:
         """
@@ -430,44 +1371,336 @@ class NodeManager():
         :return: None
         """
         # by default the loopback output node is connected to the system output
-
-        print("disconnecting virtual sink output...")
-        result_node: Node | None = None
-        time_increment: float = 0.02
-        counter: int = 0
-
-        # retry until the node is found, because piprwire does not always refresh the data quickly enough between
-        # creating the loopback device and the calling of this function
-        while not result_node:
-            print(f"getting source output node for: {loopback_virtual_sink.name}")
-            counter += 1
-            time.sleep(time_increment * counter)  # wait for pipewire to refresh the data
-            self.update()  # request and load the data
-            for node in self.get_nodes("Source").values():  # search for the correct Source node
-                # print("loop ", loopback_virtual_sink.name, "node ", node.media_name)
-                if f"{loopback_virtual_sink.name} output" == node.media_name:
-                    # print(node)
-                    result_node = node
-
-        print(f"Selected {result_node.get_readable_name()} in {counter} tries")
-
-        # disconnect all outgoing links from this node
-        self.disconnect_all_links_from_ports((result_node.output_ports.keys()))
+        LOGGER.debug("disconnecting virtual sink output...")
+        self.wait_for_loopback(loopback_virtual_sink, disconnect_output=True)
 
     def disconnect_all_links_from_ports(self, target_port_ids: [int]) -> None:
         """
-        Disconnect all links that go to or from a port
+        Disconnect all links that go to or from a port, and wait until they are removed, the links are looked up while
+        holding self.lock, and removed after releasing it, so this must not be called from the GUI thread
 
         :param target_port_ids: A list of port IDs
         :return: None
         """
-        for link_id, link in self.links.items():  # go through all links
-            # if target port is in link
-            if link.output_port_id in target_port_ids or link.input_port_id in target_port_ids:
-                _pw_link(link_id=link_id, disconnect=True)  # disconnect the link
+        transaction = LinkTransaction(self)
+        with self.lock:
+            link_ids: set[int] = set()
+            for port_id in target_port_ids:
+                link_ids.update(self.port_link_ids.get(port_id, ()))
+            for link_id in sorted(link_ids):
+                transaction.remove_link(self.links[link_id])  # disconnect the link
+        transaction.commit()
+
+    def get_link_id(self, source_port_id: int, sink_port_id: int) -> int | None:
+        """
+        Find the link between two ports
+
+        :param source_port_id: a port on the output side of a node
+        :param sink_port_id: a port on the input side of a node
+        :return: the id of the link, or None if the ports are not linked
+        """
+        return self.port_pair_link_ids.get((source_port_id, sink_port_id))
+
+    def get_port_links(self, port_id: int) -> [Link]:
+        """
+        Get the links that go to or from a port
+
+        :param port_id: the id of the port
+        :return: the list of links connected to the port
+        """
+        with self.lock:
+            return [self.links[link_id] for link_id in self.port_link_ids.get(port_id, ())]
+
+    def get_node_links(self, node_id: int, direction: str = "All") -> [Link]:
+        """
+        Get the links that go to or from a node
+
+        :param node_id: the id of the node
+        :param direction: "Input" for the links going into the node, "Output" for the links coming out of it, or "All"
+        :return: the list of links connected to the node
+        """
+        direction = direction.capitalize()
+        acceptable_directions = ("Input", "Output", "All")
+        if direction not in acceptable_directions:
+            raise ValueError(f"Invalid link direction: {direction}. Must be one of: {acceptable_directions}")
+
+        with self.lock:
+            link_ids: set[int] = set()
+            if direction in ("Input", "All"):
+                link_ids.update(self.node_input_link_ids.get(node_id, ()))
+            if direction in ("Output", "All"):
+                link_ids.update(self.node_output_link_ids.get(node_id, ()))
+            return [self.links[link_id] for link_id in link_ids]
+
+    def get_port_node(self, port_id: int) -> Node | None:
+        """
+        Get the node a port belongs to
+
+        :param port_id: the id of the port
+        :return: the node of the port, or None if the port or its node is not stored (for example it is blacklisted)
+        """
+        port = self.ports.get(port_id)
+        return self.nodes.get(port.parent_node_id) if port is not None else None
+
+
+LINK_APPLY_DESCRIPTION = "Time to send link operations to the sound server, one batch or one pw-link call"
+
+
+def _count_link_operation(action: str) -> None:
+    """
+    Count a link operation in the metrics
+
+    :param action: the action of the operation: "connect", "disconnect", or "remove"
+    :return: None
+    """
+    metrics.REGISTRY.counter("link_operations_total", "Link operations sent to the sound server",
+                             action=action).inc()
+
+
+def _apply_link_operations(operations: [pw_backend.LinkOperation]) -> bool:
+    """
+    Apply link operations through the backend, in order, waiting until they are applied
+
+    :param operations: the operations to be applied
+    :return: True if the operations were applied, False if the sound server failed to apply them
+    """
+    if not operations:
+        return True
+    for operation in operations:
+        _count_link_operation(operation.action)
+    with metrics.REGISTRY.time("link_apply_seconds", LINK_APPLY_DESCRIPTION):
+        try:
+            BACKEND.apply_link_operations(operations)
+        except (OSError, RuntimeError) as error:
+            LOGGER.error(f"Could not apply {len(operations)} link operations: {error}")
+            return False
+    return True
+
+
+class LinkTransaction():
+    """
+    Collects connect and disconnect operations, and applies all of them at once through the backend, so a whole
+    change of routing costs a single round trip instead of a pw-link process per port
+
+    It can be used as a context manager, which commits the operations when the block ends without an error:
+        with LinkTransaction(node_manager) as transaction:
+            transaction.connect(source_port, sink_port)
+
+    commit() waits for the sound server, so a transaction built while holding the NodeManager's lock, or on the GUI
+    thread, is handed to the NodeManager's LinkWorker with submit() instead
+    A transaction that got an operation while the graph of its NodeManager was provisional (see
+    NodeManager.is_provisional()) is never applied, as the ids in it may belong to other objects
+    """
+
+    def __init__(self, node_manager: NodeManager | None = None):
+        """
+        Create a new, empty transaction
+
+        :param node_manager: a NodeManager instance storing the Links, it is used to find the links between the ports
+        that are disconnected, so they can be removed by their id, and the ports that are not linked can be skipped
+        """
+        self.node_manager: NodeManager | None = node_manager
+        self.operations: [pw_backend.LinkOperation] = []
+        self.from_cache: bool = False  # whether an operation was added while the graph was provisional
+
+    def connect(self, source_port: Port, sink_port: Port) -> None:
+        """
+        Add the linking of two ports to the transaction
+
+        :param source_port: a port on the output side of a node
+        :param sink_port: a port on the input side of a node
+        :return: None
+        """
+        LOGGER.debug(f"connecting ports: {source_port.id}, {sink_port.id}")
+        self._add(pw_backend.LinkOperation("connect", source_port.parent_node_id, source_port.id,
+                                           sink_port.parent_node_id, sink_port.id))
+
+    def disconnect(self, source_port: Port, sink_port: Port) -> None:
+        """
+        Add the unlinking of two ports to the transaction
+        With a NodeManager the link is removed by its id, and nothing is done if the ports are not linked, without one
+        the backend looks up the link between the ports when the transaction is committed
+
+        :param source_port: a port on the output side of a node
+        :param sink_port: a port on the input side of a node
+        :return: None
+        """
+        if self.node_manager is not None:
+            link_id = self.node_manager.get_link_id(source_port.id, sink_port.id)
+            if link_id is None:  # the ports are not linked, there is nothing to disconnect
+                return
+            LOGGER.debug(f"Disconnecting ports: {source_port.id}, {sink_port.id}")
+            self._add(pw_backend.LinkOperation("remove", link_id=link_id))
+        else:
+            LOGGER.debug(f"Disconnecting ports: {source_port.id}, {sink_port.id}")
+            self._add(pw_backend.LinkOperation("disconnect", source_port.parent_node_id, source_port.id,
+                                               sink_port.parent_node_id, sink_port.id))
+
+    def remove_link(self, link: Link) -> None:
+        """
+        Add the removal of a link to the transaction
+
+        :param link: the link to be removed
+        :return: None
+        """
+        LOGGER.debug(f"Disconnecting link: {link.id}")
+        self._add(pw_backend.LinkOperation("remove", link_id=link.id))
+
+    def _add(self, operation: pw_backend.LinkOperation) -> None:
+        """
+        Add an operation to the transaction, noting whether the graph it was made from is provisional
+
+        :param operation: the operation to be added
+        :return: None
+        """
+        if self.node_manager is not None and self.node_manager.is_provisional():
+            self.from_cache = True
+        self.operations.append(operation)
+
+    def _take_operations(self) -> list[pw_backend.LinkOperation] | None:
+        """
+        Take the collected operations, leaving the transaction empty
+
+        :return: the operations, or None if they were made from a provisional graph, and must not be applied
+        """
+        operations, self.operations = self.operations, []
+        from_cache, self.from_cache = self.from_cache, False
+        if from_cache:
+            LOGGER.warning(f"Not applying {len(operations)} link operations made before the live graph was loaded")
+            return None
+        return operations
+
+    def commit(self) -> bool:
+        """
+        Apply all collected operations through the backend, in the order they were added
+
+        :return: True if the operations were applied, False if the sound server failed to apply them, or they were made
+        from a provisional graph
+        """
+        operations = self._take_operations()
+        return operations is not None and _apply_link_operations(operations)
+
+    def submit(self) -> None:
+        """
+        Hand all collected operations to the LinkWorker of the NodeManager, which applies them in the background, in
+        the order they were submitted, returns right away
+        Without a NodeManager the operations are applied right away, like commit() does
+
+        :return: None
+        """
+        operations = self._take_operations()
+        if not operations:
+            return
+        if self.node_manager is None:
+            _apply_link_operations(operations)
+        else:
+            self.node_manager.link_worker.submit(operations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+
+
+class LinkWorker():
+    """
+    Applies the link operations submitted by LinkTransaction.submit() on a background thread, one batch at a time, in
+    the order they were submitted, so neither the GUI thread nor a thread holding the NodeManager's lock waits for the
+    sound server
+    """
+
+    def __init__(self):
+        """
+        Create a new LinkWorker, and start its thread
+        """
+        self.batches: collections.deque[[pw_backend.LinkOperation]] = collections.deque()
+        self.applying: bool = False  # whether a batch was taken, and is being applied
+        self.closed: bool = False
+        self.condition: threading.Condition = threading.Condition()
+        self.worker_thread: threading.Thread = threading.Thread(target=self._apply_batches, name="link-worker",
+                                                                daemon=True)
+        self.worker_thread.start()
+
+    def submit(self, operations: [pw_backend.LinkOperation]) -> None:
+        """
+        Add a batch of operations to be applied, returns right away
+
+        :param operations: the operations, applied together, after the batches submitted before them
+        :return: None
+        """
+        with self.condition:
+            self.batches.append(operations)
+            self.condition.notify_all()
+
+    def wait_until_idle(self, timeout: float | None = None) -> bool:
+        """
+        Wait until every submitted batch is applied
+
+        :param timeout: the maximum time to wait, in seconds, None to wait as long as it takes
+        :return: True if every batch was applied, False if the timeout passed first
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.batches and not self.applying, timeout)
+
+    def _apply_batches(self) -> None:
+        """
+        Apply the submitted batches until close() is called, runs in the worker thread
+
+        :return: None
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.batches or self.closed)
+                if not self.batches:  # closed, and everything was applied
+                    return
+                operations = self.batches.popleft()
+                self.applying = True
+            try:
+                _apply_link_operations(operations)
+            except Exception as exception:  # a failing batch must not stop the batches after it
+                LOGGER.error(f"Could not apply {len(operations)} link operations: {exception!r}")
+            with self.condition:
+                self.applying = False
+                self.condition.notify_all()
+
+    def close(self) -> None:
+        """
+        Apply the submitted batches, and stop the worker thread
+
+        :return: None
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.worker_thread.join()
+
+
+def pair_ports(source_node: Node, sink_node: Node) -> [tuple[Port, Port]]:
+    """
+    Pair the output ports of a node with the corresponding input ports of an other node, by their channel positions
+    A source port can be paired with several sink ports (for example mono to FL and FR), and several source ports with
+    the same sink port (for example FL and FC to FL), see channel_map.plan_pairs()
+
+    :param source_node: Node the links go from
+    :param sink_node: Node the links go to
+    :return: the list of (source port, sink port) pairs, empty if the ports of the nodes cannot be paired
+    """
+    source_ports = list(source_node.output_ports.values())
+    sink_ports = list(sink_node.input_ports.values())
+    source_layout = tuple(channel_map.get_layout_channel(port.channel, len(source_ports) == 1) for port in source_ports)
+    sink_layout = tuple(channel_map.get_layout_channel(port.channel, len(sink_ports) == 1) for port in sink_ports)
+    if None in source_layout or None in sink_layout:  # the port names are only needed without the channel positions
+        plan = channel_map.plan_pairs(source_layout, sink_layout, tuple(port.name for port in source_ports),
+                                      tuple(port.name for port in sink_ports))
+    else:
+        plan = channel_map.plan_pairs(source_layout, sink_layout)
+    return [(source_ports[source_index], sink_ports[sink_index]) for source_index, sink_index in plan]
 
 
-def connect_nodes(source_node: Node | None, sink_node: Node | None, disconnect=False, reverse_order=False) -> bool:
+def connect_nodes(source_node: Node | None, sink_node: Node | None, disconnect=False, reverse_order=False,
+                  transaction: LinkTransaction | None = None, node_manager: NodeManager | None = None) -> bool:
     """
     Connect or disconnect the ports of two nodes, if the number of their ports match
 
@@ -475,30 +1708,35 @@ def connect_nodes(source_node: Node | None, sink_node: Node | None, disconnect=F
     :param source_node: Node the links go from
     :param sink_node: Node the links go to
     :param disconnect: if true the nodes will be disconnected, else connected, default: False
+    :param transaction: the LinkTransaction the operations are added to, if None, a new one is created and committed
+    :param node_manager: a NodeManager instance storing the Links, used to remove the links by their id
     :return: True if the nodes could be connected / disconnected, False otherwise
     """
     if reverse_order:
         source_node, sink_node = sink_node, source_node
 
+    if transaction is None:
+        with LinkTransaction(node_manager) as transaction:
+            return connect_nodes(source_node, sink_node, disconnect=disconnect, transaction=transaction)
+
     if source_node and sink_node:  # if both nodes exist and not None
-        print(
+        LOGGER.debug(
             f"{'Dis' if disconnect else ''}connecting node {source_node.id} {source_node.get_readable_name()} {'to' if not disconnect else 'from'} {sink_node.id} {sink_node.get_readable_name()}")
-        if len(source_node.output_ports) == len(sink_node.input_ports):  # if number of ports match
+        port_pairs = pair_ports(source_node, sink_node)
+        if port_pairs:  # if the ports can be paired
             # link / unlink the corresponding ports
-            for source_port_id, sink_port_id in zip(
-                    # get the IDs of the ports, but sort them based on the flipped version of their name attribute
-                    # the name attribute is commonly output_FL, output_FR, playback_FL, playback_FR
-                    # sorting based on the reverse of them ensures _FL - _FL and _FR - _FR pairs remain together
-                    [port.id for port in sorted(source_node.output_ports.values(), key=lambda item: item.name[::-1])],
-                    [port.id for port in sorted(sink_node.input_ports.values(), key=lambda item: item.name[::-1])]):
-                _pw_link(source_port_id=source_port_id, sink_port_id=sink_port_id, disconnect=disconnect)
+            for source_port, sink_port in port_pairs:
+                if disconnect:
+                    transaction.disconnect(source_port, sink_port)
+                else:
+                    transaction.connect(source_port, sink_port)
             return True
         else:
-            print(
-                f"Cannot {'Dis' if disconnect else ''}connect node {source_node} {'to' if not disconnect else 'from'} {sink_node.id} {sink_node.get_readable_name()}: Their port numbers do not match: {len(source_node.output_ports)} : {len(sink_node.input_ports)}")
+            LOGGER.warning(
+                f"Cannot {'Dis' if disconnect else ''}connect node {source_node} {'to' if not disconnect else 'from'} {sink_node.id} {sink_node.get_readable_name()}: Their ports cannot be paired: {len(source_node.output_ports)} : {len(sink_node.input_ports)}")
             return False
     else:
-        print(
+        LOGGER.warning(
             f"Cannot {'Dis' if disconnect else ''}connect node {source_node} {'to' if not disconnect else 'from'} {sink_node.id} {sink_node.get_readable_name()}")
         return False
 
@@ -517,34 +1755,81 @@ def connect_nodes_replace_connection(source_node: Node | None, sink_node: Node |
     if reverse_order:
         source_node, sink_node = sink_node, source_node
 
-    if replace_connection:
-        disconnect_all_inputs(sink_node, node_manager=node_manager)
-    return connect_nodes(source_node, sink_node)
+    # the removal of the old connections and the creation of the new ones are applied together
+    with LinkTransaction(node_manager) as transaction:
+        if replace_connection:
+            disconnect_all_inputs(sink_node, node_manager=node_manager, transaction=transaction)
+        return connect_nodes(source_node, sink_node, transaction=transaction)
 
 
-def disconnect_all_inputs(node: Node, node_manager: NodeManager):
+def disconnect_all_inputs(node: Node, node_manager: NodeManager, transaction: LinkTransaction | None = None):
     """
     Disconnect all links from a node's input side
     :param node: node which will have its inputs disconnected
     :param node_manager: a NodeManager instance storing all the links
+    :param transaction: the LinkTransaction the operations are added to, if None, a new one is created and committed
     """
-    print(f"Disconnecting all inputs from: {node.get_readable_name()}")
-    for link_id, link in node_manager.links.items():
-        # print(f"link: {link}")
-        if link.input_port_id in node.input_ports.keys():
-            print(f"removing link with id: {link.id}")
-            _pw_link(link.output_port_id, link.input_port_id, disconnect=True)
+    if transaction is None:
+        with LinkTransaction(node_manager) as transaction:
+            return disconnect_all_inputs(node, node_manager, transaction)
 
+    LOGGER.debug(f"Disconnecting all inputs from: {node.get_readable_name()}")
+    for link in node_manager.get_node_links(node.id, "Input"):
+        transaction.remove_link(link)
 
-def disconnect_nodes(source_node: Node | None, sink_node: Node | None) -> None:
+
+def disconnect_nodes(source_node: Node | None, sink_node: Node | None, node_manager: NodeManager | None = None,
+                     transaction: LinkTransaction | None = None) -> None:
     """
     Disconnect or the ports of two nodes, if the number of their ports match
 
     :param source_node: Node the links go from
     :param sink_node: Node the links go to
+    :param node_manager: a NodeManager instance storing the Links, used to remove the links by their id
+    :param transaction: the LinkTransaction the operations are added to, if None, a new one is created and committed
     :return: None
     """
-    connect_nodes(source_node, sink_node, disconnect=True)
+    connect_nodes(source_node, sink_node, disconnect=True, transaction=transaction, node_manager=node_manager)
+
+
+def reconcile_links(node_manager: NodeManager, desired_port_pairs: [tuple[Port, Port]], sink_node_ids: set[int],
+                    source_node_ids: set[int] | None = None,
+                    transaction: LinkTransaction | None = None) -> [tuple[int, int]]:
+    """
+    Bring the links going into some sink nodes to a desired state, changing only the links that differ from it: the
+    missing links are created, the managed links that are not desired are removed, and the links that are already
+    there are left alone, so the audio flowing through them is not interrupted
+    The new links are created before the old ones are removed, so switching from one node to an other has no gap
+
+    :param node_manager: the NodeManager storing the current links, its lock is held while the links are compared
+    :param desired_port_pairs: the (source port, sink port) pairs that should be linked, for example from pair_ports()
+    :param sink_node_ids: the nodes whose input links are managed
+    :param source_node_ids: only the links coming from these nodes are managed, the others are kept, if None, every
+    link going into the sink nodes is managed
+    :param transaction: the LinkTransaction the operations are added to, if None, a new one is created and committed
+    :return: the (source port id, sink port id) pairs of the links that were requested to be created
+    """
+    if transaction is None:
+        with LinkTransaction(node_manager) as transaction:
+            return reconcile_links(node_manager, desired_port_pairs, sink_node_ids, source_node_ids, transaction)
+
+    with node_manager.lock:
+        current_links: dict[tuple[int, int], Link] = {}  # the managed links, by their (source, sink) port ids
+        for sink_node_id in sink_node_ids:
+            for link in node_manager.get_node_links(sink_node_id, "Input"):
+                if source_node_ids is None or link.output_node_id in source_node_ids:
+                    current_links[(link.output_port_id, link.input_port_id)] = link
+        desired_port_id_pairs = {(source_port.id, sink_port.id) for source_port, sink_port in desired_port_pairs}
+
+        created_port_pairs = []
+        for source_port, sink_port in desired_port_pairs:
+            if (source_port.id, sink_port.id) not in current_links:
+                transaction.connect(source_port, sink_port)
+                created_port_pairs.append((source_port.id, sink_port.id))
+        for port_pair, link in current_links.items():
+            if port_pair not in desired_port_id_pairs:
+                transaction.remove_link(link)
+    return created_port_pairs
 
 
 def to_python_type(string_input: str) -> bool | int | float | str:
@@ -590,10 +1875,9 @@ def _get_object_info(object_id: int, object_data_raw_rjson: dict[int, str] = Non
     :return: a dict containing the objects' top level attributes and properties
     """
 
-    # if the object data is not given in the argument, request it from pw-cli
+    # if the object data is not given in the argument, request it from the backend
     if object_data_raw_rjson is None:
-        object_data_raw_rjson: dict[int, str] = {
-            object_id: subprocess.check_output(shlex.split(f"/usr/bin/pw-cli info {object_id}")).decode("utf-8")}
+        object_data_raw_rjson: dict[int, str] = _get_all_data()
 
     # parsing is done line-by-line
     # each line can match one of 2 regular expressions:
@@ -618,7 +1902,7 @@ def _get_object_info(object_id: int, object_data_raw_rjson: dict[int, str] = Non
     root_attribute_matcher = re.compile("^(?:\**\s+)([a-zA-Z0-9 \.\-\_]+)(?:: )(.+$)")
     property_matcher = re.compile("^(?:\**\s+)([a-zA-Z0-9\.\-\_]+)(?: = )(.+$)")
 
-    process_start = time.time()
+    process_start = time.perf_counter()
     for line in object_data_raw_rjson[object_id].split("\n"):
         if line:
             try:
@@ -655,9 +1939,9 @@ def _get_object_info(object_id: int, object_data_raw_rjson: dict[int, str] = Non
                         inside_format_section = False
                         continue
             except Exception as e:
-                print(f"Unrecognised pattern, skipping: {line}")
-    process_end = time.time()
-    # print(f"process: {process_end - process_start}")
+                LOGGER.warning(f"Unrecognised pattern, skipping: {line}")
+    metrics.REGISTRY.histogram("graph_parse_seconds", GRAPH_PARSE_DESCRIPTION, phase="object_info").observe(
+        time.perf_counter() - process_start)
 
     return pw_object
 
@@ -681,31 +1965,220 @@ def _get_object_ids(object_type: str = "All", object_data_raw_rjson: dict[int, s
     if object_type == "All":
         object_type = ""
 
-    if object_data_raw_rjson is None:  # if the object data is not given in the argument, request it from pw-cli
-        all_objects_raw = subprocess.check_output(shlex.split("/usr/bin/pw-cli list-objects"))
-        obj_ids_raw = subprocess.run(shlex.split(f"rg 'id \d+, type PipeWire:Interface:{object_type}'"),
-                                     input=all_objects_raw, stdout=subprocess.PIPE).stdout.decode("utf-8")
-        obj_ids = [int(line.split()[1][:-1]) for line in obj_ids_raw.split("\n") if line]
-    else:  # if object data is given
-        obj_ids = []
-        for obj_id, obj in object_data_raw_rjson.items():  # go through all object strings
-            lines = obj.split("\n")
-            # the second line contains the object type:
-            # for example: type: PipeWire:Interface:Node/3
-            #                                       ^~~~
-            obj_type: str = lines[2].split(":")[3].split("/")[0]
-            # print(f"{obj_id=} {obj_type=}")
-
-            if obj_type.capitalize() == object_type:  # if it is of the correct type, add it to the result list
-                obj_ids.append(obj_id)
+    if object_data_raw_rjson is None:  # if the object data is not given in the argument, request it from the backend
+        object_data_raw_rjson = _get_all_data()
+
+    obj_ids = []
+    for obj_id, obj in object_data_raw_rjson.items():  # go through all object strings
+        lines = obj.split("\n")
+        # the second line contains the object type:
+        # for example: type: PipeWire:Interface:Node/3
+        #                                       ^~~~
+        obj_type: str = lines[2].split(":")[3].split("/")[0]
+        # print(f"{obj_id=} {obj_type=}")
+
+        if object_type in ("", obj_type.capitalize()):  # if it is of the correct type, add it to the result list
+            obj_ids.append(obj_id)
 
     return obj_ids
 
 
+# the first characters of values that _parse_value() tries to convert to numbers
+_NUMBER_START_CHARS = frozenset("0123456789-+.")
+
+# matches the top level attributes of an object, for example: *	output ports: 2/65
+#                                                                ^1~~~~~~~~~~  ^2~~
+_ATTRIBUTE_MATCHER = re.compile(r"^\*?\t([^\t\n:]+): (.*)$", re.MULTILINE)
+# matches the properties of an object, for example: *		application.name = "Tauon Music Box"
+#                                                         ^1~~~~~~~~~~~~~~   ^2~~~~~~~~~~~~~~~~
+_PROPERTY_MATCHER = re.compile(r"^\*?\t\t([^\s=]+) = (.*)$", re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=1024)  # values like format.dsp = "32 bit float mono audio" repeat on every port
+def _parse_value(value: str) -> bool | int | float | str:
+    """
+    Convert a value printed by pw-cli to a native python type, like to_python_type(), but without trying to convert
+    values that cannot be numbers
+
+    :param value: the value as printed by pw-cli, with or without the surrounding '"'
+    :return: native python value of type: bool, int, float, or str
+    """
+    value = value.strip('"')
+    if value[:1] in _NUMBER_START_CHARS:  # only values starting like a number are tried as numbers
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    if value == "true":
+        return True
+    if value == "false":
+        return False
+    return value
+
+
+def _parse_pairs(pairs: [tuple[str, str]]) -> dict[str, bool | int | float | str]:
+    """
+    Convert a list of key - value pairs printed by pw-cli to a dict of native python values, plain integers and strings
+    are handled here directly, as they are the vast majority of values, the rest is left to _parse_value()
+
+    :param pairs: the matched (key, value) pairs of a section of an object
+    :return: a dict of key - native python value pairs
+    """
+    parsed = {}
+    for key, value in pairs:
+        value = value.strip('"')
+        if value.isdigit():
+            parsed[key] = int(value)
+        elif value[:1] in _NUMBER_START_CHARS or value in ("true", "false"):
+            parsed[key] = _parse_value(value)
+        else:
+            parsed[key] = value
+    return parsed
+
+
+class LazyProperties(collections.abc.Mapping):
+    """
+    The properties of an object printed by pw-cli, parsed when they are read: a property is only found and converted
+    the first time it is looked up, and every property only if they are iterated over, so the many properties nobody
+    reads (object.serial, client.id, format.dsp, ...) are never parsed
+    It keeps the whole output of pw-cli alive, so it is only meant to be kept while the objects are built from it
+    """
+    __slots__ = ("data", "start", "end", "parsed", "complete")
+
+    def __init__(self, data: str, start: int, end: int):
+        """
+        Create the properties of an object, without parsing any of them
+
+        :param data: the output of "pw-cli info all"
+        :param start: the start of the properties section of the object in data
+        :param end: the end of the properties section of the object in data
+        """
+        self.data: str = data
+        self.start: int = start
+        self.end: int = end
+        self.parsed: dict[str, bool | int | float | str] = {}  # the properties parsed so far
+        self.complete: bool = False  # whether every property is parsed
+
+    def __getitem__(self, key: str) -> bool | int | float | str:
+        if key in self.parsed or self.complete:
+            return self.parsed[key]
+        # a property is printed on its own line as: *\t\tkey = value (the * is optional), only a match at the start of
+        # a line is the key, an other one is in a value, for example: media.name = "a\t\tnode.name = b"
+        key_start = self.data.find(f"\t\t{key} = ", self.start, self.end)
+        while key_start != -1 and self.data[key_start - 1] != "\n" and self.data[key_start - 2:key_start] != "\n*":
+            key_start = self.data.find(f"\t\t{key} = ", key_start + 1, self.end)
+        if key_start == -1:
+            raise KeyError(key)
+        value_start = key_start + len(key) + 5
+        value_end = self.data.find("\n", value_start, self.end)
+        # converted like in _parse_pairs()
+        value = self.data[value_start:self.end if value_end == -1 else value_end].strip('"')
+        if value.isdigit():
+            value = int(value)
+        elif value[:1] in _NUMBER_START_CHARS or value in ("true", "false"):
+            value = _parse_value(value)
+        self.parsed[key] = value
+        return value
+
+    def _parse_all(self) -> dict[str, bool | int | float | str]:
+        """
+        Parse every property, if they are not parsed yet
+
+        :return: every property by its key
+        """
+        if not self.complete:
+            self.parsed = _parse_pairs(_PROPERTY_MATCHER.findall(self.data, self.start, self.end))
+            self.complete = True
+        return self.parsed
+
+    def __iter__(self):
+        return iter(self._parse_all())
+
+    def __len__(self) -> int:
+        return len(self._parse_all())
+
+    def __repr__(self):
+        return repr(self._parse_all())
+
+
+def _iter_objects(data: str, object_types: tuple[str, ...] | None = None,
+                  blacklisted_node_ids: set[int] | None = None):
+    """
+    Walk the output of "pw-cli info all" once, and yield each pipewire object as soon as it is read
+
+    Every object is found with a single search for the start of the next one, objects of unwanted types are skipped
+    based on their type line, and the attributes of the rest are matched in one go, while their properties are only
+    parsed when they are read (see LazyProperties)
+    Only the top level attributes and properties are parsed, any other sections such as format, params, or others are
+    ignored, just like in _get_object_info()
+
+    :param data: the output of "pw-cli info all"
+    :param object_types: the types of the objects to yield, for example: ("Node", "Port"), or None for all types
+    :param blacklisted_node_ids: if given, the blacklisted nodes (see _is_blacklisted_node()) are skipped after reading
+    only their names, their ids are added to it, and their ports are skipped after reading only their node.id
+    :return: an iterator of (object type, object info) pairs, where the object info is in the same form as the
+    result of _get_object_info()
+    """
+    start = data.find("\tid: ")
+    while start != -1:
+        next_start = data.find("\n\tid: ", start)
+        end = len(data) if next_start == -1 else next_start + 1
+        start, object_start = (-1 if next_start == -1 else next_start + 1), start
+
+        # the third line contains the object type:
+        # for example: type: PipeWire:Interface:Node/3
+        #                                       ^~~~
+        type_start = data.find("\ttype: ", object_start, end)
+        type_end = data.find("\n", type_start, end)
+        object_type = data[type_start:type_end].rsplit(":", 1)[-1].split("/")[0]
+        if object_types is not None and object_type not in object_types:
+            continue
+
+        properties_start = data.find("\tproperties:\n", object_start, end)
+        params_start = data.find("\tparams: ", object_start, end)
+        format_start = data.find("\tformat:\n", object_start, end)
+        attributes_end = min(position for position in (properties_start, params_start, format_start, end) if
+                             position != -1)
+
+        pw_object = _parse_pairs(_ATTRIBUTE_MATCHER.findall(data, object_start, attributes_end))
+        if properties_start != -1:
+            properties_end = params_start if params_start > properties_start else end
+            properties = LazyProperties(data, properties_start, properties_end)
+            if blacklisted_node_ids is not None:
+                if object_type == "Node" and _is_blacklisted_node(*_get_node_names(properties)):
+                    blacklisted_node_ids.add(pw_object["id"])
+                    continue
+                # the ports of the nodes printed before them (pipewire prints the objects in the order of their ids)
+                if object_type == "Port" and properties.get("node.id") in blacklisted_node_ids:
+                    continue
+            pw_object["properties"] = properties
+        yield object_type, pw_object
+
+
+def _parse_all_data(data: str, object_types: tuple[str, ...] | None = None,
+                    blacklisted_node_ids: set[int] | None = None) -> dict[str, dict[int, dict]]:
+    """
+    Parse the output of "pw-cli info all" in a single pass, grouping the objects by their type
+
+    :param data: the output of "pw-cli info all"
+    :param object_types: the types of the objects to parse, for example: ("Node", "Port"), or None for all types
+    :param blacklisted_node_ids: if given, the blacklisted nodes and their ports are left out, and the ids of the nodes
+    are added to it, see _iter_objects()
+    :return: a dict of object type - objects pairs, where the objects are a dict of object id - object info pairs
+    """
+    objects_by_type: dict[str, dict[int, dict]] = {object_type: {} for object_type in object_types or ()}
+    for object_type, pw_object in _iter_objects(data, object_types, blacklisted_node_ids):
+        objects_by_type.setdefault(object_type, {})[pw_object["id"]] = pw_object
+    return objects_by_type
+
+
 def _pw_link(source_port_id: int | None = None, sink_port_id: int | None = None, link_id: int | None = None,
              disconnect: bool = False) -> None:
     """
-    Create or remove a link between two ports using pw-link
+    Create or remove a link between two ports using the backend
 
     2 main ways to call this function:
         1: _pw_link(source_port_id, sink_port_id [disconnect=True])  -> the ports will be connected / disconnected
@@ -718,9 +2191,15 @@ def _pw_link(source_port_id: int | None = None, sink_port_id: int | None = None,
     :return: None
     """
     if source_port_id is not None and sink_port_id is not None and link_id is None:
-        print(f"{'Dis' if disconnect else ''}connecting ports: {source_port_id}, {sink_port_id}")
-        subprocess.run(
-            shlex.split(f"/usr/bin/pw-link {'--disconnect' if disconnect else ''} {source_port_id} {sink_port_id}"))
+        LOGGER.debug(f"{'Dis' if disconnect else ''}connecting ports: {source_port_id}, {sink_port_id}")
+        _count_link_operation("disconnect" if disconnect else "connect")
+        with metrics.REGISTRY.time("link_apply_seconds", LINK_APPLY_DESCRIPTION):
+            if disconnect:
+                BACKEND.unlink_ports(source_port_id, sink_port_id)
+            else:
+                BACKEND.link_ports(source_port_id, sink_port_id)
     elif source_port_id is None and sink_port_id is None and link_id is not None and disconnect:
-        print(f"Disconnecting link: {link_id}")
-        subprocess.run(shlex.split(f"/usr/bin/pw-link --disconnect {link_id}"))
+        LOGGER.debug(f"Disconnecting link: {link_id}")
+        _count_link_operation("remove")
+        with metrics.REGISTRY.time("link_apply_seconds", LINK_APPLY_DESCRIPTION):
+            BACKEND.remove_link(link_id)
@@ -0,0 +1,319 @@
+"""
+Multitrack recorder: records every virtual sink into its own WAV file at the same time
+
+Every track has a capture thread, which reads its virtual sink's PcmStream into a fixed pool of preallocated buffers,
+and hands the filled buffers to a single writer thread, which appends them to the track's file and gives them back to
+the pool. The memory used never grows however long the recording is: if the disk cannot keep up and a track runs out of
+free buffers, the audio captured meanwhile is dropped (and counted), instead of queueing it up, and neither the
+capture threads nor the GUI or the routing ever wait for the disk
+
+The files are 32 bit float WAV files, with the channels and the sample rate of the capture, a file that would grow past
+the 4 GiB limit of WAV files is continued in a new file: "name.wav", "name-2.wav", "name-3.wav", ...
+"""
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import time
+
+import metrics
+import pw_backend
+
+LOGGER = logging.getLogger(__name__)
+
+CHANNELS: int = len(pw_backend.LOOPBACK_CHANNELS)
+SAMPLE_RATE: int = pw_backend.CAPTURE_SAMPLE_RATE
+# the length of the audio in one buffer, in seconds, the writer writes whole buffers
+BUFFER_SECONDS: float = 0.25
+# the number of buffers of a track, how long the writer can fall behind before audio is dropped:
+# BUFFERS_PER_TRACK * BUFFER_SECONDS seconds, about 0.75 MiB per track at 48 kHz stereo
+BUFFERS_PER_TRACK: int = 8
+# the file buffer of the writer, the buffers of the tracks are written to disk in writes of about this size
+WRITE_BUFFER_SIZE: int = 1024 * 1024
+
+WAVE_FORMAT_IEEE_FLOAT: int = 3
+SAMPLE_SIZE: int = 4  # float32
+# the header of a float WAV file: the RIFF chunk, the fmt chunk (with the extension size field, required for float
+# data), the fact chunk (the number of frames, required for float data), and the header of the data chunk
+WAV_HEADER: struct.Struct = struct.Struct("<4sI4s4sIHHIIHHH4sII4sI")
+# the largest data chunk a WAV file can have, the RIFF size field is 32 bits
+MAX_WAV_DATA_SIZE: int = 0xFFFFFFFF - WAV_HEADER.size
+
+
+class WavWriter():
+    """
+    Writes float32 samples into a WAV file, continuing in a new file before reaching the size limit of WAV files
+    """
+
+    def __init__(self, path_prefix: str, channels: int, sample_rate: int):
+        """
+        Create the first file
+
+        :param path_prefix: the path of the file without ".wav", the files it is continued in are named
+        "{path_prefix}-2.wav", "{path_prefix}-3.wav", ...
+        :param channels: the number of channels
+        :param sample_rate: the sample rate
+        """
+        self.path_prefix: str = path_prefix
+        self.channels: int = channels
+        self.sample_rate: int = sample_rate
+        self.frame_size: int = channels * SAMPLE_SIZE
+        # the most data a file is filled with, a whole number of frames
+        self.max_data_size: int = MAX_WAV_DATA_SIZE - MAX_WAV_DATA_SIZE % self.frame_size
+        self.paths: [str] = []
+        self.file = None
+        self.data_size: int = 0
+        self._open_next_file()
+
+    def _open_next_file(self) -> None:
+        """
+        Finish the current file, if any, and start the next one, with a header to be filled in by _write_header()
+
+        :return: None
+        """
+        self.close()
+        path = f"{self.path_prefix}.wav" if not self.paths else f"{self.path_prefix}-{len(self.paths) + 1}.wav"
+        self.paths.append(path)
+        self.file = open(path, "wb", buffering=WRITE_BUFFER_SIZE)
+        self.data_size = 0
+        self._write_header()
+
+    def _write_header(self) -> None:
+        """
+        Write the header of the current file, with the sizes of the data written so far
+
+        :return: None
+        """
+        self.file.write(WAV_HEADER.pack(
+            b"RIFF", WAV_HEADER.size - 8 + self.data_size, b"WAVE",
+            b"fmt ", 18, WAVE_FORMAT_IEEE_FLOAT, self.channels, self.sample_rate, self.sample_rate * self.frame_size,
+            self.frame_size, SAMPLE_SIZE * 8, 0,
+            b"fact", 4, self.data_size // self.frame_size,
+            b"data", self.data_size))
+
+    def write(self, data: memoryview) -> None:
+        """
+        Append samples to the file
+
+        :param data: whole frames of interleaved float32 samples
+        :return: None
+        """
+        while len(data):
+            if self.data_size == self.max_data_size:
+                self._open_next_file()
+            chunk = data[:self.max_data_size - self.data_size]
+            self.file.write(chunk)
+            self.data_size += len(chunk)
+            data = data[len(chunk):]
+
+    def close(self) -> None:
+        """
+        Fill in the sizes in the header of the current file, and close it
+
+        :return: None
+        """
+        if self.file is None:
+            return
+        self.file.seek(0)
+        self._write_header()
+        self.file.close()
+        self.file = None
+
+
+class Track():
+    """
+    A recorded stream: its buffers, its file, and its statistics
+    """
+
+    def __init__(self, name: str, stream: pw_backend.PcmStream, path_prefix: str, channels: int, sample_rate: int):
+        """
+        Create a new track, allocating all its buffers, and its first file
+
+        :param name: the name of the track, shown in the statistics
+        :param stream: the stream to record, it is closed when the recording is stopped
+        :param path_prefix: the path of the file of the track without ".wav"
+        :param channels: the number of channels of the stream
+        :param sample_rate: the sample rate of the stream
+        """
+        self.name: str = name
+        self.stream: pw_backend.PcmStream = stream
+        self.frame_size: int = channels * SAMPLE_SIZE
+        buffer_size = round(sample_rate * BUFFER_SECONDS) * self.frame_size
+        self.free_buffers: queue.Queue[bytearray] = queue.Queue()
+        for _ in range(BUFFERS_PER_TRACK):
+            self.free_buffers.put(bytearray(buffer_size))
+        # the audio read while there are no free buffers is read into this, and dropped
+        self.discard_buffer: bytearray = bytearray(buffer_size)
+        self.writer: WavWriter = WavWriter(path_prefix, channels, sample_rate)
+        self.capture_thread: threading.Thread | None = None
+
+        self.written_frames: int = 0  # only changed by the writer thread
+        self.dropped_frames: int = 0  # only changed by the capture thread
+        self.high_water_buffers: int = 0  # the most buffers waiting to be written at once
+
+    def get_stats(self) -> dict[str, int | float]:
+        """
+        Get the statistics of the track
+
+        :return: the written and dropped frames, and the high-water mark of the buffers waiting to be written, both as
+        a number of buffers, and in seconds of audio
+        """
+        return {"written_frames": self.written_frames, "dropped_frames": self.dropped_frames,
+                "high_water_buffers": self.high_water_buffers,
+                "high_water_seconds": self.high_water_buffers * BUFFER_SECONDS}
+
+
+def get_file_name(name: str, used_names: set[str]) -> str:
+    """
+    Make a file name out of the name of a track
+
+    :param name: the name of the track
+    :param used_names: the file names of the other tracks, the new name is added to it
+    :return: the name with the characters that do not belong in file names replaced, and a number added if an other
+    track has the same name
+    """
+    file_name = base_name = re.sub(r"[^\w.-]+", "_", name).strip(".") or "track"
+    number = 1
+    while file_name in used_names:
+        number += 1
+        file_name = f"{base_name}_{number}"
+    used_names.add(file_name)
+    return file_name
+
+
+def _fill(stream: pw_backend.PcmStream, buffer: memoryview) -> int:
+    """
+    Read from a stream until a buffer is full, or the stream ends
+
+    :param stream: the stream to read from
+    :param buffer: the buffer to fill
+    :return: the number of bytes read, less than the size of the buffer if the stream ended
+    """
+    filled = 0
+    while filled < len(buffer):
+        read = stream.readinto(buffer[filled:])
+        if not read:
+            break
+        filled += read
+    return filled
+
+
+class MultitrackRecorder():
+    """
+    Records several streams at once, each into its own file
+    """
+
+    def __init__(self, directory: str, streams: [tuple[str, pw_backend.PcmStream]], channels: int = CHANNELS,
+                 sample_rate: int = SAMPLE_RATE):
+        """
+        Create the files of the tracks, and start recording
+        If the files cannot be created, the streams are closed, and the OSError is raised
+
+        :param directory: the directory the files are written to, it is created if it does not exist
+        :param streams: the (name, stream) of every track, the file of a track is named after it, see get_file_name()
+        :param channels: the number of channels of the streams
+        :param sample_rate: the sample rate of the streams
+        """
+        self.directory: str = directory
+        self.tracks: [Track] = []
+        file_names: set[str] = set()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for name, stream in streams:
+                self.tracks.append(Track(name, stream, os.path.join(directory, get_file_name(name, file_names)),
+                                         channels, sample_rate))
+        except OSError:  # the streams are not recorded, they are not needed anymore
+            for track in self.tracks:
+                track.writer.close()
+            for _, stream in streams:
+                stream.close()
+            raise
+        # the filled buffers of all tracks, in the order they were filled, None stops the writer
+        # it cannot grow larger than the buffers of all tracks together
+        self.write_queue: queue.Queue[tuple[Track, bytearray | None, int] | None] = queue.Queue()
+        self.writer_thread: threading.Thread = threading.Thread(target=self._write, daemon=True)
+        self.writer_thread.start()
+        for track in self.tracks:
+            track.capture_thread = threading.Thread(target=self._capture, args=(track,), daemon=True)
+            track.capture_thread.start()
+        self.start_time: float = time.monotonic()
+        LOGGER.info(f"Recording {len(self.tracks)} tracks into {directory}")
+
+    def _capture(self, track: Track) -> None:
+        """
+        Read the stream of a track into its free buffers, and queue them up for the writer until the stream ends, runs
+        in the capture thread of the track
+
+        :param track: the track to capture
+        :return: None
+        """
+        dropped_frames_counter = metrics.REGISTRY.counter("recorder_dropped_frames_total",
+                                                          "Captured frames dropped as the writer was behind")
+        while True:
+            try:
+                buffer = track.free_buffers.get_nowait()
+            except queue.Empty:  # the writer is behind, the stream is still read, so the sound server is not blocked
+                read = _fill(track.stream, memoryview(track.discard_buffer))
+                track.dropped_frames += read // track.frame_size
+                dropped_frames_counter.inc(read // track.frame_size)
+                if read < len(track.discard_buffer):
+                    break
+                continue
+            read = _fill(track.stream, memoryview(buffer))
+            track.high_water_buffers = max(track.high_water_buffers,
+                                           BUFFERS_PER_TRACK - track.free_buffers.qsize())
+            if read:
+                self.write_queue.put((track, buffer, read - read % track.frame_size))
+            else:
+                track.free_buffers.put(buffer)
+            if read < len(buffer):
+                break
+        self.write_queue.put((track, None, 0))  # the track ended, its file can be finished
+
+    def _write(self) -> None:
+        """
+        Write the filled buffers into the files of their tracks until stop() is called, runs in the writer thread
+
+        :return: None
+        """
+        written_bytes_counter = metrics.REGISTRY.counter("recorder_written_bytes_total", "Bytes of audio recorded")
+        while (item := self.write_queue.get()) is not None:
+            track, buffer, length = item
+            if buffer is None:
+                track.writer.close()
+                continue
+            with metrics.REGISTRY.time("recorder_write_seconds", "Time to write one buffer of a track"):
+                track.writer.write(memoryview(buffer)[:length])
+            track.written_frames += length // track.frame_size
+            written_bytes_counter.inc(length)
+            track.free_buffers.put(buffer)
+
+    def get_stats(self) -> dict[str, dict[str, int | float]]:
+        """
+        Get the statistics of every track
+
+        :return: the statistics of the tracks by their names, see Track.get_stats()
+        """
+        return {track.name: track.get_stats() for track in self.tracks}
+
+    def stop(self) -> dict[str, dict[str, int | float]]:
+        """
+        Stop recording: close the streams, write what was captured, and finish the files
+
+        :return: the statistics of the tracks, see get_stats()
+        """
+        for track in self.tracks:
+            track.stream.close()
+        for track in self.tracks:
+            track.capture_thread.join()
+        self.write_queue.put(None)
+        self.writer_thread.join()
+
+        stats = self.get_stats()
+        LOGGER.info(f"Recorded {time.monotonic() - self.start_time:.1f}s into {self.directory}")
+        for name, track_stats in stats.items():
+            LOGGER.info(f"{name}: {track_stats['written_frames']} frames written, {track_stats['dropped_frames']} "
+                        f"dropped, at most {track_stats['high_water_seconds']:.2f}s waiting to be written")
+        return stats
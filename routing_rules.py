@@ -0,0 +1,343 @@
+"""
+Sticky routing rules: persistent rules that connect nodes to a virtual sink (or a virtual sink to nodes) as soon as the
+matching nodes appear in the graph, so an app that recreates its node (for example when a new track starts) is routed
+again right away
+
+A rule matches nodes on their "node.name", "application.name", and "media.name" properties, every condition is either
+an exact string, or a regex, which has to match the whole value:
+    {"application.name": "Firefox", "media.name": {"regex": "YouTube.*"}}
+"""
+import logging
+import re
+import time
+
+import pw_interface
+
+LOGGER = logging.getLogger(__name__)
+
+# the node properties rules can match on, and the Node attributes storing them
+MATCHABLE_PROPERTIES = {"node.name": "node_name", "application.name": "app_name", "media.name": "media_name"}
+# the flags of a regex without inline flags, the regexes with other flags are not combined by the RuleMatcher
+DEFAULT_REGEX_FLAGS = re.compile("").flags
+
+
+def parse_conditions(conditions: dict[str, str | dict[str, str]]) -> tuple[dict[str, str], dict[str, re.Pattern]]:
+    """
+    Check and split the conditions of a rule into exact and regex conditions
+
+    :param conditions: the node properties and the values they must have: a string, or {"regex": pattern}
+    :return: the (exact conditions, compiled regex conditions) of the rule
+    """
+    if not isinstance(conditions, dict) or not conditions:
+        raise ValueError("the conditions must be a non-empty object of node properties")
+    unknown_properties = set(conditions) - set(MATCHABLE_PROPERTIES)
+    if unknown_properties:
+        raise ValueError(f"unknown properties: {sorted(unknown_properties)}, "
+                         f"must be one of: {sorted(MATCHABLE_PROPERTIES)}")
+
+    exact_conditions: dict[str, str] = {}
+    regex_conditions: dict[str, re.Pattern] = {}
+    for node_property, value in conditions.items():
+        if isinstance(value, str):
+            exact_conditions[node_property] = value
+        elif isinstance(value, dict) and set(value) == {"regex"} and isinstance(value["regex"], str):
+            try:
+                regex_conditions[node_property] = re.compile(value["regex"])
+            except re.error as error:
+                raise ValueError(f"invalid regex for {node_property}: {error}")
+        else:
+            raise ValueError(f"the value of {node_property} must be a string or {{\"regex\": \"...\"}}")
+    return exact_conditions, regex_conditions
+
+
+def _get_node_value(node: pw_interface.Node, node_property: str) -> str:
+    """
+    Get a matchable property of a node as a string
+
+    :param node: the node
+    :param node_property: one of the MATCHABLE_PROPERTIES
+    :return: the value of the property
+    """
+    return str(getattr(node, MATCHABLE_PROPERTIES[node_property]))
+
+
+class RoutingRule():
+    """
+    A rule connecting every matching source node to a virtual sink (sink_node_id), or the output of a virtual sink
+    (source_node_id) to every matching sink node
+    """
+
+    def __init__(self, conditions: dict[str, str | dict[str, str]], sink_node_id: int | None = None,
+                 source_node_id: int | None = None):
+        """
+        Create a new rule, exactly one of sink_node_id and source_node_id has to be given
+
+        :param conditions: the node properties and the values they must have, see parse_conditions()
+        :param sink_node_id: the node the matching source nodes are connected to
+        :param source_node_id: the node that is connected to the matching sink nodes
+        """
+        if (sink_node_id is None) == (source_node_id is None):
+            raise ValueError("exactly one of sink_node_id and source_node_id must be given")
+        self.conditions: dict[str, str | dict[str, str]] = conditions
+        self.exact_conditions, self.regex_conditions = parse_conditions(conditions)
+        self.sink_node_id: int | None = sink_node_id
+        self.source_node_id: int | None = source_node_id
+
+    def matches(self, node: pw_interface.Node) -> bool:
+        """
+        Determine if a node matches all conditions of this rule
+
+        :param node: the node to be checked
+        :return: True if the node matches
+        """
+        return all(_get_node_value(node, node_property) == value for node_property, value in
+                   self.exact_conditions.items()) and all(
+            pattern.fullmatch(_get_node_value(node, node_property)) for node_property, pattern in
+            self.regex_conditions.items())
+
+
+class RuleMatcher():
+    """
+    All rules compiled into a single matcher, so checking a node does not go through every rule
+
+    Every rule is filed under one of its conditions: rules with an exact condition are found with a dict lookup of
+    the node's value, and the regexes of the other rules are combined into one regex per property, so the regex rules
+    are only checked one by one if the combined regex matches
+    The combined regex is only a prefilter, the rules are always checked with their own regexes. Regexes with groups
+    (their backreferences and group names would clash in the combined regex) or global inline flags (which are only
+    allowed at the start of a regex) are not combined, their rules are checked for every node
+    """
+
+    def __init__(self, rules: [RoutingRule]):
+        """
+        Compile the rules
+
+        :param rules: the rules to be matched
+        """
+        self.rules: [RoutingRule] = list(rules)
+        self.exact_index: dict[tuple[str, str], list[RoutingRule]] = {}
+        self.unfiltered_rules: [RoutingRule] = []  # the rules whose regexes cannot be combined
+        regex_rules: dict[str, list[RoutingRule]] = {}
+        for rule in self.rules:
+            if rule.exact_conditions:
+                self.exact_index.setdefault(next(iter(rule.exact_conditions.items())), []).append(rule)
+                continue
+            node_property, pattern = next(iter(rule.regex_conditions.items()))
+            if pattern.groups == 0 and pattern.flags == DEFAULT_REGEX_FLAGS:
+                regex_rules.setdefault(node_property, []).append(rule)
+            else:
+                self.unfiltered_rules.append(rule)
+
+        self.regex_prefilters: [tuple[str, re.Pattern, list[RoutingRule]]] = []
+        for node_property, property_rules in regex_rules.items():
+            try:
+                prefilter = re.compile("|".join(f"(?:{rule.regex_conditions[node_property].pattern})" for rule in
+                                                property_rules))
+            except re.error as error:  # the regexes are valid one by one, so they are still checked that way
+                LOGGER.warning(f"Could not combine the regexes of the rules for {node_property}: {error}")
+                self.unfiltered_rules.extend(property_rules)
+                continue
+            self.regex_prefilters.append((node_property, prefilter, property_rules))
+
+    def match(self, node: pw_interface.Node) -> [RoutingRule]:
+        """
+        Find the rules matching a node
+
+        :param node: the node to be checked
+        :return: the list of matching rules
+        """
+        candidates: [RoutingRule] = list(self.unfiltered_rules)
+        for node_property in MATCHABLE_PROPERTIES:
+            candidates.extend(self.exact_index.get((node_property, _get_node_value(node, node_property)), ()))
+        for node_property, prefilter, property_rules in self.regex_prefilters:
+            if prefilter.fullmatch(_get_node_value(node, node_property)):
+                candidates.extend(property_rules)
+        return [rule for rule in candidates if rule.matches(node)]
+
+
+class StickyRouter():
+    """
+    Applies routing rules to the graph stored by a NodeManager: every time a node appears, or gets new ports, it is
+    connected according to the matching rules: the links are requested in the same update that brought the change, and
+    applied by the NodeManager's LinkWorker
+
+    The nodes the rules connect to (the virtual sinks) are never matched themselves, so the rules cannot feed the
+    virtual sinks into each other
+    """
+
+    # how long to wait for a requested link to show up in the graph before requesting it again, in seconds
+    link_retry_interval: float = 2.0
+
+    def __init__(self, node_manager: pw_interface.NodeManager):
+        """
+        Create a new StickyRouter without any rules, and start listening to the changes of the graph
+
+        :param node_manager: the NodeManager storing the graph
+        """
+        self.node_manager: pw_interface.NodeManager = node_manager
+        self.rules: [RoutingRule] = []
+        self.matcher: RuleMatcher = RuleMatcher([])
+        self.rule_node_ids: set[int] = set()  # the nodes the rules connect to
+        self.ignored_node_ids: set[int] = set()  # other nodes that are never matched, for example other virtual sinks
+        # the (source port id, sink port id) pairs which were linked, and when, so they are not requested again while
+        # the links are on their way
+        self.requested_port_pairs: dict[tuple[int, int], float] = {}
+        self.node_manager.add_listener(self.on_nodes_changed)
+
+    def _compile(self) -> None:
+        """
+        Compile the rules again after they changed
+
+        :return: None
+        """
+        self.matcher = RuleMatcher(self.rules)
+        self.rule_node_ids = {rule.sink_node_id for rule in self.rules if rule.sink_node_id is not None} | {
+            rule.source_node_id for rule in self.rules if rule.source_node_id is not None}
+
+    def add_rule(self, rule: RoutingRule) -> None:
+        """
+        Add a rule, and connect the nodes already matching it
+
+        :param rule: the rule to be added
+        :return: None
+        """
+        with self.node_manager.lock:
+            self.rules.append(rule)
+            self._compile()
+            self.apply_all()
+
+    def remove_rule(self, rule: RoutingRule) -> None:
+        """
+        Remove a rule, the links it made are kept
+
+        :param rule: the rule to be removed
+        :return: None
+        """
+        with self.node_manager.lock:
+            if rule in self.rules:
+                self.rules.remove(rule)
+                self._compile()
+
+    def add_ignored_nodes(self, node_ids: [int]) -> None:
+        """
+        Never match the given nodes, for example the nodes of the virtual sinks
+
+        :param node_ids: the ids of the nodes
+        :return: None
+        """
+        with self.node_manager.lock:
+            self.ignored_node_ids.update(node_ids)
+
+    def remove_ignored_nodes(self, node_ids: [int]) -> None:
+        """
+        Undo add_ignored_nodes()
+
+        :param node_ids: the ids of the nodes
+        :return: None
+        """
+        with self.node_manager.lock:
+            self.ignored_node_ids.difference_update(node_ids)
+
+    def add_requested_port_pairs(self, port_pairs: [tuple[int, int]]) -> None:
+        """
+        Note links that were requested elsewhere, so the rules do not request them again while they are on their way
+
+        :param port_pairs: the (source port id, sink port id) pairs of the requested links
+        :return: None
+        """
+        with self.node_manager.lock:
+            now = time.monotonic()
+            for port_pair in port_pairs:
+                self.requested_port_pairs[port_pair] = now
+
+    def close(self) -> None:
+        """
+        Stop listening to the changes of the graph
+
+        :return: None
+        """
+        self.node_manager.remove_listener(self.on_nodes_changed)
+
+    def apply_all(self) -> None:
+        """
+        Connect every node of the graph according to the rules, also creating the links that were removed
+
+        :return: None
+        """
+        with self.node_manager.lock:
+            self.on_nodes_changed(self.node_manager, list(self.node_manager.nodes))
+
+    def on_nodes_changed(self, node_manager: pw_interface.NodeManager, node_ids: [int]) -> None:
+        """
+        Connect the added or changed nodes according to the matching rules
+        Called by the NodeManager after an update, the links are found while holding its lock, and applied by its
+        LinkWorker, so nothing waits for the sound server
+        Nothing is done while the graph is provisional, the NodeManager reports every node once it is reconciled with
+        the live graph
+
+        :param node_manager: the NodeManager storing the graph
+        :param node_ids: the ids of the added or changed nodes
+        :return: None
+        """
+        transaction = pw_interface.LinkTransaction(node_manager)
+        with node_manager.lock:
+            if not self.rules or node_manager.is_provisional():
+                return
+            for node_id in node_ids:
+                node = node_manager.nodes.get(node_id)
+                if node is None or node_id in self.rule_node_ids or node_id in self.ignored_node_ids:
+                    continue
+                for rule in self.matcher.match(node):
+                    if rule.sink_node_id is not None and node.is_source():
+                        self._ensure_connected(node, node_manager.nodes.get(rule.sink_node_id), transaction)
+                    elif rule.source_node_id is not None and node.is_sink():
+                        self._ensure_connected(node_manager.nodes.get(rule.source_node_id), node, transaction)
+
+            # forget the requests of ports that are gone
+            for port_pair in [port_pair for port_pair in self.requested_port_pairs if
+                              port_pair[0] not in node_manager.ports or port_pair[1] not in node_manager.ports]:
+                del self.requested_port_pairs[port_pair]
+        transaction.submit()
+
+    def _ensure_connected(self, source_node: pw_interface.Node | None, sink_node: pw_interface.Node | None,
+                          transaction: pw_interface.LinkTransaction) -> None:
+        """
+        Link the ports of two nodes which are not linked yet, unless their links were just requested, and remove the
+        links between them that do not belong to the current pairing of their ports, for example the mono link made
+        while only the first port of a stereo node was there
+
+        :param source_node: the node the links go from
+        :param sink_node: the node the links go to
+        :param transaction: the LinkTransaction the links are added to
+        :return: None
+        """
+        if source_node is None or sink_node is None:
+            return
+        now = time.monotonic()
+        desired_port_pairs = []  # the linked pairs, and the missing ones that were not requested just now
+        for source_port, sink_port in pw_interface.pair_ports(source_node, sink_node):
+            port_pair = (source_port.id, sink_port.id)
+            if self.node_manager.get_link_id(*port_pair) is not None:
+                self.requested_port_pairs.pop(port_pair, None)
+                desired_port_pairs.append((source_port, sink_port))
+            elif now - self.requested_port_pairs.get(port_pair, -self.link_retry_interval) >= self.link_retry_interval:
+                desired_port_pairs.append((source_port, sink_port))
+        created_port_pairs = pw_interface.reconcile_links(self.node_manager, desired_port_pairs, {sink_node.id},
+                                                          {source_node.id}, transaction)
+        if created_port_pairs:
+            LOGGER.debug(f"connected node {source_node.id} {source_node.get_readable_name()} to {sink_node.id} "
+                         f"{sink_node.get_readable_name()}")
+        for port_pair in created_port_pairs:
+            self.requested_port_pairs[port_pair] = now
+
+    def get_matching_nodes(self, rule: RoutingRule, nodes: dict[int, pw_interface.Node]) -> [pw_interface.Node]:
+        """
+        Find the nodes a rule applies to
+
+        :param rule: the rule
+        :param nodes: the nodes to search in, for example the nodes of a GraphSnapshot
+        :return: the matching nodes
+        """
+        return [node for node in nodes.values() if node.id not in self.rule_node_ids and
+                node.id not in self.ignored_node_ids and rule.matches(node) and (
+            node.is_source() if rule.sink_node_id is not None else node.is_sink())]
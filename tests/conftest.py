@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# pw_interface loads config.json from the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import pw_backend
+import pw_interface
+
+
+@pytest.fixture
+def backend() -> pw_backend.SimulatedBackend:
+    """
+    A simulated graph used by pw_interface instead of the sound server, for the duration of a test
+    """
+    previous_backend = pw_interface.BACKEND
+    simulated_backend = pw_backend.SimulatedBackend()
+    pw_interface.set_backend(simulated_backend)
+    yield simulated_backend
+    pw_interface.set_backend(previous_backend)
+    simulated_backend.close()
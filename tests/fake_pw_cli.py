@@ -0,0 +1,53 @@
+"""
+A stand-in for an interactive pw-cli session, started by the ControlSession tests instead of /usr/bin/pw-cli
+
+Like the real one it answers unknown commands right away, but applies create-link and destroy a little later, the way
+the server does, and only then prints their errors: the ports below 100 exist, and so do the links it created
+"""
+import sys
+import threading
+
+APPLY_DELAY = 0.05
+
+output_lock = threading.Lock()
+links: dict[int, tuple[int, int]] = {}  # the (output port id, input port id) of the links by their ids
+link_ids = iter(range(1000, 2000))
+
+
+def write(line: str) -> None:
+    with output_lock:
+        sys.stdout.write(f"{line}\n")
+        sys.stdout.flush()
+
+
+def create_link(output_port_id: int, input_port_id: int) -> None:
+    if output_port_id >= 100 or input_port_id >= 100:
+        write("remote error: id:2 seq:12 res:-2 (No such file or directory): unknown port")
+    else:
+        links[next(link_ids)] = (output_port_id, input_port_id)
+
+
+def destroy(object_id: int) -> None:
+    if links.pop(object_id, None) is None:
+        write(f"remote error: id:0 seq:13 res:-2 (No such file or directory): unknown object {object_id}")
+
+
+def list_links() -> None:
+    for link_id, (output_port_id, input_port_id) in list(links.items()):
+        write(f"\tid {link_id}, type PipeWire:Interface:Link/3")
+        write(f'\t\tlink.output.port = "{output_port_id}"')
+        write(f'\t\tlink.input.port = "{input_port_id}"')
+
+
+for line in sys.stdin:
+    words = line.split()
+    if not words:
+        continue
+    if words[0] == "create-link":
+        threading.Timer(APPLY_DELAY, create_link, (int(words[2]), int(words[4]))).start()
+    elif words[0] == "destroy":
+        threading.Timer(APPLY_DELAY, destroy, (int(words[1]),)).start()
+    elif words[:2] == ["list-objects", "Link"]:
+        list_links()
+    else:
+        write(f'Error: "Command \\"{words[0]}\\" does not exist. Type \'help\' for usage."')
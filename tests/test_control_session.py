@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import pw_backend
+
+FAKE_PW_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_pw_cli.py")
+
+
+@pytest.fixture
+def subprocess_backend(monkeypatch) -> pw_backend.SubprocessBackend:
+    """
+    A SubprocessBackend whose control session is a fake pw-cli, which applies the link changes a little later
+    """
+    monkeypatch.setattr(pw_backend.ControlSession, "command", [sys.executable, FAKE_PW_CLI])
+    subprocess_backend = pw_backend.SubprocessBackend()
+    yield subprocess_backend
+    subprocess_backend.close()
+
+
+def _listed_links(subprocess_backend: pw_backend.SubprocessBackend) -> dict[tuple[int, int], int]:
+    return pw_backend._parse_link_list(subprocess_backend.get_control_session().query(["list-objects Link"]))
+
+
+def test_link_operations_are_applied_when_they_return(subprocess_backend):
+    subprocess_backend.apply_link_operations([pw_backend.LinkOperation("connect", 1, 10, 2, 20),
+                                              pw_backend.LinkOperation("connect", 1, 11, 2, 21)])
+    link_ids = _listed_links(subprocess_backend)
+    assert link_ids.keys() == {(10, 20), (11, 21)}
+
+    subprocess_backend.apply_link_operations([pw_backend.LinkOperation("remove", link_id=link_ids[(10, 20)]),
+                                              pw_backend.LinkOperation("disconnect", 1, 11, 2, 21)])
+    assert not _listed_links(subprocess_backend)
+
+
+def test_errors_printed_after_the_batch_are_reported_by_the_batch(subprocess_backend):
+    with pytest.raises(RuntimeError, match="unknown port"):
+        subprocess_backend.apply_link_operations([pw_backend.LinkOperation("connect", 1, 10, 2, 150)])
+    # the next batch is not blamed for the error
+    subprocess_backend.apply_link_operations([pw_backend.LinkOperation("connect", 1, 10, 2, 20)])
+    assert _listed_links(subprocess_backend).keys() == {(10, 20)}
+
+
+def test_a_single_control_session_is_started_for_all_threads(subprocess_backend, monkeypatch):
+    started_sessions = []
+
+    class SlowControlSession(pw_backend.ControlSession):
+        def __init__(self):
+            time.sleep(0.05)  # gives the other threads the time to find no session either
+            super().__init__()
+            started_sessions.append(self)
+
+    monkeypatch.setattr(pw_backend, "ControlSession", SlowControlSession)
+    barrier = threading.Barrier(4)
+    sessions = []
+
+    def get_control_session() -> None:
+        barrier.wait()
+        sessions.append(subprocess_backend.get_control_session())
+
+    threads = [threading.Thread(target=get_control_session) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(started_sessions) == 1
+    assert all(session is started_sessions[0] for session in sessions)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pw_backend
+import pw_interface
+
+
+def _wait_for_node(node_manager: pw_interface.NodeManager, node_id: int, present: bool = True) -> None:
+    deadline = time.monotonic() + 2.0
+    while True:
+        seen_generation = node_manager.graph_monitor.generation
+        node_manager.update()
+        if (node_id in node_manager.nodes) == present:
+            return
+        assert node_manager.graph_monitor.wait_for_batches(seen_generation, deadline - time.monotonic())
+
+
+def test_update_applies_the_changes(backend):
+    node_manager = pw_interface.NodeManager()
+    node_id = backend.add_app_stream("Test App")
+    _wait_for_node(node_manager, node_id)
+    assert len(node_manager.nodes[node_id].output_ports) == 2
+    version = node_manager.version
+
+    backend.remove_object(node_id)
+    _wait_for_node(node_manager, node_id, present=False)
+    assert node_manager.version > version
+    node_manager.close()
+
+
+def test_update_without_changes_is_a_hit(backend):
+    node_manager = pw_interface.NodeManager()
+    node_manager.update()
+    hits, version = node_manager.update_stats.hits, node_manager.version
+    node_manager.update()
+    assert node_manager.update_stats.hits == hits + 1
+    assert node_manager.version == version
+    node_manager.close()
+
+
+def test_wait_for_batches_sees_batches_taken_by_an_other_thread(backend):
+    node_manager = pw_interface.NodeManager()
+    graph_monitor = node_manager.graph_monitor
+    seen_generation = graph_monitor.generation
+    node_id = backend.add_app_stream("Test App")
+    _wait_for_node(node_manager, node_id)  # the batch is taken and applied before the wait starts
+    assert graph_monitor.get_pending_batches() == []
+
+    wait_start = time.monotonic()
+    assert graph_monitor.wait_for_batches(seen_generation, 5.0)
+    assert time.monotonic() - wait_start < 0.5
+    node_manager.close()
+
+
+def test_wait_for_batches_times_out(backend):
+    node_manager = pw_interface.NodeManager()
+    graph_monitor = node_manager.graph_monitor
+    assert not graph_monitor.wait_for_batches(graph_monitor.generation, 0.05)
+    node_manager.close()
+
+
+def test_virtual_sinks_are_found_while_an_other_thread_applies_the_batches():
+    previous_backend = pw_interface.BACKEND
+    backend = pw_backend.SimulatedBackend(loopback_delay=0.05)
+    pw_interface.set_backend(backend)
+    node_manager = pw_interface.NodeManager()
+    stop_event = threading.Event()
+
+    def refresh() -> None:  # what the GraphRefresher of the GUI does
+        while not stop_event.is_set():
+            seen_generation = node_manager.graph_monitor.generation
+            node_manager.update()
+            node_manager.graph_monitor.wait_for_batches(seen_generation, 0.1)
+
+    refresher_thread = threading.Thread(target=refresh)
+    refresher_thread.start()
+    try:
+        virtual_sink_manager = pw_interface.VirtualSinkManager()
+        for _ in range(5):  # the refresher does not take the batches first every time
+            wait_start = time.monotonic()
+            (virtual_sink, loopback_nodes), = virtual_sink_manager.create_virtual_sinks(1, node_manager, timeout=2.0)
+            assert time.monotonic() - wait_start < 1.0
+            assert loopback_nodes[0].media_name == virtual_sink.name
+        virtual_sink_manager.terminate_all()
+    finally:
+        stop_event.set()
+        refresher_thread.join()
+        node_manager.close()
+        pw_interface.set_backend(previous_backend)
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+import pw_interface
+
+
+def _update_until(node_manager: pw_interface.NodeManager, condition) -> None:
+    deadline = time.monotonic() + 2.0
+    while True:
+        seen_generation = node_manager.graph_monitor.generation
+        node_manager.update()
+        if condition():
+            return
+        assert node_manager.graph_monitor.wait_for_batches(seen_generation, deadline - time.monotonic())
+
+
+def test_snapshots_do_not_change_with_the_ports(backend):
+    node_manager = pw_interface.NodeManager()
+    node_id = backend.add_app_stream("Test App")
+    _update_until(node_manager, lambda: node_id in node_manager.nodes)
+    snapshot = node_manager.snapshot()
+    snapshot_node = snapshot.nodes[node_id]
+    removed_port_id, kept_port_id = sorted(snapshot_node.output_ports)
+
+    backend.remove_object(removed_port_id)
+    _update_until(node_manager, lambda: removed_port_id not in node_manager.ports)
+    assert set(snapshot_node.output_ports) == {removed_port_id, kept_port_id}
+    assert set(node_manager.snapshot().nodes[node_id].output_ports) == {kept_port_id}
+
+    backend.add_object("Port", {"direction": "output", "props": {
+        "port.name": "output_FC", "port.alias": "Test App:output_FC", "node.id": node_id, "audio.channel": "FC"}})
+    _update_until(node_manager, lambda: len(node_manager.nodes[node_id].output_ports) == 2)
+    assert set(snapshot_node.output_ports) == {removed_port_id, kept_port_id}
+    node_manager.close()
+
+
+def test_unchanged_nodes_are_shared_between_snapshots(backend):
+    node_manager = pw_interface.NodeManager()
+    snapshot = node_manager.snapshot()
+    node_id = backend.add_app_stream("Test App")
+    _update_until(node_manager, lambda: node_id in node_manager.nodes)
+    new_snapshot = node_manager.snapshot()
+
+    assert new_snapshot.version > snapshot.version
+    assert node_id not in snapshot.nodes
+    for unchanged_node_id, node in snapshot.nodes.items():
+        assert new_snapshot.nodes[unchanged_node_id] is node
+    node_manager.close()
+
+
+def test_full_update_gives_every_node_its_ports(backend):
+    node_ids = backend.populate(10)
+    node_manager = pw_interface.NodeManager(monitor=False)
+    for node_id in node_ids:
+        assert len(node_manager.nodes[node_id].output_ports) == 2
+    assert len(node_manager.nodes[backend.default_sink_node_id].input_ports) == 2
+
+
+def test_properties_are_not_found_inside_the_values_of_other_properties(backend):
+    # the value of application.name, printed before node.name, looks like the line of an other property
+    node_id = backend.add_node({"application.name": "Test App\t\tnode.name = Spoofed", "node.name": "test_app",
+                                "media.name": "AudioStream", "media.class": "Stream/Output/Audio"},
+                               output_channels=("FL", "FR"))
+    node_manager = pw_interface.NodeManager(monitor=False)
+    assert node_manager.nodes[node_id].node_name == "test_app"
+
+    data = '*\tproperties:\n*\t\tmedia.name = "a\t\tnode.name = b"\n\t\tnode.name = "c"\n'
+    properties = pw_interface.LazyProperties(data, 0, len(data))
+    assert properties["node.name"] == "c"
+    assert properties["media.name"] == "a\t\tnode.name = b"
+    with pytest.raises(KeyError):
+        properties["application.name"]
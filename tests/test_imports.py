@@ -0,0 +1,48 @@
+import ast
+import importlib
+import os
+
+import pytest
+
+from conftest import ROOT_DIR
+
+MODULES = sorted(file_name[:-3] for file_name in os.listdir(ROOT_DIR) if file_name.endswith(".py"))
+QT_MODULES = ("main", "widgets")
+
+
+def _annotations(tree: ast.AST):
+    """
+    Find the annotations of the arguments, return values and variables, they are evaluated when the module is imported
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            arguments = node.args
+            for argument in arguments.posonlyargs + arguments.args + arguments.kwonlyargs:
+                if argument.annotation is not None:
+                    yield argument.annotation
+            if node.returns is not None:
+                yield node.returns
+        elif isinstance(node, ast.AnnAssign):
+            yield node.annotation
+
+
+@pytest.mark.parametrize("module_name", [name for name in MODULES if name not in QT_MODULES])
+def test_import(module_name: str):
+    importlib.import_module(module_name)
+
+
+def test_import_widgets():
+    pytest.importorskip("PyQt6")
+    importlib.import_module("widgets")
+
+
+@pytest.mark.parametrize("module_name", MODULES)
+def test_no_list_literal_unions(module_name: str):
+    # "[int] | None" raises a TypeError on import, the modules using PyQt6 are checked even when it is not installed
+    with open(os.path.join(ROOT_DIR, f"{module_name}.py")) as source_file:
+        tree = ast.parse(source_file.read())
+    for annotation in _annotations(tree):
+        for node in ast.walk(annotation):
+            if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+                assert not isinstance(node.left, ast.List) and not isinstance(node.right, ast.List), \
+                    f"{module_name}.py:{node.lineno}: use list[...] in unions"
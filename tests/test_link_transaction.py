@@ -0,0 +1,122 @@
+import pw_backend
+import pw_interface
+
+
+def _linked_port_pairs(backend: pw_backend.SimulatedBackend) -> set[tuple[int, int]]:
+    return set(backend.link_ids_by_port_pair)
+
+
+def _app_and_sink(backend: pw_backend.SimulatedBackend,
+                  node_manager: pw_interface.NodeManager) -> tuple[pw_interface.Node, pw_interface.Node]:
+    app_node_id = backend.add_app_stream("Test App")
+    node_manager.full_update()
+    return node_manager.nodes[app_node_id], node_manager.nodes[backend.default_sink_node_id]
+
+
+def test_operations_are_applied_in_one_batch_on_commit(backend, monkeypatch):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node, sink_node = _app_and_sink(backend, node_manager)
+    batches = []
+    apply_link_operations = backend.apply_link_operations
+    monkeypatch.setattr(backend, "apply_link_operations",
+                        lambda operations: batches.append(operations) or apply_link_operations(operations))
+
+    with pw_interface.LinkTransaction(node_manager) as transaction:
+        assert pw_interface.connect_nodes(app_node, sink_node, transaction=transaction)
+        assert not _linked_port_pairs(backend)  # nothing is applied before the commit
+
+    assert len(batches) == 1
+    assert [operation.action for operation in batches[0]] == ["connect", "connect"]
+    assert _linked_port_pairs(backend) == {(source_port.id, sink_port.id) for source_port, sink_port in
+                                           pw_interface.pair_ports(app_node, sink_node)}
+
+
+def test_nothing_is_applied_when_the_block_fails(backend):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node, sink_node = _app_and_sink(backend, node_manager)
+    try:
+        with pw_interface.LinkTransaction(node_manager) as transaction:
+            pw_interface.connect_nodes(app_node, sink_node, transaction=transaction)
+            raise KeyError("failed")
+    except KeyError:
+        pass
+    assert not _linked_port_pairs(backend)
+
+
+def test_disconnect_removes_the_links_by_id(backend):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node, sink_node = _app_and_sink(backend, node_manager)
+    pw_interface.connect_nodes(app_node, sink_node)
+    node_manager.full_update()
+
+    transaction = pw_interface.LinkTransaction(node_manager)
+    pw_interface.disconnect_nodes(app_node, sink_node, transaction=transaction)
+    assert {operation.action for operation in transaction.operations} == {"remove"}
+    assert {operation.link_id for operation in transaction.operations} == set(node_manager.links)
+    assert transaction.commit()
+    assert not _linked_port_pairs(backend)
+
+
+def test_disconnect_skips_the_ports_that_are_not_linked(backend):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node, sink_node = _app_and_sink(backend, node_manager)
+    transaction = pw_interface.LinkTransaction(node_manager)
+    pw_interface.disconnect_nodes(app_node, sink_node, transaction=transaction)
+    assert not transaction.operations
+
+
+def test_disconnect_without_node_manager(backend):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node, sink_node = _app_and_sink(backend, node_manager)
+    pw_interface.connect_nodes(app_node, sink_node)
+    transaction = pw_interface.LinkTransaction()
+    pw_interface.disconnect_nodes(app_node, sink_node, transaction=transaction)
+    assert {operation.action for operation in transaction.operations} == {"disconnect"}
+    assert transaction.commit()
+    assert not _linked_port_pairs(backend)
+
+
+def test_commit_reports_failure(backend, monkeypatch):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node, sink_node = _app_and_sink(backend, node_manager)
+
+    def fail(operations):
+        raise RuntimeError("pw-cli failed to apply 2 commands")
+
+    monkeypatch.setattr(backend, "apply_link_operations", fail)
+    transaction = pw_interface.LinkTransaction(node_manager)
+    pw_interface.connect_nodes(app_node, sink_node, transaction=transaction)
+    assert not transaction.commit()
+    assert not transaction.operations
+
+
+def test_reconcile_links_keeps_the_links_that_are_already_there(backend):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node, sink_node = _app_and_sink(backend, node_manager)
+    other_app_node_id = backend.add_app_stream("Other App")
+    pw_interface.connect_nodes(app_node, sink_node)
+    node_manager.full_update()
+    kept_link_ids = set(node_manager.links)
+
+    desired_port_pairs = pw_interface.pair_ports(app_node, sink_node) + \
+        pw_interface.pair_ports(node_manager.nodes[other_app_node_id], sink_node)
+    created_port_pairs = pw_interface.reconcile_links(node_manager, desired_port_pairs, {sink_node.id})
+    node_manager.full_update()
+
+    assert len(created_port_pairs) == 2
+    assert kept_link_ids < set(node_manager.links)
+    assert _linked_port_pairs(backend) == {(source_port.id, sink_port.id) for source_port, sink_port in
+                                           desired_port_pairs}
+
+
+def test_parse_link_list():
+    lines = ["\tid 84, type PipeWire:Interface:Port/3",
+             '\t\tport.id = "0"',
+             "\tid 85, type PipeWire:Interface:Link/3",
+             '\t\tobject.serial = "1034"',
+             '\t\tlink.output.port = "57"',
+             '\t\tlink.input.port = "80"',
+             "\tid 86, type PipeWire:Interface:Link/3",
+             '\t\tlink.input.port = "81"',
+             '\t\tlink.output.port = "58"']
+    assert pw_backend._parse_link_list(lines) == {(57, 80): 85, (58, 81): 86}
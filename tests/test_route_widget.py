@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+import pw_interface
+
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+
+@pytest.fixture
+def route_widget(backend):
+    application = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    import widgets
+    node_manager = pw_interface.NodeManager(monitor=False)
+    virtual_sink_manager = pw_interface.VirtualSinkManager()
+    virtual_sink, = virtual_sink_manager.create_virtual_sinks(1, node_manager, timeout=2.0)
+    route_widget = widgets.RouteWidget(None, virtual_sink_manager, node_manager, None, widgets.ComboBoxPortIndex(),
+                                       virtual_sink)
+    yield route_widget
+    virtual_sink_manager.terminate_all()
+    node_manager.close()
+    application.processEvents()
+
+
+def test_comboboxes_follow_the_added_and_removed_frames(route_widget):
+    route_widget.add_app_output_combobox()
+    assert len(route_widget.app_comboboxes) == len(route_widget.app_output_comboboxes) == 2
+    first_cb = route_widget.app_comboboxes[0]
+    route_widget.remove_app_output_combobox(route_widget.app_output_comboboxes[1])
+    assert route_widget.app_comboboxes == [first_cb]
+    assert route_widget.get_comboboxes() == [first_cb, route_widget.targetSinkComboBox]
+
+
+def test_remove_emits_removed(route_widget):
+    removed_route_widgets = []
+    route_widget.removed.connect(removed_route_widgets.append)
+    route_widget.remove()
+    assert removed_route_widgets == [route_widget]
+
+
+def test_set_app_node_does_not_wait_for_the_links_being_applied(backend, route_widget, monkeypatch):
+    node_manager = route_widget.node_manager
+    app_node_id = backend.add_app_stream("Test App")
+    node_manager.full_update()
+    node_manager.snapshot()
+    applying = threading.Event()
+    release = threading.Event()
+    apply_link_operations = backend.apply_link_operations
+
+    def slow_apply_link_operations(operations):  # a sound server that takes its time
+        applying.set()
+        release.wait(5.0)
+        apply_link_operations(operations)
+
+    monkeypatch.setattr(backend, "apply_link_operations", slow_apply_link_operations)
+    cb = route_widget.app_comboboxes[0]
+    try:
+        select_start = time.monotonic()
+        cb.set_connection(app_node_id)
+        assert applying.wait(2.0)
+        cb.set_app_node(node_manager.nodes[app_node_id])
+        assert time.monotonic() - select_start < 1.0
+    finally:
+        release.set()
+    assert node_manager.link_worker.wait_until_idle(2.0)
+    assert {port_pair[0] for port_pair in backend.link_ids_by_port_pair} >= \
+        set(node_manager.nodes[app_node_id].output_ports)
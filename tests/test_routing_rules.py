@@ -0,0 +1,116 @@
+import itertools
+import re
+import threading
+import time
+
+import pytest
+
+import pw_interface
+import routing_rules
+
+NODE_NAMES = [("Firefox", "AudioStream"), ("firefox", "YouTube - Video"), ("yy", "yy"), ("Spotify", "Spotify"),
+              ("mpv", "song.flac"), ("ab", "ab"), ("PipeWire ALSA [game]", "ALSA Playback")]
+
+RULE_CONDITIONS = [
+    {"application.name": "Firefox"},
+    {"application.name": {"regex": "Fire.*"}},
+    {"application.name": {"regex": "(?i)firefox"}},  # a global inline flag, only allowed at the start of a regex
+    {"application.name": {"regex": "(y)\\1"}},  # a backreference, renumbered in a combined regex
+    {"application.name": {"regex": "(?P<name>a)b"}},  # named groups, two of them cannot be in the same regex
+    {"media.name": {"regex": "(?P<name>y)y"}},
+    {"media.name": {"regex": "(?P<name>Y)ouTube.*"}},
+    {"media.name": {"regex": "(?i:spotify)"}},  # a scoped inline flag, which can be combined
+    {"media.name": {"regex": ".*\\.flac"}},
+    {"node.name": {"regex": "PipeWire ALSA \\[.*\\]"}, "media.name": "ALSA Playback"},
+    {"node.name": "mpv", "media.name": {"regex": "song\\..*"}},
+]
+
+
+def _node(node_id: int, app_name: str, media_name: str) -> pw_interface.Node:
+    return pw_interface.Node({"id": node_id, "properties": {"node.name": app_name, "application.name": app_name,
+                                                            "media.name": media_name}})
+
+
+@pytest.mark.parametrize("rule_count", range(1, len(RULE_CONDITIONS) + 1))
+def test_matcher_finds_the_same_rules_as_checking_every_rule(rule_count: int):
+    for rule_conditions in itertools.combinations(RULE_CONDITIONS, rule_count):
+        rules = [routing_rules.RoutingRule(conditions, sink_node_id=1000) for conditions in rule_conditions]
+        matcher = routing_rules.RuleMatcher(rules)
+        for node_id, (app_name, media_name) in enumerate(NODE_NAMES):
+            node = _node(node_id, app_name, media_name)
+            matched_rules = matcher.match(node)
+            assert len(matched_rules) == len(set(map(id, matched_rules)))
+            assert sorted(map(id, matched_rules)) == sorted(id(rule) for rule in rules if rule.matches(node))
+
+
+def test_regexes_with_groups_or_flags_are_not_combined():
+    rules = [routing_rules.RoutingRule(conditions, sink_node_id=1000) for conditions in RULE_CONDITIONS]
+    matcher = routing_rules.RuleMatcher(rules)
+    assert [rule.conditions for rule in matcher.unfiltered_rules] == RULE_CONDITIONS[2:7]
+
+
+def test_rules_are_checked_one_by_one_when_the_regexes_cannot_be_combined(monkeypatch):
+    rules = [routing_rules.RoutingRule({"application.name": {"regex": pattern}}, sink_node_id=1000) for pattern in
+             ("Fire.*", "Spot.*")]
+
+    def fail(pattern: str):
+        raise re.error("cannot be combined", pattern)
+
+    monkeypatch.setattr(re, "compile", fail)  # the rules are already compiled
+    matcher = routing_rules.RuleMatcher(rules)
+    assert matcher.unfiltered_rules == rules
+    assert matcher.match(_node(1, "Firefox", "AudioStream")) == rules[:1]
+
+
+@pytest.mark.parametrize("conditions", [
+    {"application.name": {"regex": "Fire(fox"}},
+    {"media.name": {"regex": "a**"}},
+    {"application.name": {"regex": "\\1"}},
+    {"window.title": "Firefox"},
+    {"application.name": {"regex": 42}},
+    {},
+])
+def test_invalid_conditions_raise_value_error(conditions: dict):
+    with pytest.raises(ValueError):
+        routing_rules.parse_conditions(conditions)
+
+
+def test_sticky_router_does_not_hold_the_lock_while_the_links_are_applied(backend, monkeypatch):
+    node_manager = pw_interface.NodeManager(monitor=False)
+    app_node_id = backend.add_app_stream("Test App")
+    node_manager.full_update()
+    applying = threading.Event()
+    release = threading.Event()
+    apply_link_operations = backend.apply_link_operations
+
+    def slow_apply_link_operations(operations):  # a sound server that takes its time
+        applying.set()
+        release.wait(5.0)
+        apply_link_operations(operations)
+
+    monkeypatch.setattr(backend, "apply_link_operations", slow_apply_link_operations)
+    sticky_router = routing_rules.StickyRouter(node_manager)
+    try:
+        add_start = time.monotonic()
+        sticky_router.add_rule(routing_rules.RoutingRule({"application.name": "Test App"},
+                                                         sink_node_id=backend.default_sink_node_id))
+        assert applying.wait(2.0)
+        assert time.monotonic() - add_start < 1.0
+        lock_acquired = []
+
+        def read_graph() -> None:  # what the GUI thread does, it must not wait for the links being applied
+            if node_manager.lock.acquire(timeout=1.0):
+                lock_acquired.append(True)
+                node_manager.lock.release()
+
+        reader_thread = threading.Thread(target=read_graph)
+        reader_thread.start()
+        reader_thread.join()
+        assert lock_acquired == [True]
+    finally:
+        release.set()
+    assert node_manager.link_worker.wait_until_idle(2.0)
+    assert {port_pair[0] for port_pair in backend.link_ids_by_port_pair} == \
+        set(node_manager.nodes[app_node_id].output_ports)
+    sticky_router.close()
+    node_manager.close()
@@ -0,0 +1,112 @@
+import array
+import threading
+
+import pw_backend
+import pw_interface
+
+CHANNELS = 2
+SAMPLE_RATE = 48000
+FRAME_SIZE = CHANNELS * 4
+
+
+class CountingPcmStream(pw_backend.PcmStream):
+    """
+    A stream whose every frame holds its own number in all of its channels, given out in reads of uneven size, so the
+    order and the alignment of the frames can be checked
+    """
+
+    def __init__(self, frame_count: int):
+        self.data: bytes = array.array("f", (frame for frame in range(frame_count) for _ in range(CHANNELS))).tobytes()
+        self.position: int = 0
+        self.closed: threading.Event = threading.Event()
+        self.pace: threading.Semaphore | None = None  # if set, every read takes one from it
+
+    def readinto(self, buffer: memoryview) -> int:
+        if self.pace is not None:
+            self.pace.acquire()
+        if self.closed.is_set():
+            return 0
+        count = min(len(buffer), 1001, len(self.data) - self.position)  # never a whole number of frames
+        buffer[:count] = self.data[self.position:self.position + count]
+        self.position += count
+        if not count:  # the end of the data, the stream stays open like parec does
+            self.closed.wait()
+        return count
+
+    def close(self) -> None:
+        self.closed.set()
+        if self.pace is not None:
+            self.pace.release()
+
+
+def _read_frames(stream: pw_backend.PcmStream, frame_count: int) -> [int]:
+    data = bytearray(frame_count * FRAME_SIZE)
+    filled = 0
+    while filled < len(data):
+        read = stream.readinto(memoryview(data)[filled:])
+        assert read
+        filled += read
+    samples = array.array("f", data)
+    assert samples[0::CHANNELS] == samples[1::CHANNELS]
+    return [int(sample) for sample in samples[0::CHANNELS]]
+
+
+def test_readers_share_a_single_source(backend, monkeypatch):
+    opened_streams = []
+    monkeypatch.setattr(backend, "capture_loopback",
+                        lambda loopback, channels, sample_rate: opened_streams.append(CountingPcmStream(10000)) or
+                        opened_streams[-1])
+    virtual_sink = pw_interface.VirtualSink()
+    first_stream = virtual_sink.capture(CHANNELS, SAMPLE_RATE)
+    second_stream = virtual_sink.capture(CHANNELS, SAMPLE_RATE)
+    assert len(opened_streams) == 1
+
+    assert _read_frames(first_stream, 5000) == list(range(5000))
+    assert _read_frames(second_stream, 5000) == list(range(5000))
+
+    first_stream.close()
+    assert not opened_streams[0].closed.is_set()  # the other reader still reads it
+    assert _read_frames(second_stream, 100) == list(range(5000, 5100))
+    second_stream.close()
+    assert opened_streams[0].closed.is_set()
+
+    third_stream = virtual_sink.capture(CHANNELS, SAMPLE_RATE)  # a new source is opened after the last one closed
+    assert len(opened_streams) == 2
+    assert _read_frames(third_stream, 10) == list(range(10))
+    third_stream.close()
+    virtual_sink._remove()
+
+
+def test_a_reader_falling_behind_does_not_hold_up_the_others():
+    source = CountingPcmStream(100000)
+    source.pace = threading.Semaphore(4)  # the source only runs ahead of the reading reader by a few reads
+    shared_capture = pw_backend.SharedCapture(lambda: source, CHANNELS, SAMPLE_RATE)
+    shared_capture.max_buffered_bytes = 1000 * FRAME_SIZE
+    stalled_stream = shared_capture.open()
+    reading_stream = shared_capture.open()
+    assert _read_frames(stalled_stream, 10) == list(range(10))  # the stalled reader stops in the middle of a chunk
+
+    data = bytearray(100000 * FRAME_SIZE)
+    filled = 0
+    while filled < len(data):
+        filled += reading_stream.readinto(memoryview(data)[filled:])
+        source.pace.release()
+    samples = array.array("f", data)
+    assert [int(sample) for sample in samples[0::CHANNELS]] == list(range(100000))
+
+    assert stalled_stream.buffered_bytes <= shared_capture.max_buffered_bytes + shared_capture.read_size
+    frames = _read_frames(stalled_stream, stalled_stream.buffered_bytes // FRAME_SIZE)
+    assert frames == sorted(frames) and frames[-1] == 99999  # only whole frames were dropped, the newest are kept
+    stalled_stream.close()
+    reading_stream.close()
+    assert source.closed.is_set()
+
+
+def test_readers_end_with_the_source():
+    source = CountingPcmStream(100)
+    shared_capture = pw_backend.SharedCapture(lambda: source, CHANNELS, SAMPLE_RATE)
+    stream = shared_capture.open()
+    assert _read_frames(stream, 100) == list(range(100))
+    source.closed.set()  # for example parec was stopped
+    assert stream.readinto(memoryview(bytearray(FRAME_SIZE))) == 0
+    stream.close()
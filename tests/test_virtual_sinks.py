@@ -0,0 +1,29 @@
+import itertools
+
+import pw_backend
+import pw_interface
+
+
+def test_the_virtual_sinks_of_an_other_instance_are_not_found(backend):
+    # an other instance of the app, or a crashed earlier run, numbered its virtual sinks the same way
+    other_loopback = backend.create_loopback(f"{pw_backend.LOOPBACK_NAME_PREFIX}-0123abcd-1")
+    node_manager = pw_interface.NodeManager(monitor=False)
+    virtual_sink_manager = pw_interface.VirtualSinkManager()
+    (virtual_sink, loopback_nodes), = virtual_sink_manager.create_virtual_sinks(1, node_manager, timeout=2.0)
+    assert pw_backend.INSTANCE_TOKEN in virtual_sink.name
+    assert not {node.id for node in loopback_nodes} & set(other_loopback.node_ids)
+    virtual_sink_manager.terminate_all()
+    node_manager.close()
+
+
+def test_the_names_of_the_nodes_in_the_graph_are_not_used(backend, monkeypatch):
+    monkeypatch.setattr(pw_backend, "_loopback_numbers", itertools.count(1))
+    taken_name = f"{pw_backend.LOOPBACK_NAME_PREFIX}-{pw_backend.INSTANCE_TOKEN}-1"
+    backend.add_node({"node.name": taken_name, "media.class": "Audio/Sink"}, input_channels=("FL", "FR"))
+    node_manager = pw_interface.NodeManager(monitor=False)
+    virtual_sink_manager = pw_interface.VirtualSinkManager()
+    (virtual_sink, loopback_nodes), = virtual_sink_manager.create_virtual_sinks(1, node_manager, timeout=2.0)
+    assert virtual_sink.name == f"{pw_backend.LOOPBACK_NAME_PREFIX}-{pw_backend.INSTANCE_TOKEN}-2"
+    assert loopback_nodes[0].node_name == virtual_sink.name
+    virtual_sink_manager.terminate_all()
+    node_manager.close()
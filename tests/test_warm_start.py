@@ -0,0 +1,146 @@
+import json
+import zlib
+
+import pytest
+
+import graph_cache
+import pw_interface
+import routing_rules
+
+
+def _cached_objects(backend, tmp_path) -> dict[str, dict[int, dict]]:
+    """
+    Save the current graph of the backend with graph_cache, and load it back, like an earlier run would have
+    """
+    node_manager = pw_interface.NodeManager(monitor=False)
+    cache_path = str(tmp_path / "warm_start.cache")
+    graph_cache.save(cache_path, node_manager, [])
+    objects_by_type, routes = graph_cache.load(cache_path)
+    return objects_by_type
+
+
+def _warm_started_node_manager(objects_by_type: dict[str, dict[int, dict]]) -> pw_interface.NodeManager:
+    node_manager = pw_interface.NodeManager(initial_update=False)
+    node_manager.warm_start(objects_by_type)
+    assert node_manager.snapshot().from_cache
+    node_manager.update()  # applies the first batch of the graph monitor, which is the whole live graph
+    assert not node_manager.snapshot().from_cache
+    return node_manager
+
+
+def test_gone_objects_are_removed_and_unchanged_ones_kept(backend, tmp_path):
+    kept_node_id, removed_node_id = backend.populate(2, linked=True)
+    objects_by_type = _cached_objects(backend, tmp_path)
+    removed_port_ids = backend.get_port_ids(removed_node_id)
+    backend.remove_object(removed_node_id)  # the ports and the links of the node are removed with it
+
+    node_manager = _warm_started_node_manager(objects_by_type)
+    assert removed_node_id not in node_manager.nodes
+    assert not set(removed_port_ids) & set(node_manager.ports)
+    assert kept_node_id in node_manager.nodes
+    assert set(node_manager.links) == set(backend.get_objects("Link"))
+    node_manager.close()
+
+
+def test_ids_reused_by_an_other_type_are_stale(backend, tmp_path):
+    app_node_id, = backend.populate(1, linked=True)
+    link_id = next(iter(backend.get_objects("Link")))
+    objects_by_type = _cached_objects(backend, tmp_path)
+    # an earlier run saw a node with the id the live graph gives to a link, and a port of it
+    del objects_by_type["Link"][link_id]
+    objects_by_type["Node"][link_id] = {"id": link_id, "properties": {
+        "node.name": "Gone App", "application.name": "Gone App", "media.name": "Gone Stream"}}
+    objects_by_type["Port"][app_node_id] = {"id": app_node_id, "direction": "output", "properties": {
+        "port.name": "output_MONO", "port.alias": "Gone App:output_MONO", "node.id": link_id,
+        "audio.channel": "MONO"}}
+
+    node_manager = _warm_started_node_manager(objects_by_type)
+    assert link_id not in node_manager.nodes
+    assert link_id in node_manager.links
+    assert app_node_id not in node_manager.ports
+    assert app_node_id in node_manager.nodes
+    assert len(node_manager.nodes[app_node_id].output_ports) == 2
+    assert node_manager.nodes.keys() == set(backend.get_objects("Node"))
+    assert node_manager.ports.keys() == set(backend.get_objects("Port"))
+    node_manager.close()
+
+
+def test_no_links_are_made_until_the_live_graph_is_loaded(backend, tmp_path):
+    app_node_id, = backend.populate(1)
+    sink_node_id = backend.add_node({"node.name": "Test Sink", "media.class": "Audio/Sink"},
+                                    input_channels=("FL", "FR"))
+    objects_by_type = _cached_objects(backend, tmp_path)
+    node_manager = pw_interface.NodeManager(initial_update=False)
+    node_manager.warm_start(objects_by_type)
+    sticky_router = routing_rules.StickyRouter(node_manager)
+    sticky_router.add_rule(routing_rules.RoutingRule({"application.name": "Simulated App 0"},
+                                                     sink_node_id=sink_node_id))
+    assert node_manager.link_worker.wait_until_idle(2.0)
+    assert not backend.get_objects("Link")
+    transaction = pw_interface.LinkTransaction(node_manager)
+    pw_interface.connect_nodes(node_manager.nodes[app_node_id], node_manager.nodes[backend.default_sink_node_id],
+                               transaction=transaction)
+
+    # the reconciled graph is reported to the sticky router, whose rule had no nodes to connect so far, but the ids
+    # of the transaction made from the cached graph are still not trusted
+    node_manager.update()
+    assert not transaction.commit()
+    assert node_manager.link_worker.wait_until_idle(2.0)
+    assert set(backend.link_ids_by_port_pair) == set(zip(backend.get_port_ids(app_node_id, "output"),
+                                                         backend.get_port_ids(sink_node_id, "input")))
+    sticky_router.close()
+    node_manager.close()
+
+
+def _write_cache_file(path, payload: bytes) -> None:
+    with open(path, "wb") as cache_file:
+        cache_file.write(graph_cache.HEADER.pack(graph_cache.MAGIC, graph_cache.FORMAT_VERSION, len(payload),
+                                                 zlib.crc32(payload)))
+        cache_file.write(payload)
+
+
+def test_routes_are_loaded_back(backend, tmp_path):
+    backend.populate(2, linked=True)
+    routes = [{"name": "sink", "inputs": [{"application.name": "Test App"}], "output": None, "volume": 0.5,
+               "mute": False}]
+    cache_path = str(tmp_path / "warm_start.cache")
+    graph_cache.save(cache_path, pw_interface.NodeManager(monitor=False), routes)
+    assert graph_cache.load(cache_path)[1] == routes
+
+
+@pytest.mark.parametrize("damage", ["truncated", "changed byte", "empty"])
+def test_damaged_files_are_ignored(backend, tmp_path, damage: str):
+    backend.populate(2, linked=True)
+    cache_path = tmp_path / "warm_start.cache"
+    graph_cache.save(str(cache_path), pw_interface.NodeManager(monitor=False), [])
+    data = cache_path.read_bytes()
+    if damage == "truncated":
+        data = data[:-10]
+    elif damage == "changed byte":
+        data = data[:-10] + bytes([data[-10] ^ 1]) + data[-9:]
+    else:
+        data = b""
+    cache_path.write_bytes(data)
+    assert graph_cache.load(str(cache_path)) is None
+
+
+@pytest.mark.parametrize("data", [
+    [],
+    {"nodes": [[1, "a", "b"]], "ports": [], "links": [], "routes": []},
+    {"nodes": [["1", "a", "b", "c"]], "ports": [], "links": [], "routes": []},
+    {"nodes": [], "ports": [[1, "a", "b", True, "output", None]], "links": [], "routes": []},
+    {"nodes": [], "ports": [], "links": [[1, 2, 3, 4, {}]], "routes": []},
+    {"nodes": [], "ports": [], "links": [], "routes": [{"volume": "loud"}]},
+    {"nodes": [], "ports": [], "links": [], "routes": [{"inputs": {"application.name": "Firefox"}}]},
+    {"nodes": [], "ports": [], "links": [], "routes": None},
+])
+def test_files_with_a_valid_checksum_but_unexpected_data_are_ignored(tmp_path, data):
+    cache_path = tmp_path / "warm_start.cache"
+    _write_cache_file(cache_path, json.dumps(data).encode("utf-8"))
+    assert graph_cache.load(str(cache_path)) is None
+
+
+def test_deeply_nested_data_is_ignored(tmp_path):
+    cache_path = tmp_path / "warm_start.cache"
+    _write_cache_file(cache_path, b"[" * 100000 + b"]" * 100000)
+    assert graph_cache.load(str(cache_path)) is None
@@ -1,8 +1,72 @@
+import bisect
+import importlib.util
+import logging
+import os
+import time
+
 from PyQt6 import uic, QtCore
 from PyQt6.QtCore import QProcess
-from PyQt6.QtWidgets import QMainWindow, QComboBox, QWidget, QHBoxLayout, QFrame, QPushButton, QDialog
+from PyQt6.QtGui import QColor, QPainter
+from PyQt6.QtWidgets import QMainWindow, QComboBox, QWidget, QHBoxLayout, QFrame, QPushButton, QDialog, QCompleter
 
+import graph_cache
+import level_meter
 import pw_interface
+import recorder
+import routing_rules
+
+LOGGER = logging.getLogger(__name__)
+
+# the python code compiled from the .ui files is kept here, so the xml is only parsed again when a .ui file changes
+UI_CACHE_DIR = os.path.join("ui", "compiled")
+_UI_CLASSES: dict[str, type] = {}  # the compiled ui classes already imported, by .ui file path
+
+
+def _get_ui_class(ui_path: str) -> type:
+    """
+    Get the class compiled from a .ui file, compiling it into UI_CACHE_DIR if it was not compiled yet, or the .ui file
+    changed since then
+
+    :param ui_path: the path of the .ui file
+    :return: the Ui_... class with the setupUi() method
+    """
+    if ui_path in _UI_CLASSES:
+        return _UI_CLASSES[ui_path]
+
+    module_name = os.path.splitext(os.path.basename(ui_path))[0]
+    module_path = os.path.join(UI_CACHE_DIR, f"{module_name}.py")
+    if not os.path.exists(module_path) or os.path.getmtime(module_path) < os.path.getmtime(ui_path):
+        os.makedirs(UI_CACHE_DIR, exist_ok=True)
+        with open(f"{module_path}.tmp", "w") as module_file:
+            uic.compileUi(ui_path, module_file)
+        os.replace(f"{module_path}.tmp", module_path)  # never leave a half written module behind
+
+    spec = importlib.util.spec_from_file_location(f"compiled_ui_{module_name}", module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _UI_CLASSES[ui_path] = next(value for name, value in vars(module).items() if name.startswith("Ui_"))
+    return _UI_CLASSES[ui_path]
+
+
+def load_ui(ui_path: str, widget: QWidget) -> None:
+    """
+    Build the ui of a .ui file made using QT Designer on a widget, the same way uic.loadUi() does, but using the python
+    code compiled from the .ui file, see _get_ui_class()
+
+    :param ui_path: the path of the .ui file
+    :param widget: the widget the ui is built on, the named child widgets become its attributes
+    :return: None
+    """
+    try:
+        ui_class = _get_ui_class(ui_path)
+    except OSError as ose:  # for example the ui folder is not writable
+        LOGGER.warning(f"Could not compile {ui_path}, loading it directly: {ose}")
+        uic.loadUi(ui_path, widget)
+        return
+    ui = ui_class()
+    ui.setupUi(widget)
+    for name, value in vars(ui).items():
+        setattr(widget, name, value)
 
 
 class NoPipeWireWarningDialog(QDialog):
@@ -13,37 +77,245 @@ class NoPipeWireWarningDialog(QDialog):
 
     def __init__(self):
         super().__init__()
-        uic.loadUi("ui/NoPipewireDialog.ui", self)
+        load_ui("ui/NoPipewireDialog.ui", self)
         self.setWindowTitle("Pipewire not found")
 
 
+class ComboBoxPortIndex():
+    """
+    Maps the ids of the ports of the selected nodes to the comboboxes they are selected in, so a removed port is
+    dispatched straight to its comboboxes, without going through every RouteWidget and ComboBox
+    """
+
+    def __init__(self):
+        """
+        Create a new, empty index
+        """
+        self.comboboxes_by_port_id: dict[int, set[ComboBox]] = {}
+        self.port_ids_by_combobox: dict[ComboBox, [int]] = {}
+
+    def set_port_ids(self, cb: "ComboBox", port_ids: [int]) -> None:
+        """
+        Replace the ports indexed for a combobox
+
+        :param cb: the ComboBox
+        :param port_ids: the ids of the ports of its selected node, empty if nothing is selected
+        :return: None
+        """
+        for port_id in self.port_ids_by_combobox.pop(cb, ()):
+            comboboxes = self.comboboxes_by_port_id.get(port_id)
+            if comboboxes is not None:
+                comboboxes.discard(cb)
+                if not comboboxes:
+                    del self.comboboxes_by_port_id[port_id]
+        if port_ids:
+            self.port_ids_by_combobox[cb] = list(port_ids)
+            for port_id in port_ids:
+                self.comboboxes_by_port_id.setdefault(port_id, set()).add(cb)
+
+    def get_comboboxes(self, port_id: int) -> set["ComboBox"]:
+        """
+        Get the comboboxes whose selected node has a port
+
+        :param port_id: the id of the port
+        :return: the set of comboboxes
+        """
+        return self.comboboxes_by_port_id.get(port_id, set())
+
+
+class GraphRefresher(QtCore.QThread):
+    """
+    Keeps the NodeManager up to date on a background thread, so the GUI thread never has to wait for pipewire
+    Every time the graph changes, the new GraphSnapshot is sent to the GUI thread with the snapshotReady signal
+    """
+
+    # emitted with the new GraphSnapshot, every time the graph changes
+    snapshotReady = QtCore.pyqtSignal(object, name="snapshotReady")
+
+    def __init__(self, node_manager: pw_interface.NodeManager, refresh_interval: float = 1.0):
+        """
+        Create a new GraphRefresher, it has to be started using start()
+
+        :param node_manager: the NodeManager instance to keep up to date
+        :param refresh_interval: the time between two updates in seconds, when the graph monitor is not running (with
+        the graph monitor the updates happen as soon as a change arrives)
+        """
+        super().__init__()
+        self.node_manager: pw_interface.NodeManager = node_manager
+        self.refresh_interval: float = refresh_interval
+
+    def run(self) -> None:
+        """
+        The body of the background thread: update the graph, send the new snapshot if it changed, then wait for the
+        next change
+
+        :return: None
+        """
+        last_version: int | None = None
+        while not self.isInterruptionRequested():
+            graph_monitor = self.node_manager.graph_monitor
+            seen_generation = graph_monitor.generation if graph_monitor is not None else 0
+            try:
+                self.node_manager.update()
+            except OSError as ose:  # for example the pipewire tools are not installed
+                LOGGER.warning(f"Could not update the graph: {ose}")
+                self.msleep(int(self.refresh_interval * 1000))
+                continue
+            snapshot = self.node_manager.snapshot()
+            if snapshot.version != last_version:
+                last_version = snapshot.version
+                self.snapshotReady.emit(snapshot)
+
+            if graph_monitor is not None and graph_monitor.is_running():
+                graph_monitor.wait_for_batches(seen_generation, self.refresh_interval)
+            else:
+                self.msleep(int(self.refresh_interval * 1000))
+
+    def stop(self) -> None:
+        """
+        Stop the background thread, and wait for it to finish
+
+        :return: None
+        """
+        self.requestInterruption()
+        self.wait()
+
+
+class VirtualSinkCreator(QtCore.QThread):
+    """
+    Creates virtual sinks, and waits for their nodes to appear in the graph on a background thread, so the GUI thread
+    is not blocked while pipewire creates the loopback devices
+    """
+
+    # emitted with the VirtualSinkCreator, and the list of (VirtualSink, (sink node, source node, output node))
+    virtualSinksReady = QtCore.pyqtSignal(object, list, name="virtualSinksReady")
+    # emitted with the VirtualSinkCreator, and the error message, when the nodes did not appear in time
+    creationFailed = QtCore.pyqtSignal(object, str, name="creationFailed")
+
+    def __init__(self, virtual_sink_manager: pw_interface.VirtualSinkManager, node_manager: pw_interface.NodeManager,
+                 count: int, routes: list[dict] | None = None):
+        """
+        Create a new VirtualSinkCreator, it has to be started using start()
+
+        :param virtual_sink_manager: the VirtualSinkManager creating the virtual sinks
+        :param node_manager: the NodeManager in which the nodes of the virtual sinks are waited for
+        :param count: the number of virtual sinks to create
+        :param routes: the saved routes restored into the RouteWidgets of the new virtual sinks, one for each of them,
+        if None, the RouteWidgets start empty
+        """
+        super().__init__()
+        self.virtual_sink_manager: pw_interface.VirtualSinkManager = virtual_sink_manager
+        self.node_manager: pw_interface.NodeManager = node_manager
+        self.count: int = count
+        self.routes: list[dict] | None = routes
+
+    def run(self) -> None:
+        """
+        The body of the background thread: create the virtual sinks together, and wait for all of their nodes
+
+        :return: None
+        """
+        try:
+            self.virtualSinksReady.emit(self, self.virtual_sink_manager.create_virtual_sinks(self.count,
+                                                                                             self.node_manager))
+        except RuntimeError as error:  # the virtual sinks did not appear in time
+            self.creationFailed.emit(self, str(error))
+
+
 class MainWindow(QMainWindow):
     """
     MainWindow: The main window where all the other widgets are displayed in
     """
 
+    # how long to collect removed ports before handling them, in milliseconds
+    removed_ports_delay_ms: int = 20
+    # how often the graph and the routes are saved for the next start, in milliseconds
+    warm_start_save_interval_ms: int = 30000
+    # how often the level meters are redrawn, in milliseconds, the levels are computed over the audio in between
+    level_meter_interval_ms: int = 50
+
     def __init__(self, virtual_sink_manager: pw_interface.VirtualSinkManager = None,
-                 node_manager: pw_interface.NodeManager = None):
+                 node_manager: pw_interface.NodeManager = None, startup_start: float | None = None,
+                 saved_routes: list[dict] | None = None, warm_start_file: str | None = None):
         """
         Crates a new Mainwindow
+        The window can be shown before the graph is loaded: the graph is loaded by the GraphRefresher in the
+        background, and routes can be added once it arrived
 
         :param virtual_sink_manager: the VirtualSinkManager instance that will manage the virtual loopback devices
         :param node_manager: the NodeManager instance that will handle listing, connecting and disconnecting all the
         right nodes
+        :param startup_start: the time.perf_counter() of the start of the app, the time of the first paint and the time
+        the window becomes usable are measured from it, if None, from the creation of the window
+        :param saved_routes: the routes saved by an earlier run, they are restored when the live graph arrives
+        :param warm_start_file: the file the graph and the routes are saved to for the next start (see graph_cache.py),
+        if None, they are not saved
         """
         super().__init__()
-        uic.loadUi("ui/MainWindow.ui", self)  # Load the "ui/MainWindow.ui" file, which was made using QT Designer
+        load_ui("ui/MainWindow.ui", self)  # Load the "ui/MainWindow.ui" file, which was made using QT Designer
 
         self.setWindowTitle("Simple App Audio Router")
+        self.startup_start: float = startup_start if startup_start is not None else time.perf_counter()
+        # the seconds from startup_start to the first paint ("first_paint") and to the first live graph ("interactive")
+        self.startup_times: dict[str, float] = {}
         self.routerWidgets: [RouteWidget] = []  # Store all the routeWidgets that are displayed
+        # the threads creating the virtual sinks of the RouteWidgets that are being added
+        self.virtual_sink_creators: [VirtualSinkCreator] = []
 
         self.virtual_sink_manager = virtual_sink_manager
         self.node_manager = node_manager
-
-        # the button that adds one more routeWidget ot the window
+        # reconnects the selected apps to their virtual sinks when their nodes are recreated
+        self.sticky_router = routing_rules.StickyRouter(self.node_manager)
+        # the comboboxes of the selected nodes' ports, used to reset the comboboxes whose node is removed
+        self.port_index = ComboBoxPortIndex()
+        # the nodes listed by the comboboxes, shared by all of them, and updated incrementally from the snapshots
+        self.node_list_models: dict[str, NodeListModel] = {direction: NodeListModel(direction, self)
+                                                           for direction in ("Source", "Sink")}
+
+        # the button that adds one more routeWidget ot the window, it is enabled when the live graph is loaded, the graph
+        # saved by the last run is only shown
         self.addMoreOutputsButton.clicked.connect(self.add_router_widget)
-
-        print("starting monitor process...")
+        self.addMoreOutputsButton.setEnabled(False)
+        # the button that records every virtual sink into its own file while it is checked
+        self.recorder: recorder.MultitrackRecorder | None = None
+        self.recordButton.toggled.connect(self.set_recording)
+
+        # the saved routes wait for the live graph, as their virtual sinks have to be created in it
+        self.saved_routes: list[dict] | None = saved_routes or None
+        self.warm_start_file: str | None = warm_start_file
+        self.warm_start_save_timer = QtCore.QTimer(self)
+        self.warm_start_save_timer.setInterval(self.warm_start_save_interval_ms)
+        self.warm_start_save_timer.timeout.connect(self.save_warm_start)
+        if self.warm_start_file is not None:
+            self.warm_start_save_timer.start()
+        if self.node_manager.latest_snapshot is not None:  # the graph saved by the last run can be shown already
+            self.on_snapshot_ready(self.node_manager.latest_snapshot)
+
+        # keep the graph up to date in the background, the comboboxes only ever read the latest snapshot
+        self.graph_refresher = GraphRefresher(self.node_manager)
+        self.graph_refresher.snapshotReady.connect(self.on_snapshot_ready)
+        self.graph_refresher.start()
+
+        # the removed ports are collected, and handled together a little later, so when an app removes all its ports
+        # at once, each of its comboboxes is only reset once
+        self.removed_port_ids: set[int] = set()
+        self.removed_ports_timer = QtCore.QTimer(self)
+        self.removed_ports_timer.setSingleShot(True)
+        self.removed_ports_timer.setInterval(self.removed_ports_delay_ms)
+        self.removed_ports_timer.timeout.connect(self.handle_removed_ports)
+
+        # a single timer updates the level meters of every RouteWidget
+        self.level_meter_timer = QtCore.QTimer(self)
+        self.level_meter_timer.setInterval(self.level_meter_interval_ms)
+        self.level_meter_timer.timeout.connect(self.update_level_meters)
+        if pw_interface.LEVEL_METERS:
+            if level_meter.is_available():
+                self.level_meter_timer.start()
+            else:
+                LOGGER.info("NumPy is not installed, the level meters are not shown")
+
+        LOGGER.debug("starting monitor process...")
+        self.monitor_proc_buffer: str = ""  # the last, unfinished line of the monitor process' output
         self.monitor_proc = QProcess()
         self.monitor_proc.readyReadStandardOutput.connect(self.monitor_proc_stdout)
         self.monitor_proc.start("/usr/bin/pw-link", ["--output", "--monitor", "--id"])
@@ -51,13 +323,220 @@ class MainWindow(QMainWindow):
     def add_router_widget(self) -> None:
         """
         Add a new RouteWidget instance to the self.routeWidgets list, and add it to the mainWindow's output_list
-        widget to be displayed
+        widget to be displayed, once its virtual sink is created
+
+        :return: None
+        """
+        self.add_router_widgets(1)
+
+    def add_router_widgets(self, count: int, routes: list[dict] | None = None) -> None:
+        """
+        Add several RouteWidgets at once, for example when restoring a saved setup: their virtual sinks are created
+        together by a VirtualSinkCreator in the background, so adding many of them takes about as long as adding one,
+        and the window stays responsive meanwhile, the RouteWidgets are added in on_virtual_sinks_ready()
+
+        :param count: the number of RouteWidgets to add
+        :param routes: the saved routes restored into the new RouteWidgets, one for each of them
+        :return: None
+        """
+        creator = VirtualSinkCreator(self.virtual_sink_manager, self.node_manager, count, routes)
+        creator.virtualSinksReady.connect(self.on_virtual_sinks_ready)
+        creator.creationFailed.connect(self.on_virtual_sinks_failed)
+        self.virtual_sink_creators.append(creator)
+        creator.start()
+
+    def on_virtual_sinks_ready(self, creator: VirtualSinkCreator,
+                               virtual_sinks: [tuple[pw_interface.VirtualSink, tuple[pw_interface.Node, ...]]]) -> None:
+        """
+        Called in the GUI thread when the virtual sinks of a VirtualSinkCreator are ready: add a RouteWidget for each
+        of them, and restore the saved routes into them
 
+        :param creator: the VirtualSinkCreator that created the virtual sinks
+        :param virtual_sinks: the (VirtualSink, (sink node, source node, output node)) of every new virtual sink
         :return: None
         """
-        self.routerWidgets.append(
-            RouteWidget(self.scrollArea, self.virtual_sink_manager, self.node_manager))
-        self.output_list.addWidget(self.routerWidgets[-1], alignment=QtCore.Qt.AlignmentFlag.AlignTop)
+        self.virtual_sink_creators.remove(creator)
+        new_route_widgets = []
+        for virtual_sink in virtual_sinks:
+            new_route_widgets.append(
+                RouteWidget(self.scrollArea, self.virtual_sink_manager, self.node_manager, self.sticky_router,
+                            self.port_index, virtual_sink, self.node_list_models))
+            new_route_widgets[-1].removed.connect(self.on_route_widget_removed)
+            self.output_list.addWidget(new_route_widgets[-1], alignment=QtCore.Qt.AlignmentFlag.AlignTop)
+        self.routerWidgets.extend(new_route_widgets)
+        if creator.routes is not None:
+            snapshot = self.node_manager.snapshot()
+            for route_widget, route_data in zip(new_route_widgets, creator.routes):
+                route_widget.restore_route_data(route_data, snapshot)
+            LOGGER.info(f"restored {len(creator.routes)} routes")
+
+    def on_route_widget_removed(self, route_widget: "RouteWidget") -> None:
+        """
+        Called when a RouteWidget was removed, so it is no longer updated, recorded or saved
+
+        :param route_widget: the removed RouteWidget
+        :return: None
+        """
+        self.routerWidgets.remove(route_widget)
+
+    def on_virtual_sinks_failed(self, creator: VirtualSinkCreator, error: str) -> None:
+        """
+        Called in the GUI thread when the virtual sinks of a VirtualSinkCreator did not appear in time
+
+        :param creator: the VirtualSinkCreator that failed
+        :param error: the error message
+        :return: None
+        """
+        self.virtual_sink_creators.remove(creator)
+        if creator.routes is not None:
+            LOGGER.error(f"Could not restore the saved routes: {error}")
+        else:
+            LOGGER.error(f"Could not add the output: {error}")
+        self.statusbar.showMessage(f"Could not create the virtual sinks: {error}")
+
+    def on_snapshot_ready(self, snapshot: pw_interface.GraphSnapshot) -> None:
+        """
+        Called in the GUI thread when the GraphRefresher has a new snapshot of the graph: update the lists of the
+        dropdown menus (only the rows of the changed nodes change), and show the nodes the sticky rules reconnected
+
+        :param snapshot: the new GraphSnapshot
+        :return: None
+        """
+        # the first live graph arrived, routes can be added from now on
+        if "interactive" not in self.startup_times and not snapshot.from_cache:
+            self.addMoreOutputsButton.setEnabled(True)
+            self.record_startup_time("interactive")
+        for node_list_model in self.node_list_models.values():
+            node_list_model.update(snapshot)
+        if self.saved_routes is not None and not snapshot.from_cache:
+            self.restore_routes(snapshot)
+        for route_widget in self.routerWidgets:
+            route_widget.follow_sticky_rules(snapshot)
+            for cb in route_widget.get_comboboxes():
+                # the item of the selected node may have been removed or moved, or the selection changed
+                cb.show_selected_node(restore_text=False)
+                if cb.view().isVisible():
+                    route_widget.update_excluded_nodes(cb)
+
+    def set_recording(self, recording: bool) -> None:
+        """
+        Start recording every virtual sink into its own file, in a new directory in the RECORDING_DIRECTORY, or stop
+        the recording, called when the record button is toggled
+
+        :param recording: True to start recording, False to stop
+        :return: None
+        """
+        if not recording:
+            if self.recorder is not None:
+                stats = self.recorder.stop()
+                dropped_frames = sum(track_stats["dropped_frames"] for track_stats in stats.values())
+                self.statusbar.showMessage(f"Recorded {len(stats)} outputs into {self.recorder.directory}" + (
+                    f", {dropped_frames} frames were dropped" if dropped_frames else ""))
+                self.recorder = None
+            return
+
+        route_widgets = list(self.routerWidgets)
+        if not route_widgets:
+            self.statusbar.showMessage("There are no outputs to record")
+            self.recordButton.setChecked(False)
+            return
+        directory = os.path.join(pw_interface.RECORDING_DIRECTORY, time.strftime("%Y-%m-%d_%H-%M-%S"))
+        try:
+            self.recorder = recorder.MultitrackRecorder(directory, [
+                (route_widget.virtual_sink.name, route_widget.virtual_sink.capture(recorder.CHANNELS,
+                                                                                   recorder.SAMPLE_RATE))
+                for route_widget in route_widgets])
+        except OSError as ose:
+            LOGGER.error(f"Cannot start recording into {directory}: {ose}")
+            self.statusbar.showMessage(f"Cannot start recording: {ose}")
+            self.recordButton.setChecked(False)
+            return
+        self.statusbar.showMessage(f"Recording {len(route_widgets)} outputs into {directory}")
+
+    def update_level_meters(self) -> None:
+        """
+        Show the levels of the audio that went into the virtual sinks since the last update, called by the
+        level_meter_timer
+
+        :return: None
+        """
+        for route_widget in self.routerWidgets:
+            route_widget.update_level_meter()
+
+    def restore_routes(self, snapshot: pw_interface.GraphSnapshot) -> None:
+        """
+        Recreate the routes saved by an earlier run, their virtual sinks are created together in the background
+
+        :param snapshot: the first snapshot of the live graph
+        :return: None
+        """
+        saved_routes, self.saved_routes = self.saved_routes, None
+        self.add_router_widgets(len(saved_routes), saved_routes)
+
+    def get_routes(self) -> [dict]:
+        """
+        Get the routes of all RouteWidgets, in the form of the entries of a headless routing file
+
+        :return: the list of routes
+        """
+        if self.saved_routes is not None:  # the saved routes are not restored yet, they are kept for the next start
+            return self.saved_routes
+        return [route_widget.get_route_data() for route_widget in self.routerWidgets] + \
+            [route_data for creator in self.virtual_sink_creators if creator.routes is not None for route_data in
+             creator.routes]  # the routes whose virtual sinks are still being created
+
+    def save_warm_start(self) -> None:
+        """
+        Save the graph and the routes for the next start, called at intervals and when the window is closed
+
+        :return: None
+        """
+        if self.warm_start_file is None:
+            return
+        try:
+            graph_cache.save(self.warm_start_file, self.node_manager, self.get_routes())
+        except (OSError, ValueError) as error:  # ValueError: marshal cannot store the value
+            LOGGER.warning(f"Could not save the warm start file {self.warm_start_file}: {error}")
+
+    def record_startup_time(self, name: str) -> None:
+        """
+        Record and print the time since startup_start, the first time a startup milestone is reached
+
+        :param name: the name of the milestone: "first_paint" or "interactive"
+        :return: None
+        """
+        if name not in self.startup_times:
+            self.startup_times[name] = time.perf_counter() - self.startup_start
+            LOGGER.info(f"startup: {name} after {round(self.startup_times[name], 4)}s")
+
+    def paintEvent(self, event) -> None:
+        """
+        Record the time of the first paint
+
+        :param event: the QPaintEvent
+        :return: None
+        """
+        self.record_startup_time("first_paint")
+        super().paintEvent(event)
+
+    def closeEvent(self, event) -> None:
+        """
+        Save the graph and the routes for the next start, and stop the GraphRefresher thread when the window is closed
+
+        :param event: the QCloseEvent
+        :return: None
+        """
+        self.warm_start_save_timer.stop()
+        self.save_warm_start()
+        self.recordButton.setChecked(False)  # finishes the files of the recording, if there is one
+        self.level_meter_timer.stop()
+        for route_widget in self.routerWidgets:
+            route_widget.stop_level_meter()
+        for creator in self.virtual_sink_creators:  # the virtual sinks are removed with the others when the app exits
+            creator.wait()
+        self.graph_refresher.stop()
+        self.sticky_router.close()
+        super().closeEvent(event)
 
     def monitor_proc_stdout(self) -> None:
         """
@@ -66,19 +545,203 @@ class MainWindow(QMainWindow):
         Combobox that had that app selected can be reset
 
         This function is called by QT in the event loop automatically when new output appears on the stdout of the
-        started pw-link process
+        started pw-link process, the removed ports are handled by handle_removed_ports() after removed_ports_delay_ms
 
         :return: None
         """
         data = self.monitor_proc.readAllStandardOutput()
-        stdout = bytes(data).decode("utf8")
-        print(stdout)
-        for line in stdout.split("\n"):
+        lines = (self.monitor_proc_buffer + bytes(data).decode("utf8")).split("\n")
+        self.monitor_proc_buffer = lines.pop()  # the output can end in the middle of a line
+        for line in lines:
             if line.startswith("-"):
                 removed_port_id = int(line.split()[1])
-                for route_widget in self.routerWidgets:
-                    for cb in route_widget.findChildren(ComboBox):
-                        cb.disconnect_app_node_if_contains_port_id(removed_port_id)
+                if self.port_index.get_comboboxes(removed_port_id):
+                    self.removed_port_ids.add(removed_port_id)
+        if self.removed_port_ids and not self.removed_ports_timer.isActive():
+            self.removed_ports_timer.start()
+
+    def handle_removed_ports(self) -> None:
+        """
+        Reset the comboboxes whose selected node lost ports since the last call, each combobox only once
+
+        :return: None
+        """
+        removed_port_ids, self.removed_port_ids = self.removed_port_ids, set()
+        affected_comboboxes: dict[ComboBox, int] = {}
+        for port_id in removed_port_ids:
+            for cb in self.port_index.get_comboboxes(port_id):
+                affected_comboboxes.setdefault(cb, port_id)
+        for cb, port_id in affected_comboboxes.items():
+            cb.disconnect_app_node_if_contains_port_id(port_id)
+
+
+class NodeListModel(QtCore.QAbstractListModel):
+    """
+    The nodes of one direction of the graph, as the items of the comboboxes: the first item is the "no node" item " ",
+    the others are the nodes sorted by their readable names
+    A single model is shared by all the comboboxes of a direction, each of them shows it through its own
+    NodeFilterProxyModel. It is updated from the snapshots of the graph incrementally: only the rows of the nodes that
+    were added, removed or changed since the last snapshot change, and the sort key and the text of a node are only
+    computed when it changes
+    """
+
+    # the role of the node id of an item, None for the "no node" item
+    NodeIdRole: int = QtCore.Qt.ItemDataRole.UserRole
+    # the text of the "no node" item
+    no_node_label: str = " "
+    # above this many changed nodes the whole model is reset at once, instead of changing the rows one by one
+    reset_threshold: int = 64
+
+    def __init__(self, direction: str, parent=None):
+        """
+        Create a new, empty model
+
+        :param direction: the type of the nodes shown: "Source" or "Sink", see GraphSnapshot.get_nodes()
+        :param parent: QT specific: None by default
+        """
+        super().__init__(parent)
+        self.direction: str = direction
+        self.nodes: dict[int, pw_interface.Node] = {}  # the nodes shown, by their ids
+        self.labels: dict[int, str] = {}  # the text of the items by their node ids
+        self.sort_keys: dict[int, tuple[str, int]] = {}  # the (lowercase readable name, node id) by the node ids
+        # the node ids and the sort keys of the items after the "no node" item, in the order they are shown
+        self.row_node_ids: [int] = []
+        self.row_sort_keys: [tuple[str, int]] = []
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.row_node_ids) + 1
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node_id = self.get_node_id(index.row())
+        if role in (QtCore.Qt.ItemDataRole.DisplayRole, QtCore.Qt.ItemDataRole.EditRole):
+            return self.no_node_label if node_id is None else self.labels[node_id]
+        if role == self.NodeIdRole:
+            return node_id
+        return None
+
+    def get_node_id(self, row: int) -> int | None:
+        """
+        Get the node id of a row
+
+        :param row: the row of the model
+        :return: the id of the node shown in the row, None for the "no node" item
+        """
+        return self.row_node_ids[row - 1] if row else None
+
+    def update(self, snapshot: pw_interface.GraphSnapshot) -> None:
+        """
+        Show the nodes of a new snapshot: the nodes are compared to the shown ones by identity, as the NodeManager
+        replaces the changed nodes with new Node objects
+
+        :param snapshot: the new GraphSnapshot
+        :return: None
+        """
+        new_nodes = snapshot.get_nodes(self.direction)
+        removed_node_ids = [node_id for node_id in self.nodes if node_id not in new_nodes]
+        changed_nodes = [node for node_id, node in new_nodes.items() if self.nodes.get(node_id) is not node]
+        if not removed_node_ids and not changed_nodes:
+            return
+
+        if len(removed_node_ids) + len(changed_nodes) > self.reset_threshold:
+            self.beginResetModel()
+            self.nodes, self.labels, self.sort_keys = {}, {}, {}
+            for node in new_nodes.values():
+                self._add_node(node, node.get_readable_name())
+            self.row_node_ids = sorted(self.nodes, key=self.sort_keys.__getitem__)
+            self.row_sort_keys = [self.sort_keys[node_id] for node_id in self.row_node_ids]
+            self.endResetModel()
+            return
+
+        for node_id in removed_node_ids:
+            self._remove_row(node_id)
+        for node in changed_nodes:
+            readable_name = node.get_readable_name()
+            sort_key = self.sort_keys.get(node.id)
+            if sort_key == (readable_name.lower(), node.id):  # the node stays in its place, only its text may change
+                self._add_node(node, readable_name)
+                index = self.index(bisect.bisect_left(self.row_sort_keys, sort_key) + 1)
+                self.dataChanged.emit(index, index)
+                continue
+            if sort_key is not None:
+                self._remove_row(node.id)
+            self._add_node(node, readable_name)
+            self._insert_row(node.id)
+
+    def _add_node(self, node: pw_interface.Node, readable_name: str) -> None:
+        """
+        Store a node, with the text and the sort key of its item, without adding its row
+
+        :param node: the node
+        :param readable_name: the readable name of the node, see Node.get_readable_name()
+        :return: None
+        """
+        self.nodes[node.id] = node
+        self.labels[node.id] = f"{node.id}: {readable_name}"
+        self.sort_keys[node.id] = (readable_name.lower(), node.id)
+
+    def _insert_row(self, node_id: int) -> None:
+        """
+        Insert the row of a stored node at its sorted place
+
+        :param node_id: the id of the node
+        :return: None
+        """
+        position = bisect.bisect_left(self.row_sort_keys, self.sort_keys[node_id])
+        self.beginInsertRows(QtCore.QModelIndex(), position + 1, position + 1)
+        self.row_node_ids.insert(position, node_id)
+        self.row_sort_keys.insert(position, self.sort_keys[node_id])
+        self.endInsertRows()
+
+    def _remove_row(self, node_id: int) -> None:
+        """
+        Remove the row of a node, and forget the node
+
+        :param node_id: the id of the node
+        :return: None
+        """
+        position = bisect.bisect_left(self.row_sort_keys, self.sort_keys[node_id])
+        self.beginRemoveRows(QtCore.QModelIndex(), position + 1, position + 1)
+        del self.row_node_ids[position]
+        del self.row_sort_keys[position]
+        self.endRemoveRows()
+        del self.nodes[node_id]
+        del self.labels[node_id]
+        del self.sort_keys[node_id]
+
+
+class NodeFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """
+    The items of a NodeListModel shown by one combobox: every item except the nodes selected in the other app
+    comboboxes of the same RouteWidget
+    """
+
+    def __init__(self, node_list_model: NodeListModel, parent=None):
+        """
+        Create a new proxy model, showing every item of the model
+
+        :param node_list_model: the shared NodeListModel
+        :param parent: QT specific: None by default
+        """
+        super().__init__(parent)
+        self.excluded_node_ids: frozenset[int] = frozenset()
+        self.setSourceModel(node_list_model)
+
+    def set_excluded_node_ids(self, node_ids: set[int] | frozenset[int]) -> None:
+        """
+        Hide the items of some nodes, the items are only filtered again if the hidden nodes changed
+
+        :param node_ids: the ids of the nodes to hide
+        :return: None
+        """
+        node_ids = frozenset(node_ids)
+        if node_ids != self.excluded_node_ids:
+            self.excluded_node_ids = node_ids
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QtCore.QModelIndex) -> bool:
+        return not self.excluded_node_ids or self.sourceModel().get_node_id(source_row) not in self.excluded_node_ids
 
 
 class ComboBox(QComboBox):
@@ -86,14 +749,17 @@ class ComboBox(QComboBox):
     A combobox that has its scrolling disabled (it passes scroll events through to the main window's scrollWidget,
     to scroll the page instead of selecting a new item)
     It also connects / disconnects the apps from the virtual sink using the node_manager
+    Its items are the items of a shared NodeListModel, which is kept up to date with the graph, and a part of a name can
+    be typed into it to search the list
     """
 
-    # the signal that is emitted before the app selection list is shown, used to refresh the list before displaying
+    # the signal that is emitted before the app selection list is shown, used to hide the nodes selected elsewhere
     popupAboutToBeShown = QtCore.pyqtSignal(name="popupAboutToBeShown")
 
     def __init__(self, scrollWidget=None, node_manager: pw_interface.NodeManager = None,
                  app_node: pw_interface.Node = None, parent_sink_node: pw_interface.Node = None, parent=None,
-                 isAppSourceCB=True):
+                 isAppSourceCB=True, sticky_router: routing_rules.StickyRouter | None = None,
+                 port_index: ComboBoxPortIndex | None = None, node_list_model: NodeListModel | None = None):
         """
         Creates a new Combobox
 
@@ -102,84 +768,234 @@ class ComboBox(QComboBox):
         :param app_node: the node instance this combobox has selected (can be None if no node is selected)
         :param parent_sink_node: the Node of the VirtualSink to which this combobox's selected app node is connected
         :param parent: QT specific: None by default
+        :param sticky_router: the StickyRouter keeping the selected app connected when its node is recreated, if None,
+        the selection is reset when the node is removed
+        :param port_index: the MainWindow's ComboBoxPortIndex, in which the ports of the selected node are registered
+        :param node_list_model: the shared NodeListModel of the nodes of the direction of this combobox, if None, a new
+        one is made from the latest snapshot of the node_manager
         """
         super(ComboBox, self).__init__(parent)
         self.scroll_with_strong_focus = False
         self.scrollWidget = scrollWidget
         self.setFocusPolicy(QtCore.Qt.FocusPolicy.StrongFocus)
 
+        if node_list_model is None:
+            node_list_model = NodeListModel("Source" if isAppSourceCB else "Sink")
+            if node_manager.latest_snapshot is not None:
+                node_list_model.update(node_manager.latest_snapshot)
+        self.proxy_model: NodeFilterProxyModel = NodeFilterProxyModel(node_list_model, self)
+        self.setModel(self.proxy_model)
+        # type-ahead search: the items containing the typed text are listed while typing, and can be selected
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
+        self.completer().setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
+        self.completer().setFilterMode(QtCore.Qt.MatchFlag.MatchContains)
+        self.completer().setCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+        # text typed but not selected is replaced by the selected item again
+        self.lineEdit().editingFinished.connect(self.show_selected_node)
+
         self.node_manager: pw_interface.NodeManager = node_manager
-        self.app_node: pw_interface.Node | None = app_node
+        self.port_index: ComboBoxPortIndex | None = port_index
+        self.app_node: pw_interface.Node | None = None
+        self.app_port_ids: set[int] = set()  # the ports the selected node had when it was selected
+        self.set_app_node(app_node)
         self.parent_sink_node: pw_interface.Node = parent_sink_node
 
-        self.last_selected: str = " "  # when the combobox is created, no app is selected by defualt
         self.activated.connect(self.on_activated)
         self.isAppSourceCB = isAppSourceCB
 
-    def set_connection(self, new_selection_node_id, new_selection):
-        # get new node
-        self.app_node = self.node_manager.get_nodes("Source" if self.isAppSourceCB else "Sink")[new_selection_node_id]
-
-        # connect new node to virtual sink
-        if pw_interface.connect_nodes_replace_connection(self.app_node,
-                                                         self.parent_sink_node,
-                                                         self.node_manager,
-                                                         reverse_order=not self.isAppSourceCB,
-                                                         replace_connection=not self.isAppSourceCB):
-            self.setCurrentText(new_selection)
+        self.sticky_router: routing_rules.StickyRouter | None = sticky_router
+        self.sticky_rule: routing_rules.RoutingRule | None = None  # the rule of the selected app
+
+    def set_app_node(self, app_node: pw_interface.Node | None) -> None:
+        """
+        Set the selected node, and register its ports in the port index
+
+        :param app_node: the selected node, or None if nothing is selected
+        :return: None
+        """
+        self.app_node = app_node
+        if app_node is None:
+            self.app_port_ids = set()
+        else:  # the stored nodes are never changed (see Node._copy()), so their ports are read without the lock
+            self.app_port_ids = set(app_node.input_ports) | set(app_node.output_ports)
+        if self.port_index is not None:
+            self.port_index.set_port_ids(self, self.app_port_ids)
+
+    def set_connection(self, new_selection_node_id: int) -> None:
+        """
+        Connect a node to the virtual sink, replacing the selected node
+
+        :param new_selection_node_id: the id of the node to select
+        :return: None
+        """
+        snapshot = self.node_manager.latest_snapshot
+        if snapshot.from_cache:  # the ids of the graph saved by the last run may belong to other nodes by now
+            LOGGER.warning("Cannot connect a node before the live graph is loaded")
+            self.show_selected_node()
+            return
+        # get new node from the latest snapshot, which the list is kept up to date with
+        new_node = snapshot.get_nodes("Source" if self.isAppSourceCB else "Sink").get(
+            new_selection_node_id)
+        if new_node is None:  # the node was removed since the list was shown
+            self.disconnect_app_node()
+            return
+
+        # connect new node to virtual sink, replacing the links of the previously selected node
+        created_port_pairs = self.reconcile_links(new_node)
+        if created_port_pairs is not None:
+            self.set_app_node(new_node)
+            self.show_selected_node()
+            if self.sticky_router is not None:
+                self.sticky_router.add_requested_port_pairs(created_port_pairs)
+            self.set_sticky_rule(self.app_node)
         else:
             self.disconnect_app_node()
 
-    def on_activated(self) -> None:
+    def reconcile_links(self, new_node: pw_interface.Node | None) -> list[tuple[int, int]] | None:
+        """
+        Change the links of the virtual sink from the selected node to a new one, only creating and removing the links
+        that differ, so reselecting a node, or switching between nodes does not interrupt the audio
+        For app sources only the links between the app nodes and the virtual sink are changed, for an output every link
+        going into the output node is replaced, like connect_nodes_replace_connection() does
+        The links are applied in the background by the NodeManager's LinkWorker, so the GUI thread never waits for the
+        sound server
+
+        :param new_node: the node to be connected to the virtual sink, if None, the selected node is only disconnected
+        :return: the (source port id, sink port id) pairs of the links that were requested to be created, or None if the
+        ports of the new node cannot be paired with the ports of the virtual sink
         """
-        Activated when a new app is selected from the dropdown list
-        Disconnects the previously selected node from the virtual sink (if one was connected) and connects the newly
-        selected node to the virtual sink
+        if self.isAppSourceCB:
+            source_node, sink_node = new_node, self.parent_sink_node
+            source_node_ids = {node.id for node in (new_node, self.app_node) if node is not None}
+            sink_node_ids = {self.parent_sink_node.id}
+        else:
+            source_node, sink_node = self.parent_sink_node, new_node
+            source_node_ids = None  # the output node only gets the audio of the virtual sink
+            sink_node_ids = {node.id for node in (new_node, self.app_node) if node is not None}
+
+        desired_port_pairs = []
+        if new_node is not None:
+            desired_port_pairs = pw_interface.pair_ports(source_node, sink_node)
+            if not desired_port_pairs:
+                LOGGER.warning(f"Cannot connect node {source_node.get_readable_name()} to "
+                               f"{sink_node.get_readable_name()}: Their ports cannot be paired: "
+                               f"{len(source_node.output_ports)} : {len(sink_node.input_ports)}")
+                return None
+        transaction = pw_interface.LinkTransaction(self.node_manager)
+        created_port_pairs = pw_interface.reconcile_links(self.node_manager, desired_port_pairs, sink_node_ids,
+                                                          source_node_ids, transaction)
+        transaction.submit()
+        return created_port_pairs
+
+    def set_sticky_rule(self, app_node: pw_interface.Node | None) -> None:
+        """
+        Replace the sticky rule of this combobox with one matching the app of the given node, so the app is connected to
+        the virtual sink again every time it recreates its node
 
+        :param app_node: the node of the selected app, if None, the rule is only removed
         :return: None
         """
-        new_selection: str = str(self.currentText())
-        print(f"activating: {new_selection}")
-        if new_selection != " ":  # if the new selection is the "no app" item, then just disconnect the current one
-            # the node id of the apps is the first number before the colon
-            # for example: node_id: node_name (app_name): media_name
-            # for example: 999: Firefox (Firefox): AudioStream
-            #     but usually the node_name and the app_name are the same,
-            #     so in such cases It's shortened to just: 999: Firefox: AudioStream
-            new_selection_node_id: int = int(new_selection.split(":")[0])
-            if self.last_selected != new_selection:
-                self.disconnect_app_node()  # disconnects the previously selected node
-            self.set_connection(new_selection_node_id, new_selection)
-        else:  # if the new selection is an app
-            self.disconnect_app_node()
+        self.set_sticky_conditions(None if app_node is None else {"application.name": str(app_node.app_name),
+                                                                  "node.name": str(app_node.node_name)})
+
+    def set_sticky_conditions(self, conditions: dict[str, str | dict[str, str]] | None) -> None:
+        """
+        Replace the sticky rule of this combobox with one matching the given conditions, for example the conditions of
+        a saved route, the nodes matching it are connected to the virtual sink right away
+
+        :param conditions: the conditions of the rule, see routing_rules.parse_conditions(), if None, the rule is only
+        removed
+        :return: None
+        """
+        if self.sticky_router is None:
+            return
+        if self.sticky_rule is not None:
+            self.sticky_router.remove_rule(self.sticky_rule)
+            self.sticky_rule = None
+        if conditions is not None:
+            self.sticky_rule = routing_rules.RoutingRule(conditions, sink_node_id=self.parent_sink_node.id)
+            self.sticky_router.add_rule(self.sticky_rule)
+
+    def follow_sticky_rule(self, snapshot: pw_interface.GraphSnapshot) -> bool:
+        """
+        If the selected node is gone, select the node the sticky rule reconnected instead
+
+        :param snapshot: the latest GraphSnapshot
+        :return: True if the selection changed
+        """
+        if self.sticky_rule is None or (self.app_node is not None and self.app_node.id in snapshot.nodes):
+            return False
+        matching_nodes = self.sticky_router.get_matching_nodes(self.sticky_rule, snapshot.get_nodes("Source"))
+        if not matching_nodes:
+            return False
+        self.set_app_node(matching_nodes[0])
+        return True
+
+    def show_selected_node(self, restore_text: bool = True) -> None:
+        """
+        Show the selected node as the current item, or the "no app" item if nothing is selected, for example after the
+        item of the selected node was removed from the list, or a text was typed without selecting an item
 
-        self.last_selected = new_selection  # update last selection to the current one
+        :param restore_text: whether to replace the typed text with the text of the current item, False to keep the
+        text being typed when the current item did not change
+        :return: None
+        """
+        node_id = None if self.app_node is None else self.app_node.id
+        index = self.currentIndex()
+        if index < 0 or self.itemData(index, NodeListModel.NodeIdRole) != node_id:
+            index = 0 if node_id is None else max(self.findData(node_id, NodeListModel.NodeIdRole), 0)
+            self.setCurrentIndex(index)
+        if restore_text and self.currentText() != self.itemText(index):
+            self.setEditText(self.itemText(index))
+
+    def on_activated(self, index: int) -> None:
+        """
+        Activated when a new app is selected from the dropdown list, or from the list of the search
+        Connects the newly selected node to the virtual sink, and disconnects the previously selected node from it (if
+        one was connected), only the links that differ are changed
+
+        :param index: the index of the selected item
+        :return: None
+        """
+        LOGGER.debug(f"activating: {self.itemText(index)}")
+        # the node id is the data of the item, None for the "no app" item
+        new_selection_node_id: int | None = self.itemData(index, NodeListModel.NodeIdRole)
+        if new_selection_node_id is not None:
+            # the links of the previously selected node are replaced by the links of the new one
+            self.set_connection(new_selection_node_id)
+        else:  # if the new selection is the "no app" item, then just disconnect the current one
+            self.disconnect_app_node()
 
     def disconnect_app_node(self) -> None:
         """
-        Disconnects the currently connected app node form the virtual sink
+        Disconnects the currently connected app node form the virtual sink, and removes its sticky rule
 
         :return: None
         """
+        self.set_sticky_rule(None)
         if self.app_node:
-            if not self.isAppSourceCB:
-                pw_interface.disconnect_all_inputs(self.app_node, self.node_manager)
-            pw_interface.disconnect_nodes(self.app_node, self.parent_sink_node)
-        self.app_node = None
-        self.last_selected = " "
-        self.setCurrentText(" ")
+            self.reconcile_links(None)
+        self.set_app_node(None)
+        self.show_selected_node()
 
     def disconnect_app_node_if_contains_port_id(self, disconnected_port_id: int) -> None:
         """
         Disconnect the node of this combobox if the node contains the port specified in the parameter
+        If the app has a sticky rule, the rule is kept, so the app is reconnected when its node appears again
 
         :param disconnected_port_id: the port that is searched for
         :return: None
         """
-        print(f"disconnecting {disconnected_port_id=}")
+        LOGGER.debug(f"disconnecting {disconnected_port_id=}")
         if self.app_node:
-            if self.app_node.contains_port(disconnected_port_id):
-                self.disconnect_app_node()
+            # the ports registered when the node was selected are checked, as the NodeManager may have already removed
+            # the port from the node
+            if disconnected_port_id in self.app_port_ids:
+                if self.sticky_rule is not None:
+                    self.set_app_node(None)  # the node is gone, follow_sticky_rule() selects the new one
+                else:
+                    self.disconnect_app_node()
 
     def wheelEvent(self, *args, **kwargs):
         """
@@ -193,8 +1009,8 @@ class ComboBox(QComboBox):
     def showPopup(self) -> None:
         """
         Emits the popupAboutToBeShown event, then shows the dropdown menu
-        The event is used to refresh the list of items of the dropdown menu before it is shown, to get the most
-        up-to-date node information from pipewire
+        The event is used to hide the nodes selected in the other comboboxes before the list is shown, the list itself
+        is always up to date
 
         :return: None
         """
@@ -203,55 +1019,153 @@ class ComboBox(QComboBox):
         super(ComboBox, self).showPopup()
 
 
+class LevelMeterWidget(QWidget):
+    """
+    Shows the levels of every channel of a virtual sink as horizontal bars: the RMS level as a filled bar, and the peak
+    level as a lighter bar behind it, from level_meter.SILENCE_DB on the left to 0 dBFS on the right
+    """
+
+    background_color = QColor(40, 40, 40)
+    rms_color = QColor(40, 170, 70)
+    peak_color = QColor(120, 220, 120)
+    clip_color = QColor(220, 60, 50)  # the color of the peak bar when the peak reaches 0 dBFS
+
+    def __init__(self, channels: int):
+        """
+        Create a new level meter showing silence
+
+        :param channels: the number of channels, one bar is shown for each
+        """
+        super().__init__()
+        self.levels: [tuple[float, float]] = [(level_meter.SILENCE_DB, level_meter.SILENCE_DB)] * channels
+
+    def set_levels(self, levels: [tuple[float, float]]) -> None:
+        """
+        Show new levels, the widget is only repainted if they changed
+
+        :param levels: the (peak, RMS) levels in dBFS of every channel, as returned by LevelMeter.get_levels()
+        :return: None
+        """
+        if levels != self.levels:
+            self.levels = levels
+            self.update()
+
+    def paintEvent(self, event) -> None:
+        """
+        Draw the bars of the channels
+
+        :param event: the QPaintEvent
+        :return: None
+        """
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background_color)
+        bar_height = self.height() // len(self.levels)
+        for channel, (peak, rms) in enumerate(self.levels):
+            top = channel * bar_height
+            painter.fillRect(0, top + 1, self._get_bar_width(peak), bar_height - 2,
+                             self.clip_color if peak >= 0 else self.peak_color)
+            painter.fillRect(0, top + 1, self._get_bar_width(rms), bar_height - 2, self.rms_color)
+        painter.end()
+
+    def _get_bar_width(self, level: float) -> int:
+        """
+        Get the width of the bar of a level
+
+        :param level: the level in dBFS
+        :return: the width in pixels
+        """
+        return round(self.width() * (1 - min(level, 0) / level_meter.SILENCE_DB))
+
+
 class RouteWidget(QWidget):
     """
     A RouteWidget contains 0 or more ComboBoxes, the name of the Virtual Sink the Apps that are selected in the
     ComboBoxes are connecting themselves to, a button to add more ComboBoxes (each with a button to remove it
     specifically), and a button to remove the whole RouteWidget
 
-    Creating a new RouteWidget automatically creates a new Virtual Sink through pw_interface, and removing it
-    automatically removes the virtual sink
+    A RouteWidget is created for a new Virtual Sink, created through pw_interface by a VirtualSinkCreator, and removing
+    it automatically removes the virtual sink
 
     By default all RouteWidgets crate a single App selection ComboBox, but more and be added and remove on the fly
 
     Each RouteWidget has its own virtual sink device
     """
 
+    # emitted with the RouteWidget when it was removed, so the MainWindow stops updating it
+    removed = QtCore.pyqtSignal(object, name="removed")
+
     def __init__(self, scrollWidget=None, virtual_sink_manager: pw_interface.VirtualSinkManager = None,
-                 node_manager: pw_interface.NodeManager = None):
+                 node_manager: pw_interface.NodeManager = None,
+                 sticky_router: routing_rules.StickyRouter | None = None,
+                 port_index: ComboBoxPortIndex | None = None,
+                 virtual_sink: tuple[pw_interface.VirtualSink, tuple[pw_interface.Node, pw_interface.Node,
+                                                                     pw_interface.Node]] = None,
+                 node_list_models: dict[str, NodeListModel] | None = None):
         """
         Crates a new RouteWidget
 
         :param scrollWidget: the main window's scrollWidgets to which the scroll events of all child ComboBoxes are passed
         :param virtual_sink_manager: a VirtualSinkManager instance tham keeps track of open virtual sink devices, their creation and closure
         :param node_manager: a NodeManager instance that handles loading the app node list, and connecting / disconnecting the app nodes from the virtual sink
+        :param sticky_router: the StickyRouter keeping the selected apps connected when their nodes are recreated
+        :param port_index: the MainWindow's ComboBoxPortIndex, passed on to the ComboBoxes
+        :param virtual_sink: an already created (VirtualSink, (sink node, source node, output node)), as returned by
+        VirtualSinkManager.create_virtual_sinks(), it is created in the background by a VirtualSinkCreator, as waiting
+        for its nodes would block the GUI thread
+        :param node_list_models: the MainWindow's NodeListModels by direction ("Source" and "Sink"), shown by the
+        ComboBoxes, if None, every ComboBox makes its own
         """
         super().__init__()
-        uic.loadUi("ui/RouteWidget.ui",
-                   self)  # load the RouteWidget ui from "ui/RouteWidget.ui" created using QT Designer
+        load_ui("ui/RouteWidget.ui", self)  # load the RouteWidget ui from "ui/RouteWidget.ui" created using QT Designer
         self.parent_scrollWidget = scrollWidget
         self.node_manager: pw_interface.NodeManager = node_manager
+        self.sticky_router: routing_rules.StickyRouter | None = sticky_router
+        self.port_index: ComboBoxPortIndex | None = port_index
+        self.node_list_models: dict[str, NodeListModel] = node_list_models or {}
 
         self.virtual_sink_manager: pw_interface.VirtualSinkManager = virtual_sink_manager
-        # create this routeWidgets own virtual sink
-        self.virtual_sink: pw_interface.VirtualSink = self.virtual_sink_manager.create_virtual_sink()
+        # this routeWidgets own virtual sink
+        self.virtual_sink: pw_interface.VirtualSink = virtual_sink[0]
         # set the shown label to the name of the virtual sink
         self.sink_name_label.setText(self.virtual_sink.name)
 
+        # the levels of the audio going into the virtual sink, updated by the MainWindow's level_meter_timer
+        self.level_meter: level_meter.LevelMeter | None = None
+        self.level_meter_widget: LevelMeterWidget | None = None
+        if pw_interface.LEVEL_METERS and level_meter.is_available():
+            self.level_meter = level_meter.LevelMeter(
+                self.virtual_sink.capture(level_meter.CHANNELS, level_meter.SAMPLE_RATE))
+            self.level_meter_widget = LevelMeterWidget(level_meter.CHANNELS)
+            self.levelMeterHolder.addWidget(self.level_meter_widget)
+
         # values for adjusting the height of the Combobox Widget's height currently
         self.app_combobox_height: int = 32
         self.app_combobox_vbox_padding: int = 10
-        self.routeWidget_min_height = 120
+        self.routeWidget_min_height = 150
 
         self.app_output_comboboxes: [QFrame] = []  # keep track of the app comboboxes in this routeWidget
+        # the ComboBoxes in the frames of app_output_comboboxes, in the same order, so they are not searched for on
+        # every snapshot
+        self.app_comboboxes: [ComboBox] = []
 
         # wire up the buttons
         self.add_more_apps_btn.clicked.connect(self.add_app_output_combobox)
         self.remove_sink_button.clicked.connect(self.remove)
 
         # get the node of the virtual sink into which the apps are connected in Combobox.on_activated()
-        self.output_sink_node: pw_interface.Node = node_manager.get_loopback_node(self.virtual_sink)
-        self.output_source_node: pw_interface.Node = node_manager.get_loopback_node(self.virtual_sink, "Source")
+        self.output_sink_node: pw_interface.Node
+        self.output_source_node: pw_interface.Node
+        self.output_sink_node, self.output_source_node, output_node = virtual_sink[1]
+        # the nodes of the virtual sink are never matched by the sticky rules
+        self.loopback_node_ids: [int] = [self.output_sink_node.id, self.output_source_node.id, output_node.id]
+        if self.sticky_router is not None:
+            self.sticky_router.add_ignored_nodes(self.loopback_node_ids)
+
+        # the volume of the virtual sink, the slider can be dragged freely, the VolumeController only sends the latest
+        # value at a limited rate
+        self.volume_controller: pw_interface.VolumeController = self.virtual_sink_manager.volume_controller
+        self.volumeSlider.valueChanged.connect(self.on_volume_changed)
+        self.muteButton.toggled.connect(self.on_mute_toggled)
         # self.app_nodes: dict[int, pw_interface.Node] = {}
 
         # add the single default ComboBox
@@ -259,30 +1173,130 @@ class RouteWidget(QWidget):
 
         # add target sink combobox
         self.targetSinkComboBox = ComboBox(scrollWidget=self.parent_scrollWidget, node_manager=self.node_manager,
-                                           app_node=None, parent_sink_node=self.output_source_node, isAppSourceCB=False)
-        self.targetSinkComboBox.popupAboutToBeShown.connect(
-            lambda: self.update_app_selection_combobox_items(self.targetSinkComboBox))
+                                           app_node=None, parent_sink_node=self.output_source_node, isAppSourceCB=False,
+                                           port_index=self.port_index,
+                                           node_list_model=self.node_list_models.get("Sink"))
         self.targetCBholder.addWidget(self.targetSinkComboBox)
 
-    def update_app_selection_combobox_items(self, cb: ComboBox) -> None:
+    def get_comboboxes(self) -> [ComboBox]:
+        """
+        Get all the ComboBoxes of this RouteWidget: the app comboboxes, then the target sink combobox
+
+        :return: the list of the ComboBoxes
+        """
+        return self.app_comboboxes + [self.targetSinkComboBox]
+
+    def update_excluded_nodes(self, cb: ComboBox) -> None:
+        """
+        Hide the nodes selected in the other app comboboxes of this RouteWidget from the list of an app combobox, so
+        the same node is not selected twice, the list itself is kept up to date by the shared NodeListModel
+
+        :param cb: The ComboBox instance that will have its list filtered
+        :return: None
+        """
+        if not cb.isAppSourceCB:
+            return
+        selected_node_ids = set()
+        for other_cb in self.app_comboboxes:
+            if other_cb is not cb and other_cb.app_node is not None:
+                selected_node_ids.add(other_cb.app_node.id)
+        cb.proxy_model.set_excluded_node_ids(selected_node_ids)
+
+    def follow_sticky_rules(self, snapshot: pw_interface.GraphSnapshot) -> None:
+        """
+        Show the nodes the sticky rules reconnected in the app comboboxes whose selected node is gone
+
+        :param snapshot: the latest GraphSnapshot
+        :return: None
+        """
+        for cb in self.app_comboboxes:
+            if cb.follow_sticky_rule(snapshot):
+                cb.show_selected_node()
+
+    def on_volume_changed(self, value: int) -> None:
+        """
+        Set the volume of the virtual sink, called when the volume slider is moved
+
+        :param value: the position of the slider, the volume in percent
+        :return: None
+        """
+        self.volume_controller.set_volume(self.output_sink_node.id, volume=value / 100)
+        self.volumeSlider.setToolTip(f"Volume: {value}%")
+
+    def on_mute_toggled(self, muted: bool) -> None:
+        """
+        Mute or unmute the virtual sink, called when the mute button is toggled
+
+        :param muted: whether the mute button is checked
+        :return: None
+        """
+        self.volume_controller.set_volume(self.output_sink_node.id, muted=muted)
+
+    def update_level_meter(self) -> None:
+        """
+        Show the levels of the audio that went into the virtual sink since the last update
+
+        :return: None
+        """
+        if self.level_meter is not None:
+            self.level_meter_widget.set_levels(self.level_meter.get_levels())
+
+    def stop_level_meter(self) -> None:
+        """
+        Stop capturing the audio of the virtual sink for the level meter
+
+        :return: None
+        """
+        if self.level_meter is not None:
+            self.level_meter.close()
+            self.level_meter = None
+
+    def get_route_data(self) -> dict:
+        """
+        Get the apps and the output selected in this RouteWidget, in the form of an entry of a headless routing file
+
+        :return: the name of the virtual sink, the conditions of the sticky rules of the apps, the node.name of the
+        output (None if no output is selected), and the volume and mute state of the virtual sink
+        """
+        target_node = self.targetSinkComboBox.app_node
+        return {"name": self.virtual_sink.name,
+                "inputs": [cb.sticky_rule.conditions for cb in self.app_comboboxes if cb.sticky_rule is not None],
+                "output": None if target_node is None else {"node.name": str(target_node.node_name)},
+                "volume": self.volumeSlider.value() / 100, "mute": self.muteButton.isChecked()}
+
+    def restore_route_data(self, route_data: dict, snapshot: pw_interface.GraphSnapshot) -> None:
         """
-        Update the list of the Combobox to the most up-to-date apps from pipewire
+        Select the apps and the output saved by get_route_data(), the apps are selected using sticky rules, so the apps
+        that are not running yet are connected when they start
 
-        :param cb: The ComboBox instance that will have its list updated
+        :param route_data: the saved route
+        :param snapshot: the latest GraphSnapshot
         :return: None
         """
-        cb.clear()  # remove everything from the list
-        self.node_manager.update()  # get the latest app list
-        # add the readable node names to the ComboBox's list, as well as a "no app selected" item: " "
-        # while excluding nodes that are selected in other comboboxes in the same routeWidget
-        cb.addItems([" "] + [f"{node_id}: {node.get_readable_name()}" for node_id, node in
-                             sorted(self.node_manager.get_nodes("Source" if cb.isAppSourceCB else "Sink").items(),
-                                    key=lambda node: node[1].get_readable_name().lower())
-                             if
-                             (not cb.isAppSourceCB) or node.id not in [frame.findChild(ComboBox).app_node.id for frame
-                                                                       in
-                                                                       self.app_output_comboboxes if
-                                                                       frame.findChild(ComboBox).app_node is not None]])
+        self.volumeSlider.setValue(round(route_data.get("volume", 1.0) * 100))
+        self.muteButton.setChecked(route_data.get("mute", False))
+
+        inputs = route_data.get("inputs", [])
+        while len(self.app_output_comboboxes) < len(inputs):
+            self.add_app_output_combobox()
+        for cb, conditions in zip(self.app_comboboxes, inputs):
+            try:
+                cb.set_sticky_conditions(conditions)
+            except ValueError as error:
+                LOGGER.warning(f"Could not restore an app of {self.virtual_sink.name}: {error}")
+        self.follow_sticky_rules(snapshot)
+
+        if route_data.get("output") is None:
+            return
+        try:
+            output_rule = routing_rules.RoutingRule(route_data["output"], source_node_id=self.output_source_node.id)
+        except ValueError as error:
+            LOGGER.warning(f"Could not restore the output of {self.virtual_sink.name}: {error}")
+            return
+        for node_id, node in snapshot.get_nodes("Sink").items():
+            if node_id not in self.loopback_node_ids and output_rule.matches(node):
+                self.targetSinkComboBox.set_connection(node_id)
+                break
 
     def remove_app_output_combobox(self, cb_frame: QFrame) -> None:
         """
@@ -291,8 +1305,9 @@ class RouteWidget(QWidget):
         :param cb_frame: the QFrame instance which holds the Combobox and remove button
         :return: None
         """
-        # find the ComboBox, and disconnect its app's node from the virtual sink
-        cb_frame.findChild(ComboBox).disconnect_app_node()
+        # disconnect the app's node of the ComboBox from the virtual sink
+        cb = self.app_comboboxes.pop(self.app_output_comboboxes.index(cb_frame))
+        cb.disconnect_app_node()
         self.app_output_comboboxes.remove(cb_frame)  # remove the frame
         cb_frame.setParent(None)  # stop displaying it in the RouteWidget
 
@@ -325,10 +1340,14 @@ class RouteWidget(QWidget):
 
         # Create the new ComboBox
         cb: ComboBox = ComboBox(scrollWidget=self.parent_scrollWidget, node_manager=self.node_manager, app_node=None,
-                                parent_sink_node=self.output_sink_node)
+                                parent_sink_node=self.output_sink_node, sticky_router=self.sticky_router,
+                                port_index=self.port_index, node_list_model=self.node_list_models.get("Source"))
         cb.setFixedHeight(self.app_combobox_height - 7)
-        # connect the popupAboutToBeShown signal to updating the list of the ComboBox
-        cb.popupAboutToBeShown.connect(lambda: self.update_app_selection_combobox_items(cb))
+        self.app_comboboxes.append(cb)
+        # connect the popupAboutToBeShown signal to hiding the nodes selected in the other ComboBoxes
+        cb.popupAboutToBeShown.connect(lambda: self.update_excluded_nodes(cb))
+        # the search of the ComboBox lists the same nodes as its dropdown list
+        cb.lineEdit().textEdited.connect(lambda text: self.update_excluded_nodes(cb))
 
         # Create the remove button
         remove_btn: QPushButton = QPushButton("Remove")
@@ -350,9 +1369,20 @@ class RouteWidget(QWidget):
     def remove(self) -> None:
         """
         Remove the RouteWidget
-        Removes its virtual sink, then removes itself from the window
+        Removes the sticky rules of its apps and its virtual sink, then removes itself from the window, and emits
+        removed
 
         :return: None
         """
+        for cb in self.app_comboboxes:
+            cb.set_sticky_rule(None)
+        if self.port_index is not None:  # the removed comboboxes must not get the port removals anymore
+            for cb in self.get_comboboxes():
+                self.port_index.set_port_ids(cb, ())
+        if self.sticky_router is not None:
+            self.sticky_router.remove_ignored_nodes(self.loopback_node_ids)
+        self.stop_level_meter()
+        self.volume_controller.forget(self.output_sink_node.id)
         self.virtual_sink_manager.remove(self.virtual_sink)
         self.setParent(None)
+        self.removed.emit(self)